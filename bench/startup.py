@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Cold start benchmark of sally entry points.
+
+Imports each module in a fresh interpreter with python -X importtime and
+reports total import time, the slowest top level packages and any heavy
+dependency loaded at import time. Cron jobs and pool workers pay this on
+every start, keep it low.
+
+    python bench/startup.py [--runs 5] [--top 10] [--max-ms 1500] [module ...]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+        'sally.spiders.lightfoot_spider',
+        'sally.pipelines',
+        'sally.scheduler',
+        'sally.archive',
+        ]
+
+# Loaded on first use only, never at import time
+HEAVY = ['apiclient', 'googleapiclient', 'oauth2client', 'httplib2',
+        'sendgrid', 'tldextract', 'pyarrow']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import time: self [us] | cumulative | imported package
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def heavy_imports(module, options=(), env=None):
+    """Import _module_ in a new interpreter started with _options_ and
+    _env_ environment, tests/test_startup.py runs it without credentials.
+
+    Returns (HEAVY modules loaded, interpreter stderr)"""
+    code = ('import sys, %s; print(",".join(m for m in %r if m in sys.modules))'
+            % (module, HEAVY))
+    result = subprocess.run([sys.executable] + list(options) + ['-c', code],
+            cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return [m for m in result.stdout.strip().split(',') if m], result.stderr
+
+
+def importtime(module):
+    """Import _module_ in a new interpreter.
+
+    Returns (total ms, {top level package: cumulative ms}, heavy modules
+    loaded)"""
+    heavy, stderr = heavy_imports(module, ['-X', 'importtime'])
+    packages = {}
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        # Only direct imports of the interpreter, one level of indent
+        if match and len(match.group(3)) == 1:
+            name = match.group(4).split('.')[0]
+            packages[name] = packages.get(name, 0) + int(match.group(2)) / 1000
+    return sum(packages.values()), packages, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--max-ms', type=float,
+            help='exit with error if any module takes longer to import')
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        runs = [importtime(module) for i in range(args.runs)]
+        total = statistics.median(r[0] for r in runs)
+        packages, heavy = runs[-1][1], runs[-1][2]
+        print('%s: %.1f ms (median of %d)' % (module, total, args.runs))
+        for name, ms in sorted(packages.items(), key=lambda p: -p[1])[
+                :args.top]:
+            print('    %-30s %8.1f ms' % (name, ms))
+        if heavy:
+            print('    heavy modules imported: %s' % ', '.join(heavy))
+            failed = True
+        if args.max_ms and total > args.max_ms:
+            print('    over budget of %.0f ms' % args.max_ms)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
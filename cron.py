@@ -1,25 +1,42 @@
+import argparse
 import os
 import sally.google.spreadsheet as gs
 import sally.google.drive as gd
-import scrapy
-import sendgrid
-from sendgrid.helpers.mail import *
+import sally.scheduler as scheduler
+from sally import tasks
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
+from sally.jobs import JobStore
 from sally.spiders.lightfoot_spider import BasicCrab
 
 
-def main():
+def main(workers=1):
     uploads = gd.get_uploads(os.environ.get('DRIVE_UPLOADS'))
+    # Uploads still in the folder with a job record were interrupted
+    store = JobStore()
+    unfinished = store.unfinished()
+    store.close()
+    if workers > 1:
+        # Shard uploads across worker processes, one reactor each
+        return scheduler.run(uploads, workers, unfinished)
+
     process = CrawlerProcess(get_project_settings())
     for f in uploads:
-        ss = gs.create_spreadsheet(f['name'])
-        process.crawl(BasicCrab, csvfile=f['id'],
-                spreadsheet=ss['spreadsheetId'])
+        if f['id'] in unfinished:
+            spreadsheetId = unfinished[f['id']]['spreadsheetId']
+        else:
+            spreadsheetId = gs.create_spreadsheet(f['name'])['spreadsheetId']
+        process.crawl(BasicCrab, csvfile=f['id'], spreadsheet=spreadsheetId)
 
     process.start()
+    # Wait for Sheets writes, Drive moves and the summary email
+    tasks.get_queue().join()
 
 
 if __name__ == '__main__':
-    main()
-
+    parser = argparse.ArgumentParser(description='Crawl Drive uploads')
+    parser.add_argument('-w', '--workers', type=int,
+            default=int(os.environ.get('SALLY_WORKERS', 1)),
+            help='worker processes, defaults to SALLY_WORKERS or 1')
+    args = parser.parse_args()
+    main(args.workers)
@@ -4,6 +4,7 @@ import cherrypy
 import requests
 from mongoengine import connect
 import model
+from jobs import JobService
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +12,8 @@ class HermitShell(object):
 
     def __init__(self):
         self.graph = 'https://graph.facebook.com'
+        # Crawl job queue served under /jobs
+        self.jobs = JobService()
 
 
     def get_long_ttl_token(self, accessToken):
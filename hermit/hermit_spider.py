@@ -1,81 +1,155 @@
+import argparse
 import os
-import sys
 import re
 import datetime
-import time
 import logging
-import requests
+import threading
 from mongoengine import connect
 import hermit.model as model
+from hermit.pipeline import Pipeline, Stage
+from hermit.tokens import TokenPool
 import sally.google.spreadsheet as gs
+import sally.snapshot as snapshot
+from sally import leads
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
 
 
 class HermitCrab(object):
-    """Facebook pages crawler"""
+    """Facebook pages crawler.
 
-    def __init__(self, source_file, spreadsheet, fb_user_id, *args, **kwargs):
+    Pages run through a staged pipeline, source -> fetch -> normalize ->
+    persist -> export, with bounded queues between stages. Look-alike pages
+    found by category skip the fetch stage."""
+
+    HEADER = ['SCORE', 'WEB SITE', 'ABOUT', 'CATEGORY', 'LIKES', 'TELPHONE',
+            'EMAIL', 'ADDRESS', 'CITY', 'COUNTRY', 'CRAWL DATE']
+
+    # Pages requested to Graph search for each paging cursor
+    PAGE_SIZE = 100
+    # Worker threads of the I/O bound stages, fetch and persist
+    WORKERS = 8
+
+    def __init__(self, source_file, spreadsheet, fb_user_id=None,
+            workers=WORKERS, *args, **kwargs):
+        self.source_file = source_file
         self.spreadsheetId = spreadsheet
-        self.config = gs.get_settings()
-        self.score = gs.get_score()
+        self.workers = workers
+        self.config = snapshot.get_settings()
+        self.score = snapshot.get_score()
         self.collection = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
         self.fb_user_id = fb_user_id
-        self.access_token = self.get_token()
+        # Requests are spread across every authorized user token
+        self.mongo_connect()
+        self.tokens = TokenPool.from_users(fb_user_id)
+        self.leads = leads.LeadStore()
         self.graph = 'https://graph.facebook.com'
-        self.sheet_rows = [
-                ['SCORE', 'WEB SITE', 'ABOUT', 'CATEGORY', 'LIKES', 'TELPHONE',
-                    'EMAIL', 'ADDRESS', 'CITY', 'COUNTRY', 'CRAWL DATE']
-                ]
+        self.rows = []
         self.categories = []
+        # Page IDs already processed, the same page shows up in several
+        # categories
+        self.seen = set()
+        self.lock = threading.Lock()
+
 
-        lines = ["%s" % str(l).rstrip() for l in gs.get_urls(source_file)]
+    def source(self):
+        """Yield Facebook page names listed in the source spreadsheet."""
+        lines = ["%s" % str(l).rstrip() for l in gs.get_urls(self.source_file)]
         fb = re.compile(r'facebook', re.IGNORECASE)
         self.start_urls = list(filter(
             fb.search,
             list(filter(None, ','.join(lines).split(',')))))
         logger.debug(self.start_urls)
-
         for url in self.start_urls:
-            response = self.parse_item(url.split('/')[1])
-            if 'error' in response:
-                logger.info(response['error']['message'])
-            else:
-                self.persist(response)
-                item = self.process_response(response)
-                row = self.build_row(item)
-                self.sheet_rows.append(row)
-            time.sleep(3)
+            yield url.split('/')[1]
+
+
+    def fetch(self, page):
+        """Return Graph response for given page or None on errors."""
+        response = self.parse_item(page)
+        if 'error' in response:
+            logger.info(response['error']['message'])
+            return None
+        return response
+
+
+    def normalize(self, page):
+        """Return (page, item) with qualified values of given page."""
+        self.seen.add(page.get('id'))
+        return page, self.process_response(page)
+
+
+    def store(self, entry):
+        """Persist page and queue its lead, returns the item."""
+        page, item = entry
+        self.persist(page)
+        with self.lock:
+            self.leads.add(leads.from_fbpage(page, item['score']))
+        return item
+
+
+    def export(self, item):
+        """Collect row for the results spreadsheet."""
+        row = self.build_row(item)
+        with self.lock:
+            self.rows.append(row)
+        return row
+
+
+    def stages(self, fetch=True):
+        """Return a new pipeline, without fetch stage for search results."""
+        stages = [
+                Stage('normalize', self.normalize),
+                Stage('persist', self.store, workers=self.workers),
+                Stage('export', self.export)
+                ]
+        if fetch:
+            stages.insert(0, Stage('fetch', self.fetch, workers=self.workers))
+        return Pipeline(*stages)
+
+
+    def run(self):
+        """Crawl source pages, then their look-alike pages by category, each
+        batch to its own sheet of the results spreadsheet.
 
-        # Send to google spreadsheet
-        self.insert_sheet(self.sheet_rows)
+        Returns dict of pipeline stats"""
+        stats = {}
+        pipeline = self.stages()
+        stats['pages'] = pipeline.run(self.source())
+        pipeline.report()
+        logger.info('Tokens: %s' % self.tokens.stats())
+        self.insert_sheet(self.rows, self.collection)
 
         # Go get pages alike
         if len(self.categories) > 1:
-            for cat in list(set(self.categories)):
-                rows = []
-                for i in self.search_alike(cat)['data']:
-                    self.persist(i)
-                    rows.append(self.build_row(self.process_response(i)))
-                    time.sleep(3)
-                self.insert_sheet(rows)
-
-        sys.exit(0)
-
-
-    def insert_sheet(self, rows):
-        """Create a Google spreadhseet and insert given rows to it."""
-        if len(rows) > 1:
-            spreadsheet = gs.create_spreadsheet("fb%s" % self.collection)
-            sheet = gs.create_sheet(
-                    spreadsheet['spreadsheetId'],
-                    self.collection)
-            results = gs.insert_to(
-                    spreadsheet['spreadsheetId'],
-                    self.collection,
-                    self.sheet_rows)
-            logger.debug(results)
+            self.rows = []
+            pipeline = self.stages(fetch=False)
+            stats['alike'] = pipeline.run(self.expand(set(self.categories)))
+            pipeline.report()
+            self.insert_sheet(self.rows, '%s_alike' % self.collection)
+
+        self.leads.flush()
+        return stats
+
+
+    def expand(self, categories):
+        """Yield look-alike pages of given _categories_, each page once."""
+        for category in categories:
+            for page in self.search_alike(category):
+                if page.get('id') in self.seen:
+                    continue
+                self.seen.add(page.get('id'))
+                yield page
+
+
+    def insert_sheet(self, rows, title):
+        """Add sheet _title_ with given rows to the results spreadsheet."""
+        if len(rows) > 0:
+            gs.write_sheet(self.spreadsheetId, title,
+                    [HermitCrab.HEADER] + rows)
+            logger.debug('%d rows to sheet %s of %s' % (len(rows), title,
+                self.spreadsheetId))
 
 
     def mongo_connect(self):
@@ -101,17 +175,6 @@ class HermitCrab(object):
         return score
 
 
-    def get_token(self):
-        """Return Facebook user token from data base."""
-        self.mongo_connect()
-        try:
-            user = model.User.objects(fb_userId=self.fb_user_id).get()
-            return user.fb_accessToken
-        except Exception as ex:
-            logger.error(__name__, exc_info=True)
-            return None
-
-
     def persist(self, item):
         """Persist item to database."""
         try:
@@ -137,16 +200,23 @@ class HermitCrab(object):
 
 
     def search_alike(self, category):
-        """Return related pages by category."""
-        query = "search?q=%s&limit=1000&metadata=1" % category
-        fields = str('&fields=about,category,contact_address,engagement,emails,'
-                'location,phone,website,category_list,description,'
+        """Yield related pages by category following paging cursors."""
+        query = "search?q=%s&limit=%d&metadata=1" % (category,
+                HermitCrab.PAGE_SIZE)
+        fields = str('&fields=id,about,category,contact_address,engagement,'
+                'emails,location,phone,website,category_list,description,'
                 'has_whatsapp_number,whatsapp_number,hometown,name,products,'
                 'rating_count,overall_star_rating,link,'
-                'connected_instagram_account&access_token=')
-        r = requests.get("%s/%s&type=page%s%s" % (self.graph, query, fields,
-            self.access_token))
-        return r.json()
+                'connected_instagram_account')
+        url = "%s/%s&type=page%s" % (self.graph, query, fields)
+        while url:
+            response = self.tokens.get(url)
+            if 'error' in response:
+                logger.info(response['error']['message'])
+                return
+            for page in response.get('data', []):
+                yield page
+            url = response.get('paging', {}).get('next')
 
 
     def process_response(self, response):
@@ -166,7 +236,7 @@ class HermitCrab(object):
         if 'engagement' in response:
             item['likes'] = response['engagement']['count']
         else:
-            item['engagement'] = None
+            item['likes'] = None
         if 'phone' in response:
             item['phone'] = response['phone']
         else:
@@ -212,7 +282,24 @@ class HermitCrab(object):
                 'location,phone,website,category_list,description,'
                 'has_whatsapp_number,whatsapp_number,hometown,name,products,'
                 'rating_count,overall_star_rating,link,'
-                'connected_instagram_account&access_token=')
-        r = requests.get("%s/%s%s%s" % (self.graph, page, fields,
-            self.access_token))
-        return r.json()
+                'connected_instagram_account')
+        return self.tokens.get("%s/%s%s" % (self.graph, page, fields))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl Facebook pages')
+    parser.add_argument('source_file', help='source spreadsheet ID')
+    parser.add_argument('spreadsheet', help='results spreadsheet ID')
+    parser.add_argument('--fb-user-id',
+            help='use only this Facebook user token, defaults to all users')
+    parser.add_argument('-w', '--workers', type=int,
+            default=HermitCrab.WORKERS,
+            help='threads of fetch and persist stages')
+    args = parser.parse_args()
+    crab = HermitCrab(args.source_file, args.spreadsheet, args.fb_user_id,
+            workers=args.workers)
+    crab.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Crawl job endpoints of the hermit app, jobs are run by sally.worker.
+
+    POST /jobs/submit {"source": ID, "crab": "lightfoot", "priority": 0,
+        "owner": "acme", "options": {"spreadsheet": ID, "fb_user_id": ID}}
+    GET /jobs?owner=&status=&limit=
+    GET /jobs/status/<job ID>
+    GET /jobs/stats?since=
+"""
+import datetime
+import logging
+import cherrypy
+from bson.objectid import ObjectId
+from sally.jobqueue import JobQueue
+
+logger = logging.getLogger(__name__)
+
+# Most jobs listed at once
+MAX_LIMIT = 1000
+
+
+def public(value):
+    """Return _value_ with ObjectId and datetime values as str."""
+    if isinstance(value, dict):
+        return dict((k, public(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [public(v) for v in value]
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+class JobService(object):
+
+    def __init__(self, queue=None):
+        self._queue = queue
+
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            self._queue = JobQueue()
+        return self._queue
+
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def index(self, owner=None, status=None, limit=100):
+        try:
+            limit = max(1, min(int(limit), MAX_LIMIT))
+        except ValueError:
+            return {'status': 400, 'statusText': 'limit must be a number'}
+        jobs = self.queue.find(owner, status, limit)
+        return {'status': 200, 'statusText': 'OK', 'jobs': public(jobs)}
+
+
+    @cherrypy.expose
+    @cherrypy.tools.json_in()
+    @cherrypy.tools.json_out()
+    def submit(self):
+        data = cherrypy.request.json
+        logger.debug(data)
+        try:
+            job_id = self.queue.submit(data.get('source'), data.get('crab'),
+                    data.get('priority', 0), data.get('owner'),
+                    data.get('options'))
+        except (ValueError, TypeError) as ex:
+            return {'status': 400, 'statusText': str(ex)}
+        except Exception:
+            cherrypy.log("[submit] Can't queue job", traceback=True)
+            return {'status': 500, 'statusText': "Can't queue job"}
+        return {'status': 201, 'statusText': 'Queued', 'job': job_id}
+
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def status(self, job_id):
+        job = self.queue.get(job_id)
+        if job is None:
+            return {'status': 404, 'statusText': 'No such job'}
+        return {'status': 200, 'statusText': 'OK', 'job': public(job)}
+
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def stats(self, since=3600):
+        try:
+            since = max(1, int(since))
+        except ValueError:
+            return {'status': 400, 'statusText': 'since must be seconds'}
+        return dict(self.queue.stats(since), status=200, statusText='OK')
@@ -0,0 +1,131 @@
+# -*- encoding: utf-8 -*-
+"""Staged streaming pipeline with bounded queues between stages.
+
+Every stage runs its function in its own worker threads, reading from a
+bounded inbox and writing to the next stage inbox, so a slow stage makes
+the previous ones wait instead of piling up items in memory. Stages keep
+their own counters to be measured on their own."""
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# End of stream marker, one for each worker of the receiving stage
+STOP = object()
+
+
+class Stage(object):
+    """Apply _fn_ to every item, results other than None go downstream."""
+
+    def __init__(self, name, fn, workers=1, size=100):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inbox = queue.Queue(maxsize=size)
+        self.next = None
+        self.lock = threading.Lock()
+        self.threads = []
+        self.running = 0
+        self.stats = {'in': 0, 'out': 0, 'errors': 0, 'busy': 0.0}
+
+
+    def put(self, item):
+        self.inbox.put(item)
+
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.stats[key] += value
+
+
+    def work(self):
+        while True:
+            item = self.inbox.get()
+            if item is STOP:
+                break
+            self.count('in')
+            started = time.time()
+            try:
+                result = self.fn(item)
+            except Exception as ex:
+                logger.error('[%s] %s' % (self.name, ex), exc_info=True)
+                self.count('errors')
+                result = None
+            self.count('busy', time.time() - started)
+            if result is not None:
+                self.count('out')
+                if self.next is not None:
+                    self.next.put(result)
+
+        with self.lock:
+            self.running -= 1
+            last = self.running == 0
+        if last and self.next is not None:
+            self.next.close()
+
+
+    def start(self):
+        self.running = self.workers
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.work,
+                    name='%s-%d' % (self.name, i), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+
+    def close(self):
+        """No more items, workers stop once the inbox is drained."""
+        for i in range(self.workers):
+            self.inbox.put(STOP)
+
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+class Pipeline(object):
+    """Chain of stages fed from a source iterable."""
+
+    def __init__(self, *stages):
+        self.stages = stages
+        for stage, next_ in zip(stages, stages[1:]):
+            stage.next = next_
+        self.stats = {}
+
+
+    def run(self, source):
+        """Feed _source_ items through every stage, blocks until all of
+        them are processed.
+
+        Returns dict of stats by stage"""
+        started = time.time()
+        for stage in self.stages:
+            stage.start()
+
+        fed = 0
+        for item in source:
+            self.stages[0].put(item)
+            fed += 1
+        self.stages[0].close()
+
+        for stage in self.stages:
+            stage.join()
+
+        self.stats = {'source': {'out': fed}}
+        for stage in self.stages:
+            self.stats[stage.name] = dict(stage.stats, workers=stage.workers)
+        self.stats['elapsed'] = time.time() - started
+        return self.stats
+
+
+    def report(self):
+        for stage in self.stages:
+            s = self.stats[stage.name]
+            logger.info('[%s] %d in, %d out, %d errors, %.2fs busy, %d workers'
+                    % (stage.name, s['in'], s['out'], s['errors'], s['busy'],
+                        s['workers']))
+        logger.info('[pipeline] %d items in %.2fs' % (
+            self.stats['source']['out'], self.stats['elapsed']))
@@ -0,0 +1,145 @@
+# -*- encoding: utf-8 -*-
+"""Pool of Facebook user tokens spreading Graph requests across users.
+
+Usage of every token is tracked from the rate limit headers Graph returns,
+requests go to the least used token. Throttled tokens rest until Graph lets
+them back, expired or invalid ones are retired."""
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+import hermit.model as model
+
+logger = logging.getLogger(__name__)
+
+# Graph error codes
+EXPIRED = (190, 102)
+THROTTLED = (4, 17, 32, 613, 80001, 80004)
+
+# Usage percent at which a token rests before Graph throttles it
+HIGH_USAGE = 90
+# Seconds a throttled token rests when Graph doesn't say how long
+REST = 600
+
+
+class NoTokens(Exception):
+    """Every token is retired or resting."""
+
+
+class Token(object):
+
+    def __init__(self, value, user_id=None):
+        self.value = value
+        self.user_id = user_id
+        self.usage = 0
+        self.calls = 0
+        self.until = 0
+        self.retired = False
+
+
+    def available(self, now):
+        return not self.retired and self.until <= now
+
+
+def usage(headers):
+    """Return highest usage percent from Graph rate limit headers."""
+    values = []
+    app = headers.get('x-app-usage')
+    if app:
+        values += json.loads(app).values()
+    business = headers.get('x-business-use-case-usage')
+    if business:
+        for uses in json.loads(business).values():
+            for use in uses:
+                values += [use.get('call_count', 0), use.get('total_time', 0),
+                        use.get('total_cputime', 0)]
+                if use.get('estimated_time_to_regain_access'):
+                    values.append(100)
+    return max([v for v in values if isinstance(v, (int, float))] or [0])
+
+
+def with_token(url, token):
+    """Return _url_ with its access_token replaced by _token_, paging URLs
+    come with the token of the previous request."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if k != 'access_token']
+    query.append(('access_token', token))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class TokenPool(object):
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.lock = threading.Lock()
+
+
+    @classmethod
+    def from_users(cls, fb_user_id=None):
+        """Return pool with the long lived tokens of every authorized user,
+        or only of _fb_user_id_. A MongoDB connection must be established."""
+        users = model.User.objects(fb_accessToken__ne=None)
+        if fb_user_id:
+            users = users.filter(fb_userId=fb_user_id)
+        tokens = [Token(u.fb_accessToken, u.fb_userId) for u in users]
+        logger.info('%d Facebook tokens loaded' % len(tokens))
+        return cls(tokens)
+
+
+    def acquire(self):
+        """Return the least used available token."""
+        now = time.time()
+        with self.lock:
+            tokens = [t for t in self.tokens if t.available(now)]
+            if not tokens:
+                raise NoTokens('No Facebook token available')
+            token = min(tokens, key=lambda t: (t.usage, t.calls))
+            token.calls += 1
+            return token
+
+
+    def report(self, token, response):
+        """Update _token_ usage from Graph _response_.
+
+        Returns True if the request should be retried with another token"""
+        with self.lock:
+            token.usage = usage(response.headers)
+            if token.usage >= HIGH_USAGE:
+                token.until = time.time() + REST
+            try:
+                error = response.json().get('error')
+            except ValueError:
+                error = None
+            if not error:
+                return False
+            if error.get('code') in EXPIRED:
+                token.retired = True
+                logger.warning('Retired token of user %s: %s'
+                        % (token.user_id, error.get('message')))
+                return True
+            if error.get('code') in THROTTLED:
+                token.until = time.time() + REST
+                logger.info('Token of user %s throttled' % token.user_id)
+                return True
+            return False
+
+
+    def get(self, url):
+        """GET Graph _url_ with a pooled token, throttled or expired tokens
+        are swapped for another one.
+
+        Returns response JSON"""
+        for attempt in range(max(1, len(self.tokens))):
+            token = self.acquire()
+            response = requests.get(with_token(url, token.value))
+            if not self.report(token, response):
+                break
+        return response.json()
+
+
+    def stats(self):
+        return [{'user': t.user_id, 'calls': t.calls, 'usage': t.usage,
+            'retired': t.retired} for t in self.tokens]
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""Per-site aggregation of lightfoot page items.
+
+lightfoot yields one item for the start page of a site, with the number of
+pages crawled of the site in its pages field, and one partial item for each
+follow-up page. Pages are buffered by base_url until every page of a site
+arrived, then merged into a single item which goes down the pipeline once:
+one Mongo document, one sheet row and one qualify() for each site.
+
+Memory is bounded, the least recently updated sites are released when
+AGGREGATE_MAX_SITES are buffered, and sites waiting longer than
+AGGREGATE_TIMEOUT seconds are released with the pages they got.
+
+Merged items released by a timer, spider_idle or another site's page are
+sent to the item processor directly, outside of the scraper slot: they are
+not counted against SCRAPER_SLOT_MAX_ACTIVE_SIZE, the buffer bound stands
+in for it. The pipelines after this one are synchronous, so those items
+are stored before the spider can close."""
+import collections
+import logging
+import time
+from scrapy import logformatter, signals
+from scrapy.exceptions import DropItem
+from twisted.internet import task
+
+logger = logging.getLogger(__name__)
+
+MAX_SITES = 1000
+TIMEOUT = 120
+
+
+class Absorbed(DropItem):
+    """Page item buffered to be merged into its site item."""
+
+
+class LogFormatter(logformatter.LogFormatter):
+    """Absorbed pages are not dropped results, log them at debug level."""
+
+    def dropped(self, item, exception, response, spider):
+        entry = super(LogFormatter, self).dropped(item, exception, response,
+                spider)
+        if isinstance(exception, Absorbed):
+            entry['level'] = logging.DEBUG
+        return entry
+
+
+def strongest(votes):
+    """Return e-commerce software found in most pages or N/E."""
+    found = votes.most_common(1)
+    return found[0][0] if found else 'N/E'
+
+
+class SiteBuffer(object):
+    """Pages of the sites being crawled keyed by base_url, _capacity_ sites
+    at most in least recently updated order."""
+
+    def __init__(self, capacity=MAX_SITES, timeout=TIMEOUT):
+        self.capacity = capacity
+        self.timeout = timeout
+        self.sites = collections.OrderedDict()
+        self.stats = collections.Counter()
+
+
+    def add(self, item, now=None):
+        """Buffer page _item_.
+
+        Returns list of merged items released, the one of a complete site or
+        the ones evicted to make room"""
+        key = item['base_url']
+        site = self.sites.get(key)
+        if site is None:
+            site = self.sites[key] = {'item': None, 'pages': [], 'expected': 0,
+                    'received': 0, 'started': now or time.time(),
+                    'ecommerce': collections.Counter()}
+        else:
+            self.sites.move_to_end(key)
+        self.stats['pages'] += 1
+
+        site['received'] += 1
+        if item.get('ecommerce') not in (None, 'N/E'):
+            site['ecommerce'][item['ecommerce']] += 1
+        if 'pages' in item:
+            # Start page, the same site given twice adds its pages
+            site['expected'] += item['pages']
+            if site['item'] is None:
+                site['item'] = item
+                for page in site['pages']:
+                    item.merge(page)
+                site['pages'] = []
+            else:
+                site['item'].merge(item)
+        elif site['item'] is not None:
+            site['item'].merge(item)
+        else:
+            site['pages'].append(item)
+
+        released = []
+        if site['item'] is not None and site['received'] >= site['expected']:
+            released.append(self.release(key))
+        while len(self.sites) > self.capacity:
+            self.stats['evicted'] += 1
+            released.append(self.release(next(iter(self.sites))))
+        return [i for i in released if i is not None]
+
+
+    def expired(self, now=None):
+        """Return merged items of sites waiting longer than timeout."""
+        deadline = (now or time.time()) - self.timeout
+        keys = [k for k, site in self.sites.items()
+                if site['started'] <= deadline]
+        self.stats['expired'] += len(keys)
+        return [i for i in map(self.release, keys) if i is not None]
+
+
+    def drain(self):
+        """Return merged items of every buffered site."""
+        return [i for i in map(self.release, list(self.sites))
+                if i is not None]
+
+
+    def release(self, key):
+        """Return merged item of site _key_, or None if its start page never
+        arrived, I.E. the site was released earlier by timeout."""
+        site = self.sites.pop(key)
+        item = site['item']
+        if item is None:
+            self.stats['late'] += len(site['pages'])
+            return None
+        item['ecommerce'] = strongest(site['ecommerce'])
+        self.stats['sites'] += 1
+        return item
+
+
+    def __len__(self):
+        return len(self.sites)
+
+
+class AggregationPipeline(object):
+    """Merge the pages of every site into one item, must run before any
+    pipeline storing items."""
+
+    def __init__(self, crawler, capacity=MAX_SITES, timeout=TIMEOUT):
+        self.crawler = crawler
+        self.buffer = SiteBuffer(capacity, timeout)
+        self.released = set()
+        self.task = None
+
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(crawler,
+                capacity=crawler.settings.getint('AGGREGATE_MAX_SITES',
+                    MAX_SITES),
+                timeout=crawler.settings.getfloat('AGGREGATE_TIMEOUT', TIMEOUT))
+        crawler.signals.connect(pipeline.spider_idle,
+                signal=signals.spider_idle)
+        return pipeline
+
+
+    def open_spider(self, spider):
+        self.spider = spider
+        self.task = task.LoopingCall(self.flush_expired)
+        self.task.start(max(1, self.buffer.timeout / 4), now=False)
+
+
+    def flush_expired(self):
+        self.emit(self.buffer.expired())
+
+
+    def spider_idle(self, spider):
+        self.emit(self.buffer.drain())
+
+
+    def close_spider(self, spider):
+        """Pipelines are closed in order, sites left are stored before the
+        next pipelines close."""
+        if self.task and self.task.running:
+            self.task.stop()
+        self.emit(self.buffer.drain())
+        for key, value in self.buffer.stats.items():
+            self.crawler.stats.set_value('aggregate/%s' % key, value)
+
+
+    def emit(self, items):
+        """Send merged _items_ down the whole item pipeline, bypassing the
+        scraper slot, see module docs."""
+        for item in items:
+            self.released.add(id(item))
+            dfd = self.crawler.engine.scraper.itemproc.process_item(item,
+                    self.spider)
+            dfd.addCallbacks(self.scraped, self.failed, errbackArgs=(item,))
+
+
+    def scraped(self, item):
+        return self.crawler.signals.send_catch_log_deferred(
+                signal=signals.item_scraped, item=item, response=None,
+                spider=self.spider)
+
+
+    def failed(self, failure, item):
+        if not failure.check(DropItem):
+            logger.error('Error processing %s' % item.get('base_url'),
+                    exc_info=(failure.type, failure.value, failure.tb))
+        else:
+            logger.warning('Dropped %s: %s' % (item.get('base_url'),
+                failure.value))
+
+
+    def process_item(self, item, spider):
+        if id(item) in self.released:
+            self.released.discard(id(item))
+            return item
+        released = self.buffer.add(item)
+        if any(i is item for i in released):
+            # Single page sites go on without a second trip down the pipeline
+            self.emit([i for i in released if i is not item])
+            return item
+        self.emit(released)
+        raise Absorbed('Page of %s buffered' % item.get('base_url'))
@@ -1,15 +1,170 @@
-from eve import Eve
+# -*- coding: utf-8 -*-
+"""Read API for crawl results.
 
-app = Eve()
+Crawl collections (YYYYMMDD_hhmmss) are discovered on their own and indexed
+on first use. Leads are served with keyset (cursor) pagination ordered by
+score, large exports are streamed as NDJSON.
 
-def use_collection('20180110_140045'):
-    app.config['DOMAIN'] =  {'20180110_140045': {}}
-    domain_copy = copy.deepcopy(app.config['DOMAIN'])
-    for resource, settings in domain_.items():
-        app.register_resource(resource, settings)
+    GET /v1/collections
+    GET /v1/leads/<collection>?limit=&cursor=&fields=&ecommerce=&min_score=&since=
+    GET /v1/leads/<collection>/export?fields=&ecommerce=&min_score=&since=
+"""
+import base64
+import datetime
+import json
+import logging
+import re
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from flask import Flask, Response, abort, jsonify, request
+from pymongo import ASCENDING, DESCENDING
+from sally import db
+from sally import settings
+
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+
+COLLECTION = re.compile(r'^\d{8}_\d{6}$')
+
+# Every query sorts by (score, _id) or filters by one of these
+INDEXES = [
+        [('score', DESCENDING), ('_id', ASCENDING)],
+        [('base_url', ASCENDING)],
+        [('ecommerce', ASCENDING), ('score', DESCENDING), ('_id', ASCENDING)],
+        [('last_crawl', DESCENDING), ('score', DESCENDING), ('_id', ASCENDING)],
+        ]
+
+FIELDS = ['base_url', 'score', 'email', 'telephone', 'ecommerce', 'network',
+        'offer', 'last_crawl']
+
+_db = None
+_indexed = set()
+
+
+def get_db():
+    global _db
+    if _db is None:
+        _db = db.get_db()
+    return _db
+
+
+def discover():
+    """Return crawl collection names, newest first. New collections are
+    indexed as they are found."""
+    names = sorted((c['name'] for c in get_db().list_collections()
+        if COLLECTION.match(c['name'])), reverse=True)
+    for name in names:
+        if name not in _indexed:
+            for keys in INDEXES:
+                get_db()[name].create_index(keys, background=True)
+            _indexed.add(name)
+    return names
+
+
+def encode_cursor(doc):
+    """Return opaque cursor pointing after given document."""
+    key = json.dumps([doc['score'], str(doc['_id'])])
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return (score, _id) from given cursor."""
+    score, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return score, ObjectId(id_)
+
+
+def build_query(args):
+    """Return Mongo filter from request _args_."""
+    query = {}
+    if args.get('ecommerce'):
+        query['ecommerce'] = args['ecommerce']
+    if args.get('base_url'):
+        query['base_url'] = args['base_url']
+    if args.get('min_score'):
+        query['score'] = {'$gte': float(args['min_score'])}
+    if args.get('since'):
+        query['last_crawl'] = {
+                '$gte': datetime.datetime.strptime(args['since'], '%Y-%m-%d')}
+    return query
+
+
+def page_size(args):
+    """Return page size from request _args_ between 1 and
+    API_MAX_PAGE_SIZE, raise ValueError if it's not a number."""
+    limit = int(args.get('limit', settings.API_PAGE_SIZE))
+    return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+
+def after(query, cursor):
+    """Return _query_ restricted to documents after _cursor_ in
+    (score desc, _id asc) order."""
+    score, id_ = decode_cursor(cursor)
+    return {'$and': [query, {'$or': [
+        {'score': {'$lt': score}},
+        {'score': score, '_id': {'$gt': id_}}
+        ]}]}
+
+
+def projection(args):
+    fields = args.get('fields')
+    fields = fields.split(',') if fields else FIELDS
+    return dict([(f, 1) for f in fields] + [('score', 1)])
+
+
+def to_json(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def get_collection(name):
+    if not COLLECTION.match(name) or name not in discover():
+        abort(404)
+    return get_db()[name]
+
+
+@app.route('/%s/collections' % settings.API_VERSION)
+def collections():
+    return jsonify({'_items': discover()})
+
+
+@app.route('/%s/leads/<name>' % settings.API_VERSION)
+def leads(name):
+    collection = get_collection(name)
+    try:
+        limit = page_size(request.args)
+        query = build_query(request.args)
+        if request.args.get('cursor'):
+            query = after(query, request.args['cursor'])
+    except (ValueError, TypeError, InvalidId):
+        abort(400)
+    docs = list(collection.find(query, projection(request.args))
+            .sort([('score', DESCENDING), ('_id', ASCENDING)])
+            .limit(limit))
+    body = {
+            '_items': docs,
+            '_next': encode_cursor(docs[-1]) if len(docs) == limit else None
+            }
+    return Response(json.dumps(body, default=to_json),
+            mimetype='application/json')
+
+
+@app.route('/%s/leads/<name>/export' % settings.API_VERSION)
+def export(name):
+    collection = get_collection(name)
+    try:
+        query = build_query(request.args)
+    except ValueError:
+        abort(400)
+    cursor = collection.find(query, projection(request.args), batch_size=1000)
+
+    def generate():
+        for doc in cursor:
+            yield json.dumps(doc, default=to_json) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
 
-# allowed_filters = ['base_url']
-# additional_lookup
 
 if __name__ == '__main__':
     app.run()
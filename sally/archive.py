@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Compressed columnar archive of crawl results.
+
+Each crawl is written as Parquet files partitioned by crawl date and
+country TLD under ARCHIVE_DIR:
+
+    <ARCHIVE_DIR>/date=YYYY-MM-DD/tld=mx/<collection>_<shard>_<run>_<n>.parquet
+
+Low cardinality columns (ecommerce, tld, networks) are dictionary encoded,
+query() reads only the partitions and columns it is asked for. pyarrow
+is imported on first use, crawls without an archive never load it."""
+import datetime
+import functools
+import glob
+import logging
+import os
+from scrapy.exceptions import NotConfigured
+from sally import domains
+
+logger = logging.getLogger(__name__)
+
+# Rows buffered before a Parquet file is written
+BATCH = 5000
+
+# Parquet dictionary encoding for repetitive columns
+DICTIONARY = ['ecommerce', 'tld', 'collection', 'network', 'offer']
+
+
+@functools.lru_cache(maxsize=None)
+def schema():
+    """Return Arrow schema of archive rows."""
+    import pyarrow as pa
+    return pa.schema([
+        ('base_url', pa.string()),
+        ('url', pa.string()),
+        ('title', pa.string()),
+        ('score', pa.float64()),
+        ('ecommerce', pa.string()),
+        ('cart', pa.bool_()),
+        ('secure_url', pa.bool_()),
+        ('email', pa.list_(pa.string())),
+        ('telephone', pa.list_(pa.string())),
+        ('network', pa.list_(pa.string())),
+        ('offer', pa.list_(pa.string())),
+        ('tld', pa.string()),
+        ('collection', pa.string()),
+        ('last_crawl', pa.timestamp('s')),
+        ])
+
+
+def tld(host):
+    """Return top level domain of _host_, I.E. mx for www.example.com.mx, or
+    none for IP addresses and unknown suffixes"""
+    suffix = domains.public_suffix(host)
+    return suffix.rsplit('.', 1)[-1] if suffix else 'none'
+
+
+def to_row(item, collection):
+    """Return archive row for given item."""
+    return {
+            'base_url': item['base_url'],
+            'url': item['url'],
+            'title': item['title'],
+            'score': float(item['score']),
+            'ecommerce': item['ecommerce'],
+            'cart': bool(item['cart']),
+            'secure_url': bool(item['secure_url']),
+            'email': list(item['email'] or []),
+            'telephone': list(item['telephone'] or []),
+            'network': list(item['network'] or []),
+            'offer': list(item['offer'] or []),
+            'tld': tld(item['base_url']),
+            'collection': collection,
+            'last_crawl': item['last_crawl'],
+            }
+
+
+def to_table(rows):
+    """Return Arrow table with schema() columns from given rows."""
+    import pyarrow as pa
+    return pa.Table.from_arrays(
+            [pa.array([r[f.name] for r in rows], type=f.type)
+                for f in schema()], schema=schema())
+
+
+def partitions(path, since=None, until=None, tlds=None):
+    """Return Parquet files in partitions matching given date range and TLDs.
+
+    Arguments:
+    since, until - datetime.date, both inclusive
+    tlds - list of TLDs I.E. ['mx', 'com']"""
+    files = []
+    for directory in sorted(glob.glob(os.path.join(path, 'date=*', 'tld=*'))):
+        date_, tld_ = [p.split('=', 1)[1] for p
+                in directory.split(os.sep)[-2:]]
+        if since and date_ < since.isoformat():
+            continue
+        if until and date_ > until.isoformat():
+            continue
+        if tlds and tld_ not in tlds:
+            continue
+        files += sorted(glob.glob(os.path.join(directory, '*.parquet')))
+    return files
+
+
+def query(columns, since=None, until=None, tlds=None, path=None):
+    """Return Arrow table with only the given _columns_ of archived results.
+
+    Use .to_pandas() on the result for analysis. I.E.
+
+        query(['base_url', 'score', 'ecommerce'], tlds=['mx'])"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    path = path or os.environ['SALLY_ARCHIVE_DIR']
+    tables = [pq.read_table(f, columns=columns) for f
+            in partitions(path, since, until, tlds)]
+    if not tables:
+        types = dict((f.name, f.type) for f in schema())
+        return pa.Table.from_arrays(
+                [pa.array([], type=types[c]) for c in columns], names=columns)
+    return pa.concat_tables(tables)
+
+
+class ArchivePipeline(object):
+    """Write crawled items to the Parquet archive, enabled when ARCHIVE_DIR
+    setting or SALLY_ARCHIVE_DIR environment variable is set."""
+
+    def __init__(self, path, compression='zstd', batch=BATCH):
+        self.path = path
+        self.compression = compression
+        self.batch = batch
+        self.rows = []
+        self.files = 0
+
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('ARCHIVE_DIR',
+                os.environ.get('SALLY_ARCHIVE_DIR'))
+        if not path:
+            raise NotConfigured('ARCHIVE_DIR is not set')
+        return cls(path,
+                compression=crawler.settings.get('ARCHIVE_COMPRESSION', 'zstd'),
+                batch=crawler.settings.getint('ARCHIVE_BATCH', BATCH))
+
+
+    def open_spider(self, spider):
+        self.collection = getattr(spider, 'collection',
+                datetime.datetime.now().strftime('%Y%m%d_%H%M%S'))
+        self.shard = (getattr(spider, 'shard', None) or '0').split('/')[0]
+        # Resumed jobs keep their collection, don't overwrite earlier files
+        self.run = datetime.datetime.now().strftime('%H%M%S')
+
+
+    def write(self):
+        """Write buffered rows, one file for each date and TLD partition."""
+        import pyarrow.parquet as pq
+        groups = {}
+        for row in self.rows:
+            key = (row['last_crawl'].strftime('%Y-%m-%d'), row['tld'])
+            groups.setdefault(key, []).append(row)
+        for (date_, tld_), rows in groups.items():
+            directory = os.path.join(self.path, 'date=%s' % date_,
+                    'tld=%s' % tld_)
+            os.makedirs(directory, exist_ok=True)
+            filename = os.path.join(directory, '%s_%s_%s_%d.parquet'
+                    % (self.collection, self.shard, self.run, self.files))
+            pq.write_table(to_table(rows), filename,
+                    compression=self.compression, use_dictionary=DICTIONARY)
+            logger.debug('Archived %d rows to %s' % (len(rows), filename))
+        self.files += 1
+        self.rows = []
+
+
+    def close_spider(self, spider):
+        if self.rows:
+            self.write()
+
+
+    def process_item(self, item, spider):
+        self.rows.append(to_row(item, self.collection))
+        if len(self.rows) >= self.batch:
+            self.write()
+        return item
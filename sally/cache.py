@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Local on disk caches shared by crawler processes."""
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Writes between prunes of expired and extra entries
+PRUNE_EVERY = 1000
+# Entries of the memory layer of a disk cache
+MEMORY_SIZE = 10000
+
+_caches = {}
+_lock = threading.Lock()
+
+
+def cache_path(name):
+    """Return path of _name_ in SALLY_CACHE_DIR, defaults to /tmp/sally."""
+    directory = os.environ.get('SALLY_CACHE_DIR', '/tmp/sally')
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+class MemoryCache(object):
+    """Values by key in memory, entries expire after _ttl_ seconds and the
+    least recently used ones are dropped over _size_ entries."""
+
+    def __init__(self, ttl=86400, size=MEMORY_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+
+
+    def get(self, key, default=None):
+        """Return value of _key_ or _default_ if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            if entry[1] < time.time() - self.ttl:
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return entry[0]
+
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+
+class DiskCache(object):
+    """JSON values by key in a sqlite file of the cache directory. Entries
+    expire after _ttl_ seconds, the oldest ones are pruned over _size_
+    entries. Processes sharing the file see each other writes, _memory_ keeps
+    decoded values of this process for as long."""
+
+    def __init__(self, name, ttl=86400, size=100000):
+        self.path = cache_path('%s.sqlite' % name)
+        self.ttl = ttl
+        self.size = size
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+        self.writes = 0
+        self.memory = MemoryCache(ttl)
+        self.db = sqlite3.connect(self.path, timeout=30,
+                check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value TEXT, created REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS cache_created '
+                'ON cache (created)')
+
+
+    def get(self, key, default=None):
+        """Return value of _key_ or _default_ if missing or expired."""
+        with self.lock:
+            row = self.db.execute('SELECT value, created FROM cache '
+                    'WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time() - self.ttl:
+            self.stats['miss'] += 1
+            return default
+        self.stats['hit'] += 1
+        return json.loads(row[0])
+
+
+    def set(self, key, value):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                    (key, json.dumps(value), time.time()))
+            self.writes += 1
+        self.stats['set'] += 1
+        if self.writes % PRUNE_EVERY == 0:
+            self.prune()
+
+
+    def prune(self):
+        """Delete expired entries and the oldest ones over size."""
+        with self.lock:
+            self.db.execute('DELETE FROM cache WHERE created < ?',
+                    (time.time() - self.ttl,))
+            self.db.execute('DELETE FROM cache WHERE key IN (SELECT key '
+                    'FROM cache ORDER BY created DESC LIMIT -1 OFFSET ?)',
+                    (self.size,))
+
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def get_cache(name, ttl=86400, size=100000):
+    """Return DiskCache _name_ of this process, shared by all its spiders.
+    sqlite connections don't survive a fork, workers open their own."""
+    key = (name, os.getpid())
+    with _lock:
+        if key not in _caches:
+            _caches[key] = DiskCache(name, ttl, size)
+        return _caches[key]
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Index of class attribute tokens of a page.
+
+Every class attribute of the page is split into interned tokens, I.E.
+"woocommerce-mini-cart btn" counts woocommerce-mini-cart, woocommerce,
+mini, cart and btn once each. Shopping signals are then
+answered with dictionary lookups instead of scanning class strings."""
+import collections
+import re
+import sys
+
+# Class tokens telling a page sells online, by signal
+SIGNALS = {
+        'cart': ['cart', 'carrito', 'minicart', 'shoppingcart'],
+        'checkout': ['checkout', 'pagar', 'comprar', 'buy'],
+        'basket': ['basket', 'cesta', 'bolsa'],
+        'payment': ['payment', 'paypal', 'stripe', 'mercadopago', 'conekta',
+            'openpay', 'oxxo'],
+        }
+
+PARTS = re.compile(r'[-_]+')
+
+
+def tokens(value):
+    """Yield tokens of class attribute _value_ with their - and _ parts."""
+    for token in value.lower().split():
+        yield token
+        parts = [p for p in PARTS.split(token) if p]
+        if len(parts) > 1:
+            for part in set(parts):
+                yield part
+
+
+class ClassIndex(object):
+
+    def __init__(self, values=()):
+        self.counts = collections.Counter()
+        for value in values:
+            self.counts.update(sys.intern(t) for t in tokens(value))
+
+
+    @classmethod
+    def from_page(cls, page):
+        """Return index of the class attributes of every element of
+        sally.text.Page _page_."""
+        return cls(page.values('*', 'class'))
+
+
+    def __contains__(self, token):
+        return token in self.counts
+
+
+    def count(self, token):
+        return self.counts.get(token, 0)
+
+
+    def signals(self, signals=SIGNALS):
+        """Return dict of signal: class tokens found, only found signals."""
+        found = {}
+        for signal, names in signals.items():
+            count = sum(self.count(n) for n in names)
+            if count:
+                found[signal] = count
+        return found
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""MongoDB connection helpers for Sally crawler."""
+import os
+import logging
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+
+def get_uri():
+    """Return MongoDB URI from environment, Mongo Atlas is preferred."""
+    if os.environ.get('MONGO_ATLAS_URI'):
+        # Prefer Mongo Atlas URI over anything else
+        return os.environ['MONGO_ATLAS_URI']
+    if os.environ.get('MONGO_USER') and os.environ.get('MONGO_PASSWORD'):
+        return ("mongodb://" + os.environ['MONGO_USER'] + ":"
+                + os.environ['MONGO_PASSWORD'] + "@" + os.environ['MONGO_HOST'])
+    return "mongodb://" + os.environ['MONGO_HOST']
+
+
+def get_db(uri=None, dbname=None):
+    """Return a database handle, its client is reachable as _db.client_."""
+    client = pymongo.MongoClient(uri or get_uri())
+    return client[dbname or os.environ['MONGO_DBNAME']]
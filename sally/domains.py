@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Registrable domain lookups over a memory mapped public suffix list.
+
+The public suffix list is compiled once into a sorted file of fixed width
+records under the cache directory, then memory mapped read only and binary
+searched, so every worker process shares the same pages instead of loading
+its own copy. Data comes from SALLY_SUFFIX_LIST (a public_suffix_list.dat
+file) or the snapshot bundled with tldextract, it is never fetched over the
+network. Both keep rules of the private section, I.E. a.blogspot.com is a
+registrable domain."""
+import functools
+import hashlib
+import importlib.util
+import json
+import mmap
+import os
+import threading
+from urllib.parse import urlsplit
+from sally.cache import cache_path
+
+MAGIC = b'sally-psl 2'
+# Header: MAGIC, record width and count padded to HEADER bytes
+HEADER = 64
+
+_table = None
+_lock = threading.Lock()
+
+
+def source_path():
+    """Return path of the public suffix list to compile."""
+    path = os.environ.get('SALLY_SUFFIX_LIST')
+    if path:
+        return path
+    # Located without importing tldextract
+    spec = importlib.util.find_spec('tldextract')
+    if spec is None or not spec.submodule_search_locations:
+        raise RuntimeError('Set SALLY_SUFFIX_LIST or install tldextract')
+    return os.path.join(list(spec.submodule_search_locations)[0],
+            '.tld_set_snapshot')
+
+
+def parse(text):
+    """Return suffix rules from tldextract JSON snapshot or
+    public_suffix_list.dat _text_, ICANN and private sections."""
+    if text.lstrip().startswith('['):
+        return [r.strip().lower() for r in json.loads(text) if r.strip()]
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('//'):
+            rules.append(line.split()[0].lower())
+    return rules
+
+
+def compile_rules(rules, path):
+    """Write sorted _rules_ to _path_ as fixed width records."""
+    records = sorted(set(r.encode('utf-8') for r in rules))
+    width = max(len(r) for r in records) + 1
+    header = b'%s %d %d' % (MAGIC, width, len(records))
+    tmp = '%s.%d' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(header.ljust(HEADER - 1) + b'\n')
+        for record in records:
+            f.write(record.ljust(width - 1) + b'\n')
+    # Readers never see a half written file
+    os.replace(tmp, path)
+
+
+class SuffixTable(object):
+    """Read only, memory mapped sorted set of suffix rules."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, width, count = self.map[:HEADER].rsplit(None, 2)
+        if magic != MAGIC:
+            raise ValueError('%s is not a compiled suffix list' % path)
+        self.width = int(width)
+        self.count = int(count)
+
+
+    def record(self, i):
+        start = HEADER + i * self.width
+        return self.map[start:start + self.width].rstrip()
+
+
+    def __contains__(self, rule):
+        key = rule.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = self.record(mid)
+            if record < key:
+                lo = mid + 1
+            elif record > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+
+    def __len__(self):
+        return self.count
+
+
+def load(source=None):
+    """Return SuffixTable of _source_, compiled on first use. Compiled files
+    are named after the source contents and format so updated lists are
+    recompiled."""
+    source = source or source_path()
+    with open(source, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha1(MAGIC + data).hexdigest()[:12]
+    path = cache_path('suffixes_%s.dat' % digest)
+    if not os.path.exists(path):
+        compile_rules(parse(data.decode('utf-8')), path)
+    return SuffixTable(path)
+
+
+def get_table():
+    """Return the suffix table of this process, forked workers inherit the
+    mapping of their parent."""
+    global _table
+    if _table is None:
+        with _lock:
+            if _table is None:
+                _table = load()
+    return _table
+
+
+def hostname(value):
+    """Return lower case host of URL or host _value_ without port."""
+    if '//' in value:
+        value = urlsplit(value).hostname or ''
+    return value.split(':')[0].strip().rstrip('.').lower()
+
+
+@functools.lru_cache(maxsize=65536)
+def split(host):
+    """Return (labels, index of first public suffix label) of _host_,
+    index is len(labels) when no rule matches."""
+    labels = tuple(hostname(host).split('.')) if host else ()
+    table = get_table()
+    for i in range(len(labels)):
+        suffix = '.'.join(labels[i:])
+        if '!' + suffix in table:
+            return labels, i + 1
+        if suffix in table or '*.' + '.'.join(labels[i + 1:]) in table:
+            return labels, i
+    return labels, len(labels)
+
+
+def public_suffix(host):
+    """Return public suffix of _host_ or URL, I.E. com.mx for
+    www.example.com.mx, or None if it has no known suffix."""
+    labels, i = split(host)
+    return '.'.join(labels[i:]) if i < len(labels) else None
+
+
+def registrable_domain(host):
+    """Return registrable domain of _host_ or URL, I.E. example.com.mx for
+    http://www.example.com.mx/contacto"""
+    labels, i = split(host)
+    if i == 0 or i >= len(labels) or not labels[i - 1]:
+        return None
+    return '.'.join(labels[i - 1:])
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Crawler extensions."""
+import logging
+from twisted.internet import defer
+from twisted.internet.base import ThreadedResolver
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from sally.cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentResolver(ThreadedResolver):
+    """Threaded resolver answering from a disk cache of host addresses
+    shared by every spider of the process and across runs."""
+
+    def __init__(self, reactor, cache, timeout):
+        super(PersistentResolver, self).__init__(reactor)
+        self.cache = cache
+        self.timeout = timeout
+
+
+    def getHostByName(self, name, timeout=None):
+        address = self.cache.memory.get(name)
+        if address is not None:
+            self.cache.stats['memory'] += 1
+            return defer.succeed(address)
+        address = self.cache.get(name)
+        if address is not None:
+            self.cache.memory.set(name, address)
+            return defer.succeed(address)
+        # Same as scrapy CachingThreadedResolver, DNS_TIMEOUT wins
+        timeout = (self.timeout,)
+        d = super(PersistentResolver, self).getHostByName(name, timeout)
+        d.addCallback(self.resolved, name)
+        return d
+
+
+    def resolved(self, address, name):
+        self.cache.memory.set(name, address)
+        self.cache.set(name, address)
+        return address
+
+
+class DNSCache(object):
+    """Install PersistentResolver once the reactor is running, after the
+    crawler process installed its own. DNSCACHE_TTL seconds and
+    DNSCACHE_PERSIST_SIZE hosts at most."""
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.cache = get_cache('dns',
+                ttl=crawler.settings.getint('DNSCACHE_TTL', 21600),
+                size=crawler.settings.getint('DNSCACHE_PERSIST_SIZE', 100000))
+
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('DNSCACHE_ENABLED'):
+            raise NotConfigured('DNSCACHE_ENABLED is off')
+        from twisted.internet import reactor
+        ext = cls(crawler)
+        # The engine may start before CrawlerProcess.start() installs the
+        # default resolver, the reactor runs after it
+        reactor.callWhenRunning(ext.install)
+        crawler.signals.connect(ext.spider_closed,
+                signal=signals.spider_closed)
+        return ext
+
+
+    def install(self):
+        from twisted.internet import reactor
+        if not isinstance(reactor.resolver, PersistentResolver):
+            reactor.installResolver(PersistentResolver(reactor, self.cache,
+                self.crawler.settings.getfloat('DNS_TIMEOUT', 60)))
+
+
+    def spider_closed(self, spider):
+        # Process totals, the resolver is shared by every spider
+        for key in ('hit', 'memory', 'miss'):
+            self.crawler.stats.set_value('dnscache/%s' % key,
+                    self.cache.stats[key])
+        spider.logger.info('DNS cache saved %d lookups' % (
+            self.cache.stats['hit'] + self.cache.stats['memory']))
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Bounded frontier of follow-up links for lightfoot.
+
+Contact details often sit on /contacto or /nosotros pages, links of a site
+are scored by URL and anchor text hints and only the best few per site are
+followed, as long as the frontier has room for them."""
+import heapq
+from urllib.parse import urlparse
+from sally.qualifiers import fold
+
+# Hints found in link URL or anchor text and their weight
+HINTS = {
+        'contacto': 5,
+        'contact': 5,
+        'contactanos': 5,
+        'nosotros': 3,
+        'about': 3,
+        'quienes-somos': 3,
+        'quienes somos': 3,
+        'ubicacion': 2,
+        'sucursales': 2,
+        'tienda': 4,
+        'shop': 4,
+        'store': 3,
+        'productos': 2,
+        'catalogo': 2,
+        'cart': 2,
+        'carrito': 2,
+        }
+
+SKIP = ('mailto:', 'tel:', 'javascript:', '#')
+
+
+def host(url):
+    """Return host of _url_ without www."""
+    netloc = urlparse(url).netloc.lower().split(':')[0]
+    return netloc[4:] if netloc.startswith('www.') else netloc
+
+
+def score_link(url, text=''):
+    """Return sum of hint weights found in _url_ path and anchor _text_."""
+    parsed = urlparse(url)
+    haystack = fold('%s %s %s' % (parsed.path, parsed.query, text or ''))
+    return sum(weight for hint, weight in HINTS.items() if hint in haystack)
+
+
+def candidates(links, site):
+    """Return scored (score, url) same site links from (url, text) tuples,
+    links without hints are left out."""
+    scored = {}
+    for url, text in links:
+        if not url or url.startswith(SKIP) or host(url) != site:
+            continue
+        url = url.split('#')[0]
+        score = score_link(url, text)
+        if score > 0:
+            scored[url] = max(score, scored.get(url, 0))
+    return [(score, url) for url, score in scored.items()]
+
+
+def best(links, per_site=3):
+    """Return the _per_site_ best scored (score, url) _links_, best
+    first."""
+    return heapq.nlargest(per_site, links)
+
+
+class Frontier(object):
+    """Follow-up links in flight, the top _per_site_ links of each site and
+    _capacity_ links at most across every site. Links past the capacity are
+    dropped, done() makes room again."""
+
+    def __init__(self, per_site=3, capacity=2000):
+        self.per_site = per_site
+        self.capacity = capacity
+        self.size = 0
+        self.dropped = 0
+
+
+    def push(self, links):
+        """Admit the best scored (score, url) _links_ of a site that fit.
+
+        Returns list of admitted (score, url), best first"""
+        links = best(links, self.per_site)
+        room = max(0, self.capacity - self.size)
+        self.dropped += max(0, len(links) - room)
+        links = links[:room]
+        self.size += len(links)
+        return links
+
+
+    def done(self):
+        """Make room for the next link, a follow-up was fetched or failed."""
+        self.size = max(0, self.size - 1)
+
+
+    def __len__(self):
+        return self.size
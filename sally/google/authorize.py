@@ -1,13 +1,11 @@
 from __future__ import print_function
 
 import datetime
-import httplib2
 import os
+import threading
 
-from apiclient import discovery
-from oauth2client import client
-from oauth2client import tools
-from oauth2client.file import Storage
+# Google API client and oauth2client are imported on first use, they are
+# the slowest imports of any sally entry point
 ## TODO flags comes from sheets quickstart, check and remove if needed
 flags = None
 
@@ -17,6 +15,9 @@ SCOPES = 'https://www.googleapis.com/auth/spreadsheets https://www.googleapis.co
 CLIENT_SECRET_FILE = 'client_secret.json'
 APPLICATION_NAME = 'Sally'
 
+# Built services by thread, httplib2 connections aren't thread safe
+_local = threading.local()
+
 
 def get_credentials():
     """Gets valid user credentials from storage.
@@ -27,6 +28,9 @@ def get_credentials():
     Returns:
         Credentials, the obtained credential.
     """
+    from oauth2client import client
+    from oauth2client import tools
+    from oauth2client.file import Storage
     home_dir = os.path.expanduser('~')
     credential_dir = os.path.join(home_dir, '.credentials')
     if not os.path.exists(credential_dir):
@@ -48,9 +52,21 @@ def get_credentials():
 
 
 def get_service(service, api_version):
+    """Return a Google API service, it is built once for each thread."""
+    services = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = {}
+    if (service, api_version) not in services:
+        services[(service, api_version)] = build_service(service, api_version)
+    return services[(service, api_version)]
+
+
+def build_service(service, api_version):
+    import httplib2
+    from apiclient import discovery
     credentials = get_credentials()
     http = credentials.authorize(httplib2.Http())
-    if service is 'sheets':
+    if service == 'sheets':
         discoveryUrl = ('https://%s.googleapis.com/rest?'
             'version=%s' % (service, api_version))
         service_response = discovery.build(service, api_version, http=http,
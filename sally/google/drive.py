@@ -3,17 +3,63 @@ import sally.google.authorize as authorize
 
 logger = logging.getLogger(__name__)
 
+# Drive API accepts up to 100 calls in a batch request
+BATCH_SIZE = 100
+
+
+FOLDER = 'application/vnd.google-apps.folder'
+
+# Fields of files returned by listings and the changes feed
+FILE_FIELDS = 'id, name, mimeType, parents, trashed'
+
+
 def get_uploads(folder_id):
+    """Return every file in given folder, following all result pages."""
     service = authorize.get_service('drive', 'v3')
-    results = service.files().list(
-            pageSize=100,fields="nextPageToken, files(id, name, mimeType)",
-            q="'%s' in parents and mimeType != 'application/vnd.google-apps.folder'"
-            % folder_id).execute()
-    items = results.get('files', [])
-    return items
+    items = []
+    page_token = None
+    while True:
+        results = service.files().list(
+                pageSize=1000, pageToken=page_token,
+                fields="nextPageToken, files(%s)" % FILE_FIELDS,
+                q="'%s' in parents and mimeType != '%s' and trashed = false"
+                % (folder_id, FOLDER)).execute()
+        items += results.get('files', [])
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return items
 # application/vnd.google-apps.spreadsheet
 
 
+def get_start_page_token():
+    """Return token of the current position of the changes feed."""
+    service = authorize.get_service('drive', 'v3')
+    return service.changes().getStartPageToken().execute()['startPageToken']
+
+
+def get_changes(page_token):
+    """Return (changes, new start page token) since _page_token_, following
+    all result pages."""
+    service = authorize.get_service('drive', 'v3')
+    changes = []
+    while True:
+        results = service.changes().list(pageToken=page_token, pageSize=1000,
+                fields="nextPageToken, newStartPageToken, "
+                "changes(fileId, removed, file(%s))" % FILE_FIELDS).execute()
+        changes += results.get('changes', [])
+        if 'newStartPageToken' in results:
+            return changes, results['newStartPageToken']
+        page_token = results['nextPageToken']
+
+
+def get_modified_time(file_id):
+    """Return RFC 3339 modified time of given file ID."""
+    service = authorize.get_service('drive', 'v3')
+    file_ = service.files().get(fileId=file_id,
+            fields='modifiedTime').execute()
+    return file_['modifiedTime']
+
+
 def mv(file_id, to_folder):
     try:
         service = authorize.get_service('drive', 'v3')
@@ -30,3 +76,53 @@ def mv(file_id, to_folder):
     except Exception as ex:
         logging.error("Can't mv file in drive: %s" % ex, exc_info=True)
         return None
+
+
+def chunks(items, size=BATCH_SIZE):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def mv_batch(moves):
+    """Move many files with two Drive batch requests, one to retrieve the
+    existing parents and one to update them.
+
+    Arguments:
+    moves - list of (file ID, target folder ID) tuples
+
+    Returns list of moved file IDs"""
+    service = authorize.get_service('drive', 'v3')
+    targets = dict(moves)
+    parents = {}
+    moved = []
+
+    def got_parents(request_id, response, exception):
+        if exception is not None:
+            logger.error("Can't get parents of %s: %s" % (request_id, exception))
+        elif targets[request_id] in response.get('parents', []):
+            moved.append(request_id)
+        else:
+            parents[request_id] = ','.join(response.get('parents', []))
+
+    def got_moved(request_id, response, exception):
+        if exception is not None:
+            logger.error("Can't mv file %s: %s" % (request_id, exception))
+        else:
+            moved.append(request_id)
+
+    for chunk in chunks(list(targets)):
+        batch = service.new_batch_http_request(callback=got_parents)
+        for file_id in chunk:
+            batch.add(service.files().get(fileId=file_id, fields='parents'),
+                    request_id=file_id)
+        batch.execute()
+
+    for chunk in chunks(list(parents)):
+        batch = service.new_batch_http_request(callback=got_moved)
+        for file_id in chunk:
+            batch.add(service.files().update(fileId=file_id,
+                removeParents=parents[file_id],
+                addParents=targets[file_id],
+                fields='id, parents'), request_id=file_id)
+        batch.execute()
+
+    return moved
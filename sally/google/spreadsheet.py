@@ -2,10 +2,26 @@
 """Google spreadsheets interface for Sally crawler."""
 import os
 import logging
+import zlib
 from sally.google import authorize
 
 logger = logging.getLogger(__name__)
 
+# Rows written with the new sheet, the rest go in values.batchUpdate calls
+# of CHUNK_ROWS rows for each range, CHUNKS ranges for each call
+INLINE_ROWS = 5000
+CHUNK_ROWS = 5000
+CHUNKS = 4
+
+# Rate limited (429) and server errors are retried by the API client with
+# exponential backoff
+RETRIES = 5
+
+HEADER_FORMAT = {
+        "textFormat": {"bold": True},
+        "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9}
+        }
+
 
 def get_spreadsheet(spreadsheetId):
     """Return an existing spreadsheet given by the ID."""
@@ -17,20 +33,141 @@ def get_spreadsheet(spreadsheetId):
     return response
 
 
-def create_spreadsheet(title):
-    """Return a new spreadsheet with given _title_."""
+def create_spreadsheet(title, sheets=None):
+    """Return a new spreadsheet with given _title_, and _sheets_ built with
+    sheet() if given, all in one call."""
     service = authorize.get_service('sheets', 'v4')
     body_ = {
         "properties": {
             "title": title
         }
     }
+    if sheets:
+        body_['sheets'] = sheets
 
     request = service.spreadsheets().create(body=body_)
-    response = request.execute()
+    response = execute(request)
     return response
 
 
+def execute(request):
+    """Execute Google API _request_ retrying up to RETRIES times."""
+    return request.execute(num_retries=RETRIES)
+
+
+def sheet_titles(spreadsheetId):
+    """Return titles of the sheets of given spreadsheet."""
+    service = authorize.get_service('sheets', 'v4')
+    response = execute(service.spreadsheets().get(
+        spreadsheetId=spreadsheetId, fields='sheets.properties.title'))
+    return [s['properties']['title'] for s in response.get('sheets', [])]
+
+
+def cell(value):
+    """Return CellData of _value_, numbers stay numbers and None stays an
+    empty cell, as written by the values API."""
+    if value is None:
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def row_data(rows, header=True):
+    """Return RowData of _rows_, the first one formatted as header."""
+    data = []
+    for i, row in enumerate(rows):
+        cells = [cell(v) for v in row]
+        if header and i == 0:
+            for c in cells:
+                c['userEnteredFormat'] = HEADER_FORMAT
+        data.append({"values": cells})
+    return data
+
+
+def sheet_id(title):
+    """Return stable sheet ID for _title_, IDs are chosen by the client."""
+    return zlib.crc32(title.encode('utf-8')) & 0x7fffffff
+
+
+def properties(title, rows):
+    """Return SheetProperties of a sheet sized for _rows_, header frozen."""
+    return {
+        "sheetId": sheet_id(title),
+        "title": title,
+        "gridProperties": {
+            "rowCount": max(len(rows), 1),
+            "columnCount": max([len(r) for r in rows] + [1]),
+            "frozenRowCount": 1
+            }
+        }
+
+
+def sheet(title, rows):
+    """Return Sheet sized for _rows_ for create_spreadsheet(), with the
+    first INLINE_ROWS of them."""
+    return {
+        "properties": properties(title, rows),
+        "data": [{
+            "startRow": 0,
+            "startColumn": 0,
+            "rowData": row_data(rows[:INLINE_ROWS])
+            }]
+        }
+
+
+def write_sheet(spreadsheetId, title, rows):
+    """Add sheet _title_ sized, formatted and filled with _rows_, the first
+    one is the header, in a single batchUpdate. Rows over INLINE_ROWS are
+    written with write_values(). If the sheet exists, I.E. a resumed job,
+    values are written over it.
+
+    Returns number of API calls"""
+    requests = [
+        {"addSheet": {"properties": properties(title, rows)}},
+        {"updateCells": {
+            "start": {"sheetId": sheet_id(title), "rowIndex": 0,
+                "columnIndex": 0},
+            "rows": row_data(rows[:INLINE_ROWS]),
+            "fields": "userEnteredValue,userEnteredFormat"
+            }}
+        ]
+    service = authorize.get_service('sheets', 'v4')
+    try:
+        execute(service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheetId, body={'requests': requests}))
+    except Exception as ex:
+        # addSheet of an existing title is a bad request
+        status = getattr(getattr(ex, 'resp', None), 'status', None)
+        if status != 400 or title not in sheet_titles(spreadsheetId):
+            raise
+        logger.warning('Sheet %s exists, writing values over it' % title)
+        return write_values(spreadsheetId, title, rows)
+    return 1 + write_values(spreadsheetId, title, rows[INLINE_ROWS:],
+            offset=INLINE_ROWS + 1)
+
+
+def write_values(spreadsheetId, title, rows, offset=1):
+    """Write _rows_ from row _offset_ of sheet _title_ in chunked
+    values.batchUpdate calls.
+
+    Returns number of API calls"""
+    data = [{
+        "range": "'%s'!A%d" % (title, offset + i),
+        "values": rows[i:i + CHUNK_ROWS]
+        } for i in range(0, len(rows), CHUNK_ROWS)]
+    service = authorize.get_service('sheets', 'v4')
+    calls = 0
+    for i in range(0, len(data), CHUNKS):
+        execute(service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheetId,
+            body={'valueInputOption': 'RAW', 'data': data[i:i + CHUNKS]}))
+        calls += 1
+    return calls
+
+
 def create_sheet(spreadsheetId, title):
     """Return a new sheet with given _title_ at given spreadsheet ID."""
     body = {
@@ -77,8 +214,10 @@ def insert_to(
     return response
 
 
-def get_settings(spreadsheetId=os.environ['SALLY_SETTINGS_ID']):
-    """Return crawler settings from given spreadsheet ID."""
+def get_settings(spreadsheetId=None):
+    """Return crawler settings from given spreadsheet ID, defaults to
+    SALLY_SETTINGS_ID."""
+    spreadsheetId = spreadsheetId or os.environ['SALLY_SETTINGS_ID']
     range_ = 'settings!A1:F1000'
     service = authorize.get_service('sheets', 'v4')
     request = service.spreadsheets().values().get(
@@ -117,8 +256,10 @@ def get_urls(spreadsheetId):
         return []
 
 
-def get_score(spreadsheetId=os.environ['SALLY_SETTINGS_ID']):
-    """Return score values from given Google spreadsheet ID."""
+def get_score(spreadsheetId=None):
+    """Return score values from given Google spreadsheet ID, defaults to
+    SALLY_SETTINGS_ID."""
+    spreadsheetId = spreadsheetId or os.environ['SALLY_SETTINGS_ID']
     range_ = 'score!A2:B1000'
     service = authorize.get_service('sheets', 'v4')
     request = service.spreadsheets().values().get(
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""Long running intake of Drive uploads.
+
+Instead of listing the uploads folder on every cron run, the Drive changes
+feed is polled from a saved page token and new files of the folder are
+dispatched to crawl workers as they show up. The folder is listed on every
+start too, uploads dispatched but not crawled before the process stopped
+are still there, uploads with a finished job record are skipped.
+
+    python -m sally.intake [--workers N] [--interval SECONDS]
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import sally.google.drive as gd
+from sally.cache import cache_path
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls of the changes feed
+INTERVAL = 30
+
+
+def state_path():
+    """Return path of the saved page token, SALLY_INTAKE_STATE or the cache
+    directory."""
+    return os.environ.get('SALLY_INTAKE_STATE') or cache_path('intake.json')
+
+
+class Intake(object):
+    """Watch _folder_id_ and call _dispatch_ with the list of new uploads."""
+
+    def __init__(self, folder_id, dispatch, path=None, interval=INTERVAL,
+            jobs=None):
+        self.folder_id = folder_id
+        self.dispatch = dispatch
+        self.path = path or state_path()
+        self.interval = interval
+        self.jobs = jobs
+        self.page_token = None
+        self.seen = set()
+        self.stopped = threading.Event()
+
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f).get('pageToken')
+        except (IOError, ValueError):
+            return None
+
+
+    def save(self):
+        tmp = '%s.%d' % (self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump({'pageToken': self.page_token}, f)
+        os.replace(tmp, self.path)
+
+
+    def is_upload(self, file_):
+        return (self.folder_id in file_.get('parents', [])
+                and file_.get('mimeType') != gd.FOLDER
+                and not file_.get('trashed'))
+
+
+    def finished(self, upload):
+        """Return True if _upload_ has a finished job record."""
+        if self.jobs is None:
+            from sally.jobs import JobStore
+            self.jobs = JobStore()
+        job = self.jobs.get(upload['id'])
+        return job is not None and job['status'] == 'finished'
+
+
+    def send(self, uploads):
+        """Dispatch _uploads_ not sent before."""
+        new = {}
+        for upload in uploads:
+            if upload['id'] not in self.seen:
+                new.setdefault(upload['id'], upload)
+        uploads = list(new.values())
+        if uploads:
+            self.seen.update(u['id'] for u in uploads)
+            logger.info('%d new uploads: %s' % (len(uploads),
+                ', '.join(u['name'] for u in uploads)))
+            self.dispatch(uploads)
+        return uploads
+
+
+    def start(self):
+        """Resume from the saved token, or take the current one, and send
+        the unfinished uploads in the folder."""
+        self.page_token = self.load()
+        if self.page_token is None:
+            # Taken before listing, files added meanwhile come as changes
+            self.page_token = gd.get_start_page_token()
+            self.save()
+        self.send([u for u in gd.get_uploads(self.folder_id)
+            if not self.finished(u)])
+
+
+    def poll(self):
+        """Send uploads added or changed since the saved token.
+
+        Returns list of uploads sent"""
+        changes, token = gd.get_changes(self.page_token)
+        uploads = [c['file'] for c in changes
+                if not c.get('removed') and c.get('file')
+                and self.is_upload(c['file'])]
+        sent = self.send(uploads)
+        # Uploads dispatched but not crawled when the process stops stay in
+        # the folder, the next start lists them again
+        self.page_token = token
+        self.save()
+        return sent
+
+
+    def done(self, uploads):
+        """Uploads left in the folder after their crawl, I.E. interrupted,
+        are sent again when they change."""
+        self.seen.difference_update(u['id'] for u in uploads)
+
+
+    def run(self):
+        self.start()
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except Exception as ex:
+                logger.error("Can't poll Drive changes: %s" % ex,
+                        exc_info=True)
+            self.stopped.wait(self.interval)
+
+
+    def stop(self, *args):
+        self.stopped.set()
+
+
+class Dispatcher(object):
+    """Crawl dispatched uploads in a background thread with the scheduler.
+    Uploads arriving while a batch is crawled go together in the next one,
+    every batch gets fresh worker processes."""
+
+    def __init__(self, workers=1, crawl=None):
+        self.workers = workers
+        self.crawl = crawl or self.schedule
+        self.inbox = queue.Queue()
+        self.intake = None
+        self.thread = threading.Thread(target=self.work, name='sally-intake',
+                daemon=True)
+
+
+    def __call__(self, uploads):
+        for upload in uploads:
+            self.inbox.put(upload)
+
+
+    def schedule(self, uploads):
+        import sally.scheduler as scheduler
+        from sally.jobs import JobStore
+        store = JobStore()
+        unfinished = store.unfinished()
+        store.close()
+        return scheduler.run(uploads, self.workers, unfinished)
+
+
+    def work(self):
+        while True:
+            batch = [self.inbox.get()]
+            if batch[0] is None:
+                return
+            while not self.inbox.empty():
+                batch.append(self.inbox.get())
+            uploads = [u for u in batch if u is not None]
+            try:
+                self.crawl(uploads)
+            except Exception as ex:
+                logger.error("Can't crawl %d uploads: %s" % (len(uploads),
+                    ex), exc_info=True)
+            if self.intake is not None:
+                self.intake.done(uploads)
+            if len(uploads) < len(batch):
+                return
+
+
+    def start(self):
+        self.thread.start()
+
+
+    def stop(self):
+        """Let the current batch finish."""
+        self.inbox.put(None)
+        self.thread.join()
+
+
+def main(workers=1, interval=INTERVAL):
+    dispatcher = Dispatcher(workers)
+    intake = Intake(os.environ['DRIVE_UPLOADS'], dispatcher, interval=interval)
+    dispatcher.intake = intake
+    signal.signal(signal.SIGTERM, intake.stop)
+    signal.signal(signal.SIGINT, intake.stop)
+    dispatcher.start()
+    intake.run()
+    dispatcher.stop()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Crawl Drive uploads as '
+            'they arrive')
+    parser.add_argument('-w', '--workers', type=int,
+            default=int(os.environ.get('SALLY_WORKERS', 1)),
+            help='worker processes, defaults to SALLY_WORKERS or 1')
+    parser.add_argument('-i', '--interval', type=float, default=INTERVAL,
+            help='seconds between polls of the Drive changes feed')
+    args = parser.parse_args()
+    main(args.workers, args.interval)
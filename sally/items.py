@@ -19,29 +19,59 @@ class WebsiteItem(scrapy.Item):
     ecommerce = scrapy.Field()          # Any ecommerce references
     email = scrapy.Field()              # List of email regex
     last_crawl = scrapy.Field()         # Last time I crawled the site
-    link = scrapy.Field()              # <a href> tags
+    link = scrapy.Field()               # Followed <a href> tags
     network = scrapy.Field()              # <a href> tags
     description = scrapy.Field()               # <meta content> tags
     keywords = scrapy.Field()
-    offer = scrapy.Field()
+    offer = scrapy.Field()              # Offer keywords, most found first
+    offer_counts = scrapy.Field()       # Keyword counts by category
     onlinepay_rel = scrapy.Field()      # Any mention of on line payment
-    cart = scrapy.Field()
+    cart = scrapy.Field()               # Shopping signals, I.E. {'cart': 2}
     score = scrapy.Field()              # Score based on qualifiers
     secure_url = scrapy.Field()         # +1 if HTTPS
     scripts = scrapy.Field()            # <script> tags
     telephone = scrapy.Field()          # List of regexd telephones
     country_code = scrapy.Field()
     title = scrapy.Field()              # <title> tag
-    url = scrapy.Field()                # start_url given by source
+    url = scrapy.Field()                # URL after any 30x redirection
+    start_url = scrapy.Field()          # start_url given by source
+    pages = scrapy.Field()              # Pages crawled of the site
     webstore_rel = scrapy.Field()       # Any metion of ecommerce software
     score_values = scrapy.Field()
     spreadsheetId = scrapy.Field()
 
 
+    # Fields collected from every page crawled of a site
+    MERGED = ['email', 'telephone', 'network', 'cart']
+
     def set_score(self, scores):
         self['score_values'] = dict(scores)
 
 
+    def merge(self, fields):
+        """merge fields extracted from other page of the same site, lists
+        are joined keeping their order and counts are added
+
+        Returns self"""
+        for key in WebsiteItem.MERGED:
+            value = fields.get(key)
+            if value is None:
+                # Failed or skipped pages have no fields
+                continue
+            stored = self.get(key)
+            if isinstance(stored, dict) or (not stored
+                    and isinstance(value, dict)):
+                merged = dict(stored or {})
+                if isinstance(value, dict):
+                    for name, count in value.items():
+                        merged[name] = merged.get(name, 0) + count
+            else:
+                merged = list(stored or [])
+                merged += [v for v in value if v not in merged]
+            self[key] = merged
+        return self
+
+
     def qualify_product(self):
         """qualify_product eval <meta> tags from item mathing description and
         keywords parameters of such tags. a href tags are also searched
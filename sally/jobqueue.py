@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""Persistent queue of on demand crawl jobs.
+
+Jobs name a source spreadsheet, the crab to run it with (lightfoot or
+hermit), a priority and the owner (tenant) who asked for it. Workers claim
+the queued job of highest priority with an atomic find_one_and_update, an
+owner runs at most its limit of jobs at once, counted in the tenants
+collection so concurrent workers can't go over it."""
+import datetime
+import logging
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from sally import db
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+CRABS = ('lightfoot', 'hermit')
+
+# Jobs of an owner running at once unless its tenant record says otherwise
+TENANT_LIMIT = 2
+
+# Running jobs not updated in these seconds are given back to the queue,
+# their worker died
+STALE = 6 * 3600
+
+# Claim order, best priority first then oldest
+ORDER = [('priority', DESCENDING), ('created', ASCENDING)]
+
+
+def new_job(source, crab, priority=0, owner='default', options=None):
+    """Return queued job document, raise ValueError on bad arguments."""
+    if not source:
+        raise ValueError('source spreadsheet ID is required')
+    if crab not in CRABS:
+        raise ValueError('crab must be one of %s' % ', '.join(CRABS))
+    now = datetime.datetime.now()
+    return {
+            'source': source,
+            'crab': crab,
+            'priority': int(priority),
+            'owner': owner or 'default',
+            'options': dict(options or {}),
+            'status': QUEUED,
+            'attempts': 0,
+            'created': now,
+            'updated': now
+            }
+
+
+def busy(running, limits, default=TENANT_LIMIT):
+    """Return owners of _running_ (owner: count) at their limit."""
+    return sorted(owner for owner, count in running.items()
+            if count >= limits.get(owner, default))
+
+
+class JobQueue(object):
+
+    def __init__(self, database=None, limit=TENANT_LIMIT):
+        self.db = database if database is not None else db.get_db()
+        self.queue = self.db['queue']
+        self.tenants = self.db['tenants']
+        self.limit = limit
+        self.queue.create_index([('status', ASCENDING)] + ORDER)
+        self.queue.create_index([('owner', ASCENDING), ('status', ASCENDING)])
+        self.queue.create_index([('status', ASCENDING),
+            ('finished', DESCENDING)])
+
+
+    def submit(self, source, crab, priority=0, owner='default', options=None):
+        """Queue a job, returns its ID as str."""
+        job = new_job(source, crab, priority, owner, options)
+        return str(self.queue.insert_one(job).inserted_id)
+
+
+    def get(self, job_id):
+        """Return job by ID or None."""
+        try:
+            return self.queue.find_one({'_id': ObjectId(job_id)})
+        except Exception:
+            return None
+
+
+    def find(self, owner=None, status=None, limit=100):
+        """Return newest jobs, of _owner_ and _status_ if given."""
+        query = {}
+        if owner:
+            query['owner'] = owner
+        if status:
+            query['status'] = status
+        return list(self.queue.find(query).sort('created', DESCENDING)
+                .limit(limit))
+
+
+    def limits(self):
+        """Return dict of owner: limit set in tenant records."""
+        return dict((t['_id'], t['limit']) for t in self.tenants.find(
+            {'limit': {'$exists': True}}, {'limit': 1}))
+
+
+    def running(self):
+        """Return dict of owner: jobs running."""
+        return dict((t['_id'], t['running']) for t in self.tenants.find(
+            {'running': {'$gt': 0}}, {'running': 1}))
+
+
+    def reserve(self, owner):
+        """Take a running slot of _owner_, returns False at its limit."""
+        self.tenants.update_one({'_id': owner},
+                {'$setOnInsert': {'running': 0}}, upsert=True)
+        tenant = self.tenants.find_one_and_update({'_id': owner, '$or': [
+            {'limit': {'$exists': False}, 'running': {'$lt': self.limit}},
+            {'limit': {'$exists': True},
+                '$expr': {'$lt': ['$running', '$limit']}}]},
+            {'$inc': {'running': 1}})
+        return tenant is not None
+
+
+    def free(self, owner):
+        self.tenants.update_one({'_id': owner, 'running': {'$gt': 0}},
+                {'$inc': {'running': -1}})
+
+
+    def claim(self, worker, crabs=CRABS):
+        """Return the best queued job of _crabs_ whose owner has a free
+        slot, marked as running by _worker_, or None."""
+        skip = set(busy(self.running(), self.limits(), self.limit))
+        while True:
+            job = self.queue.find_one_and_update(
+                    {'status': QUEUED, 'crab': {'$in': list(crabs)},
+                        'owner': {'$nin': sorted(skip)}},
+                    {'$set': {'status': RUNNING, 'worker': worker,
+                        'claimed': datetime.datetime.now(),
+                        'updated': datetime.datetime.now()},
+                        '$inc': {'attempts': 1}},
+                    sort=ORDER, return_document=ReturnDocument.AFTER)
+            if job is None:
+                return None
+            if self.reserve(job['owner']):
+                return job
+            # Another worker took the last slot of the owner meanwhile
+            self.queue.update_one({'_id': job['_id']}, {
+                '$set': {'status': QUEUED}, '$unset': {'worker': '',
+                    'claimed': ''}, '$inc': {'attempts': -1}})
+            skip.add(job['owner'])
+
+
+    def claimed(self, job):
+        """Return filter of _job_ as claimed, it doesn't match once the job
+        is requeued as stale, even if it's claimed again."""
+        return {'_id': job['_id'], 'status': RUNNING, 'worker': job['worker'],
+                'claimed': job['claimed']}
+
+
+    def touch(self, job, **fields):
+        """Record progress of a running job, keeps it from going stale.
+        Returns False if the job was requeued meanwhile."""
+        fields['updated'] = datetime.datetime.now()
+        return self.queue.update_one(self.claimed(job),
+                {'$set': fields}).matched_count > 0
+
+
+    def done(self, job, result=None, error=None):
+        """Mark running _job_ as finished, or failed with _error_, and free
+        the slot of its owner. Jobs requeued meanwhile are left alone."""
+        now = datetime.datetime.now()
+        update = {'status': FAILED if error else FINISHED, 'finished': now,
+                'updated': now, 'seconds': (now - job['claimed'])
+                .total_seconds()}
+        if result is not None:
+            update['result'] = result
+        if error:
+            update['error'] = str(error)
+        changed = self.queue.update_one(self.claimed(job), {'$set': update})
+        if changed.modified_count:
+            self.free(job['owner'])
+        else:
+            logger.warning('Job %s was requeued, result dropped' % job['_id'])
+
+
+    def requeue_stale(self, stale=STALE):
+        """Give running jobs not updated in _stale_ seconds back to the
+        queue. Returns count of jobs requeued."""
+        before = datetime.datetime.now() - datetime.timedelta(seconds=stale)
+        count = 0
+        for job in self.queue.find({'status': RUNNING,
+                'updated': {'$lt': before}}, {'owner': 1}):
+            changed = self.queue.update_one({'_id': job['_id'],
+                'status': RUNNING}, {'$set': {'status': QUEUED},
+                    '$unset': {'worker': '', 'claimed': ''}})
+            if changed.modified_count:
+                self.free(job['owner'])
+                count += 1
+        if count:
+            logger.warning('Requeued %d stale jobs' % count)
+        return count
+
+
+    def stats(self, since=3600):
+        """Return jobs by status and owner, jobs finished and their mean
+        seconds in the last _since_ seconds."""
+        stats = {'jobs': {}, 'owners': {}}
+        for group in self.queue.aggregate([{'$group': {
+                '_id': {'owner': '$owner', 'status': '$status'},
+                'count': {'$sum': 1}}}]):
+            owner, status = group['_id']['owner'], group['_id']['status']
+            stats['jobs'][status] = stats['jobs'].get(status, 0) + group['count']
+            stats['owners'].setdefault(owner, {})[status] = group['count']
+
+        after = datetime.datetime.now() - datetime.timedelta(seconds=since)
+        recent = list(self.queue.aggregate([
+            {'$match': {'status': {'$in': [FINISHED, FAILED]},
+                'finished': {'$gte': after}}},
+            {'$group': {'_id': None, 'count': {'$sum': 1},
+                'seconds': {'$avg': '$seconds'}}}]))
+        count = recent[0]['count'] if recent else 0
+        stats['throughput'] = {
+                'seconds': since,
+                'jobs': count,
+                'jobs_per_hour': round(count * 3600.0 / since, 2),
+                'mean_seconds': round(recent[0]['seconds'] or 0, 1)
+                    if recent else 0
+                }
+        stats['running'] = self.running()
+        return stats
+
+
+    def close(self):
+        self.db.client.close()
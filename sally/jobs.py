@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Persistent crawl job records, one for each Drive upload.
+
+A job keeps the output spreadsheet ID, the Mongo collection and the URLs
+already processed so an interrupted crawl can be resumed."""
+import datetime
+import logging
+from sally import db
+
+logger = logging.getLogger(__name__)
+
+RUNNING = 'running'
+FINISHED = 'finished'
+
+
+class JobStore(object):
+
+    def __init__(self, database=None):
+        self.db = database if database is not None else db.get_db()
+        self.jobs = self.db['jobs']
+
+
+    def get(self, upload_id):
+        """Return job record for given upload ID or None."""
+        return self.jobs.find_one({'_id': upload_id})
+
+
+    def start(self, upload_id, spreadsheetId, collection):
+        """Return job record for given upload, a new one is created unless
+        an unfinished one already exists."""
+        now = datetime.datetime.now()
+        job = self.get(upload_id)
+        if job and job['status'] == RUNNING:
+            return job
+
+        job = {
+                '_id': upload_id,
+                'spreadsheetId': spreadsheetId,
+                'collection': collection,
+                'processed': [],
+                'status': RUNNING,
+                'created': now,
+                'updated': now
+                }
+        self.jobs.replace_one({'_id': upload_id}, job, upsert=True)
+        return job
+
+
+    def unfinished(self):
+        """Return dict of unfinished job records by upload ID."""
+        return dict((job['_id'], job) for job
+                in self.jobs.find({'status': RUNNING}))
+
+
+    def processed(self, upload_id, urls):
+        """Record given _urls_ as processed for the upload."""
+        if not urls:
+            return None
+        return self.jobs.update_one({'_id': upload_id}, {
+            '$addToSet': {'processed': {'$each': list(urls)}},
+            '$set': {'updated': datetime.datetime.now()}
+            })
+
+
+    def finish(self, upload_id):
+        """Mark the upload job as finished."""
+        return self.jobs.update_one({'_id': upload_id}, {
+            '$set': {'status': FINISHED, 'updated': datetime.datetime.now()}
+            })
+
+
+    def close(self):
+        self.db.client.close()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Consolidated lead store across crawl collections and sources.
+
+Leads are keyed by registrable domain (example.com.mx) with indexed
+normalized emails and phones. Every crawl merges into the store with bulk
+upserts which keep the best score and the newest last_crawl."""
+import datetime
+import logging
+import re
+from pymongo import DESCENDING, UpdateOne
+from sally import db
+from sally.domains import registrable_domain
+
+logger = logging.getLogger(__name__)
+
+LEADS = 'leads'
+
+
+def normalize_email(email):
+    """Return lower case email without mailto: prefix or None."""
+    email = email.strip().lower()
+    if email.startswith('mailto:'):
+        email = email[7:]
+    return email if '@' in email else None
+
+
+def normalize_phone(phone):
+    """Return the last ten digits of _phone_, national number in Mexico,
+    or None if it is too short."""
+    digits = re.sub(r'\D', '', str(phone))
+    return digits[-10:] if len(digits) >= 10 else None
+
+
+def clean(values, normalize):
+    return sorted(set(filter(None, (normalize(v) for v in values or []))))
+
+
+def from_website(item, source='website'):
+    """Return lead from lightfoot WebsiteItem or stored document."""
+    return {
+            'domain': registrable_domain(item['base_url']),
+            'score': item['score'],
+            'last_crawl': item['last_crawl'],
+            'emails': clean(item['email'], normalize_email),
+            'phones': clean(item['telephone'], normalize_phone),
+            'networks': sorted(set(item['network'] or [])),
+            'ecommerce': [item['ecommerce']] if item['ecommerce']
+                and item['ecommerce'] != 'N/E' else [],
+            'source': source
+            }
+
+
+def from_fbpage(item, score, source='facebook'):
+    """Return lead from hermit Facebook page response."""
+    phones = [item['phone']] if item.get('phone') else []
+    return {
+            'domain': registrable_domain(item.get('website')),
+            'score': score,
+            'last_crawl': datetime.datetime.now(),
+            'emails': clean(item.get('emails'), normalize_email),
+            'phones': clean(phones, normalize_phone),
+            'networks': [item['link']] if item.get('link') else [],
+            'ecommerce': [],
+            'source': source
+            }
+
+
+def merge_op(lead):
+    """Return upsert operation merging _lead_ into the store, sources are
+    the kinds of crawl which found it, I.E. website or facebook."""
+    update = {
+            '$addToSet': {
+                'emails': {'$each': lead['emails']},
+                'phones': {'$each': lead['phones']},
+                'networks': {'$each': lead['networks']},
+                'ecommerce': {'$each': lead['ecommerce']},
+                'sources': lead['source']
+                }
+            }
+    best = dict((k, lead[k]) for k in ('score', 'last_crawl')
+            if lead[k] is not None)
+    if best:
+        update['$max'] = best
+    return UpdateOne({'_id': lead['domain']}, update, upsert=True)
+
+
+class LeadStore(object):
+
+    def __init__(self, database=None, batch=500):
+        self.db = database if database is not None else db.get_db()
+        self.leads = self.db[LEADS]
+        self.batch = batch
+        self.ops = []
+        self.leads.create_index('emails')
+        self.leads.create_index('phones')
+        self.leads.create_index([('score', DESCENDING)])
+
+
+    def add(self, lead):
+        """Queue _lead_ for merge, leads without domain are skipped."""
+        if not lead['domain']:
+            return
+        self.ops.append(merge_op(lead))
+        if len(self.ops) >= self.batch:
+            self.flush()
+
+
+    def flush(self):
+        """Merge queued leads in a single unordered bulk write."""
+        if not self.ops:
+            return None
+        ops, self.ops = self.ops, []
+        result = self.leads.bulk_write(ops, ordered=False)
+        logger.debug('Merged %d leads, %d new' % (len(ops),
+            result.upserted_count))
+        return result
+
+
+    def find(self, domain=None, email=None, phone=None):
+        """Return leads by domain, email or phone, all indexed lookups."""
+        if domain:
+            return list(self.leads.find({'_id': registrable_domain(domain)}))
+        if email:
+            return list(self.leads.find({'emails': normalize_email(email)}))
+        if phone:
+            return list(self.leads.find({'phones': normalize_phone(phone)}))
+        return []
+
+
+    def known(self, domains, batch=1000):
+        """Return dict of domain: lead with score and ecommerce of stored
+        _domains_, looked up by _id in batches."""
+        domains = sorted(set(filter(None, domains)))
+        found = {}
+        for i in range(0, len(domains), batch):
+            for lead in self.leads.find(
+                    {'_id': {'$in': domains[i:i + batch]}},
+                    {'score': 1, 'ecommerce': 1}):
+                found[lead['_id']] = lead
+        return found
+
+
+    def export(self, min_score=None):
+        """Return cursor over leads, best scores first."""
+        query = {'score': {'$gte': min_score}} if min_score is not None else {}
+        return self.leads.find(query).sort('score', DESCENDING)
+
+
+    def close(self):
+        self.db.client.close()
@@ -5,7 +5,11 @@
 # See documentation in:
 # http://doc.scrapy.org/en/latest/topics/spider-middleware.html
 
+from urllib import robotparser
 from scrapy import signals
+from scrapy.downloadermiddlewares.robotstxt import RobotsTxtMiddleware
+from scrapy.utils.httpobj import urlparse_cached
+from sally.cache import get_cache
 
 
 class SallySpiderMiddleware(object):
@@ -54,3 +58,59 @@ class SallySpiderMiddleware(object):
 
     def spider_opened(self, spider):
         spider.logger.info('Spider opened: %s' % spider.name)
+
+
+class CachedRobotsTxtMiddleware(RobotsTxtMiddleware):
+    """RobotsTxtMiddleware keeping robots.txt files in a disk cache shared
+    by every spider and run, ROBOTSTXT_CACHE_TTL seconds and
+    ROBOTSTXT_CACHE_SIZE hosts at most. Failed downloads aren't cached."""
+
+    def __init__(self, crawler):
+        super(CachedRobotsTxtMiddleware, self).__init__(crawler)
+        self.cache = get_cache('robots',
+                ttl=crawler.settings.getint('ROBOTSTXT_CACHE_TTL', 86400),
+                size=crawler.settings.getint('ROBOTSTXT_CACHE_SIZE', 100000))
+        crawler.signals.connect(self.spider_closed,
+                signal=signals.spider_closed)
+
+
+    def robot_parser(self, request, spider):
+        netloc = urlparse_cached(request).netloc
+        if netloc not in self._parsers:
+            # Parsed robots.txt of the process, shared by every spider
+            parser = self.cache.memory.get(netloc)
+            if parser is not None:
+                self._parsers[netloc] = parser
+                self.crawler.stats.inc_value('robotstxt/cache/memory')
+            else:
+                body = self.cache.get(netloc)
+                if body is not None:
+                    self._parsers[netloc] = self.parse(netloc, body)
+                    self.cache.memory.set(netloc, self._parsers[netloc])
+                    self.crawler.stats.inc_value('robotstxt/cache/disk')
+        return super(CachedRobotsTxtMiddleware, self).robot_parser(request,
+                spider)
+
+
+    def parse(self, netloc, body):
+        rp = robotparser.RobotFileParser('http://%s/robots.txt' % netloc)
+        rp.parse(body.splitlines())
+        return rp
+
+
+    def _parse_robots(self, response, netloc):
+        try:
+            body = response.text
+        except (AttributeError, UnicodeDecodeError):
+            # Garbage is disregarded, allow any like scrapy does
+            body = ''
+        self.cache.set(netloc, body)
+        self.crawler.stats.inc_value('robotstxt/cache/miss')
+        super(CachedRobotsTxtMiddleware, self)._parse_robots(response, netloc)
+        self.cache.memory.set(netloc, self._parsers[netloc])
+
+
+    def spider_closed(self, spider):
+        saved = sum(self.crawler.stats.get_value('robotstxt/cache/%s' % k, 0)
+                for k in ('memory', 'disk'))
+        spider.logger.info('robots.txt cache saved %d requests' % saved)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Offer classification with an Aho-Corasick keyword automaton.
+
+Keywords of every category are folded (lower case, no accents) into one
+automaton built once per crawl, page text is scanned in a single pass
+whatever the number of keywords, multi word keywords like "sex shop"
+included. Matches must start and end at word boundaries."""
+import collections
+from sally.qualifiers import QUALIFIER, fold
+
+
+class Automaton(object):
+    """Aho-Corasick automaton over folded keywords."""
+
+    def __init__(self, keywords):
+        # goto transitions, failure links and keywords ending at each state
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for keyword in keywords:
+            self.add(keyword)
+        self.build()
+
+
+    def add(self, keyword):
+        state = 0
+        for char in keyword:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        if keyword not in self.out[state]:
+            self.out[state].append(keyword)
+
+
+    def build(self):
+        """Set failure links breadth first."""
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_ in self.goto[state].items():
+                queue.append(next_)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_] = self.goto[fail].get(char, 0)
+                if self.fail[next_] == next_:
+                    self.fail[next_] = 0
+                self.out[next_] = self.out[next_] + self.out[self.fail[next_]]
+
+
+    def search(self, text):
+        """Yield (start, keyword) of every keyword found in _text_."""
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for keyword in self.out[state]:
+                yield i - len(keyword) + 1, keyword
+
+
+def boundary(text, start, end):
+    """Return True if text[start:end] is not part of a longer word."""
+    return ((start == 0 or not text[start - 1].isalnum())
+            and (end >= len(text) or not text[end].isalnum()))
+
+
+class OfferClassifier(object):
+    """Match keywords of allowed, disallowed and product categories."""
+
+    def __init__(self, allowed=(), disallowed=(),
+            products=QUALIFIER['products']):
+        self.categories = collections.defaultdict(set)
+        self.names = {}
+        for category, keywords in (('allowed', allowed),
+                ('disallowed', disallowed), ('products', products)):
+            for keyword in keywords:
+                folded = fold(keyword).strip()
+                if folded:
+                    self.categories[folded].add(category)
+                    self.names.setdefault(folded, keyword.strip())
+        self.automaton = Automaton(self.categories)
+
+
+    def classify(self, *texts):
+        """Scan _texts_ once.
+
+        Returns dict of category: {keyword: count}"""
+        found = collections.defaultdict(collections.Counter)
+        for text in texts:
+            # Keywords span line breaks and runs of spaces of the page
+            text = ' '.join(fold(text or '').split())
+            for start, keyword in self.automaton.search(text):
+                if boundary(text, start, start + len(keyword)):
+                    for category in self.categories[keyword]:
+                        found[category][self.names[keyword]] += 1
+        return dict((c, dict(counts)) for c, counts in found.items())
+
+
+def offer(matches):
+    """Return allowed and product keywords of _matches_, most found first."""
+    counts = collections.Counter()
+    for category in ('allowed', 'products'):
+        for keyword, count in matches.get(category, {}).items():
+            counts[keyword] = max(counts[keyword], count)
+    return [keyword for keyword, count in counts.most_common()]
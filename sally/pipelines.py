@@ -9,8 +9,10 @@ import datetime
 import os
 import pymongo
 import logging
+from sally import db
+from sally import leads
 import sally.google.spreadsheet as gs
-import sally.google.drive as gd
+from sally import tasks
 
 logger = logging.getLogger('sally_lightfoot')
 
@@ -30,15 +32,7 @@ class LightfootPipeline(object):
 
     @classmethod
     def from_crawler(cls, crawler):
-        if os.environ['MONGO_ATLAS_URI']:
-            # Prefer Mongo Atlas URI over anything else
-            uri = os.environ['MONGO_ATLAS_URI']
-        else:
-            if (os.environ['MONGO_USER'] and os.environ['MONGO_USER'] != ''
-                    and os.environ['MONGO_PASSWORD']):
-                uri = "mongodb://" + os.environ['MONGO_USER'] + ":" + os.environ['MONGO_PASSWORD'] + "@" + os.environ['MONGO_HOST']
-            else:
-                uri = "mongodb://" + os.environ['MONGO_HOST']
+        uri = db.get_uri()
         logger.debug(uri)
         return cls(
                 mongo_uri = uri,
@@ -53,13 +47,11 @@ class LightfootPipeline(object):
             return ''
 
 
-    def export_spreadsheet(self, item):
-        """Export items to Google Spreadsheets"""
+    def build_row(self, item):
+        """Return a row for insert_to google spreadsheet"""
         ecommerce = item['ecommerce']
-        if item['cart'] and len(item['cart']) > 0:
-            cart = 'CART'
-        else:
-            cart = ''
+        # Shopping signals found, I.E. cart,checkout
+        cart = ','.join(sorted(item['cart'] or []))
 
         row = [
                 item['score'],
@@ -74,28 +66,60 @@ class LightfootPipeline(object):
                 'N/L',
                 datetime.datetime.now().strftime('%m/%d/%Y')
                 ]
-        self.sheet_rows.append(row)
+        return row
+
+
+    def export_spreadsheet(self, item):
+        """Export items to Google Spreadsheets"""
+        self.sheet_rows.append(self.build_row(item))
         self.spreadsheetId = item['spreadsheetId']
 
 
     def open_spider(self, spider):
+        # Sharded spiders of one upload share the same collection
+        self.collection = getattr(spider, 'collection', self.collection)
+        self.sheet = getattr(spider, 'sheet', self.collection)
+        self.spreadsheetId = getattr(spider, 'spreadsheetId', None)
         self.client = pymongo.MongoClient(self.mongo_uri)
         self.db = self.client[self.mongo_db]
+        # Items are upserted by start URL, resumed jobs crawl again the
+        # URLs processed after their last checkpoint
+        self.db[self.collection].create_index('start_url')
+        self.leads = leads.LeadStore(self.db)
 
 
     def close_spider(self, spider):
+        if getattr(spider, 'resumed', False):
+            # Rows crawled before the interruption are only in Mongo
+            docs = self.db[self.collection].find(
+                    {'start_url': {'$in': spider.urls}})
+            self.sheet_rows[1:] = [self.build_row(d) for d in docs]
+        self.leads.flush()
         self.client.close()
-        # Create sheet in google
-        results_spreadsheet = gs.create_sheet(self.spreadsheetId,
-                self.collection)
-        results_spreadsheet = gs.insert_to(self.spreadsheetId, self.collection,
+        # Google calls block, run them off the reactor
+        queue = tasks.get_queue()
+        queue.submit(self.write_results, self.spreadsheetId, self.sheet,
                 self.sheet_rows)
-        results_spreadsheet = gd.mv(self.spreadsheetId,
-                os.environ.get('DRIVE_RESULTS'))
+        # Results of on demand jobs stay where their caller wants them
+        if getattr(spider, 'finalize', True):
+            queue.move(self.spreadsheetId, os.environ.get('DRIVE_RESULTS'))
+
+
+    def write_results(self, spreadsheetId, sheet, rows):
+        """Create sheet in google with rows, a resumed job may have created
+        its sheet already"""
+        return gs.write_sheet(spreadsheetId, sheet, rows)
 
 
     def process_item(self, item, spider):
-        self.db[self.collection].insert_one(dict(item.qualify()))
+        self.db[self.collection].replace_one({'start_url': item['start_url']},
+                dict(item.qualify()), upsert=True)
+        # Merge into consolidated leads, written in bulk
+        self.leads.add(leads.from_website(item))
         # Send to spreadsheet
         self.export_spreadsheet(item)
+        # Only lightfoot spiders keep a job record
+        checkpoint = getattr(spider, 'checkpoint', None)
+        if checkpoint is not None:
+            checkpoint(item['start_url'])
         return item
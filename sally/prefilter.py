@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Dead host prefilter run before a crawl starts.
+
+Hosts of the start URLs are resolved in parallel within a deadline. Hosts
+the DNS says don't exist are dropped and remembered in a negative cache,
+PREFILTER_TTL seconds, so later uploads skip them without a lookup. Live
+addresses seed the DNS cache of sally.extensions.DNSCache. Hosts still
+resolving at the deadline or failing temporarily are crawled as usual."""
+import collections
+import logging
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+from sally.cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+# getaddrinfo errors meaning the host doesn't exist
+DEAD = [getattr(socket, e) for e in ('EAI_NONAME', 'EAI_NODATA')
+        if hasattr(socket, e)]
+
+
+def resolve(host):
+    """Return IPv4 address of _host_, raise socket.gaierror if it can't be
+    resolved."""
+    return socket.getaddrinfo(host, 80, socket.AF_INET,
+            socket.SOCK_STREAM)[0][4][0]
+
+
+class Prefilter(object):
+
+    def __init__(self, workers=64, deadline=10, ttl=86400, dns_ttl=21600,
+            dns_timeout=60, concurrency=32):
+        self.workers = workers
+        self.deadline = deadline
+        self.dead = get_cache('dead_hosts', ttl=ttl)
+        self.dns = get_cache('dns', ttl=dns_ttl)
+        # Used to estimate the crawl time a dead host would have taken
+        self.dns_timeout = dns_timeout
+        self.concurrency = concurrency
+        self.stats = collections.Counter()
+
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(workers=settings.getint('PREFILTER_WORKERS', 64),
+                deadline=settings.getfloat('PREFILTER_DEADLINE', 10),
+                ttl=settings.getint('PREFILTER_TTL', 86400),
+                dns_ttl=settings.getint('DNSCACHE_TTL', 21600),
+                dns_timeout=settings.getfloat('DNS_TIMEOUT', 60),
+                concurrency=settings.getint('CONCURRENT_REQUESTS', 32))
+
+
+    def lookup(self, hosts):
+        """Resolve _hosts_ in parallel until the deadline.
+
+        Returns set of dead hosts"""
+        dead = set()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        futures = dict((executor.submit(resolve, h), h) for h in hosts)
+        done, pending = wait(futures, timeout=self.deadline)
+        # Queued lookups are dropped, the ones resolving end within the
+        # resolver timeout, nobody waits for them
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+        for future in done:
+            host = futures[future]
+            try:
+                self.dns.set(host, future.result())
+                self.stats['live'] += 1
+            except socket.gaierror as ex:
+                if ex.errno in DEAD:
+                    dead.add(host)
+                    self.dead.set(host, ex.errno)
+                else:
+                    self.stats['unknown'] += 1
+            except OSError:
+                self.stats['unknown'] += 1
+        self.stats['timeout'] += len(pending)
+        return dead
+
+
+    def filter(self, urls):
+        """Return _urls_ whose host isn't known to be dead."""
+        started = time.time()
+        hosts = dict((url, urlsplit(url).hostname) for url in urls)
+        dead = set(h for h in set(hosts.values())
+                if h and self.dead.get(h) is not None)
+        self.stats['cached'] = len(dead)
+        dead |= self.lookup(set(h for h in hosts.values()
+            if h and h not in dead))
+        live = [url for url in urls if hosts[url] not in dead]
+
+        self.stats['dropped'] = len(urls) - len(live)
+        self.stats['seconds'] = round(time.time() - started, 2)
+        # Every dead host would hold a download slot until DNS_TIMEOUT
+        self.stats['saved_seconds'] = round(
+                self.stats['dropped'] * self.dns_timeout / self.concurrency
+                - self.stats['seconds'], 2)
+        logger.info('Prefilter dropped %d of %d URLs in %.2fs, about %.0fs '
+                'saved' % (self.stats['dropped'], len(urls),
+                    self.stats['seconds'], self.stats['saved_seconds']))
+        return live
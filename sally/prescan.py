@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Byte level prescan of responses before DOM extraction.
+
+Parked domains and "under construction" pages have no emails, phones,
+e-commerce fingerprints, social links or contact links. Compiled bytes
+regexes look for them in a memoryview of the body, no decoding or copy,
+and pages without any skip lxml parsing and the XPath queries of the
+spider."""
+import collections
+import re
+import time
+from sally.frontier import HINTS
+
+# Signals worth a DOM extraction, any match is enough
+SIGNALS = {
+        'email': re.compile(rb'[\w.+-]@[\w-]+\.\w'),
+        # Area code in parentheses like the spider TEL_334 and TEL_244, bare
+        # digit runs are mostly timestamps and IDs in URLs and scripts
+        'phone': re.compile(rb'\(\d{2,3}\W{0,3}\d{3,4}\W{0,3}\d{4}(?!\d)'),
+        'ecommerce': re.compile(rb'cdn\.shopify\.com|woocommerce|shoperti'
+            rb'|magento|checkout|carrito|cart|paypal|mercadopago',
+            re.IGNORECASE),
+        'social': re.compile(rb'facebook\.com|instagram\.com|twitter\.com',
+            re.IGNORECASE),
+        'link': re.compile(rb'href=["\'][^"\'>]*(?:%s)' % b'|'.join(
+            re.escape(h.encode()) for h in HINTS if ' ' not in h),
+            re.IGNORECASE),
+        }
+
+TITLE = re.compile(rb'<title[^>]*>([^<]*)', re.IGNORECASE)
+
+
+def scan(body, signals=SIGNALS):
+    """Return name of the first signal found in _body_ bytes or None."""
+    view = memoryview(body)
+    for name, regex in signals.items():
+        if regex.search(view):
+            return name
+    return None
+
+
+def title(body, encoding='utf-8'):
+    """Return text of the <title> tag of _body_ bytes or None."""
+    match = TITLE.search(memoryview(body))
+    if match is None:
+        return None
+    return ' '.join(match.group(1).decode(encoding, 'replace').split()) or None
+
+
+class Prescanner(object):
+    """Prescan responses and time DOM extractions to estimate the CPU time
+    saved by skipped pages."""
+
+    def __init__(self, signals=SIGNALS):
+        self.signals = signals
+        self.stats = collections.Counter()
+        self.extracted = 0
+        self.extract_seconds = 0.0
+
+
+    def skip(self, response):
+        """Return True if _response_ has no signal worth a DOM extraction."""
+        started = time.process_time()
+        found = scan(response.body, self.signals)
+        self.stats['seconds'] += time.process_time() - started
+        self.stats['pages'] += 1
+        if found is None:
+            self.stats['skipped'] += 1
+            return True
+        self.stats['signal/%s' % found] += 1
+        return False
+
+
+    def timed(self, extract, *args):
+        """Return extract(*args), its CPU time is averaged to estimate the
+        time of skipped pages."""
+        started = time.process_time()
+        result = extract(*args)
+        self.extract_seconds += time.process_time() - started
+        self.extracted += 1
+        return result
+
+
+    def summary(self):
+        """Return dict of stats with the fraction of skipped pages and the
+        CPU seconds saved."""
+        stats = dict(self.stats)
+        pages = self.stats['pages']
+        average = self.extract_seconds / self.extracted if self.extracted else 0
+        stats['skipped_ratio'] = round(self.stats['skipped'] / pages, 4
+                ) if pages else 0
+        stats['saved_seconds'] = round(self.stats['skipped'] * average
+                - self.stats['seconds'], 4)
+        stats['seconds'] = round(self.stats['seconds'], 4)
+        return stats
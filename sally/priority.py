@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Priority of start URLs by expected lead value.
+
+Start URLs are ordered with cheap signals known before the crawl: the TLD
+of the host, the best score of the domain in the leads collection, an
+e-commerce platform already found there and the row of the upload. Long
+or interrupted crawls then hold the best leads first. Priorities go from 0
+to MAX, follow-up pages of the spider stay above them."""
+import collections
+import logging
+from sally.domains import public_suffix, registrable_domain
+
+logger = logging.getLogger(__name__)
+
+# Value of public suffixes, others are worth 0
+TLDS = {
+        'com.mx': 1.0,
+        'mx': 0.9,
+        'mx.com': 0.6,
+        'com': 0.5,
+        'net': 0.3,
+        'org': 0.2,
+        }
+
+# Points of each signal, a signal value goes from 0 to 1
+WEIGHTS = {
+        'score': 40,
+        'tld': 20,
+        'ecommerce': 20,
+        'row': 10,
+        }
+
+MAX = sum(WEIGHTS.values())
+
+
+class Prioritizer(object):
+    """Compute request priorities of start URLs. _leads_ is a
+    sally.leads.LeadStore, opened on first use if not given and closed by
+    close()."""
+
+    def __init__(self, leads=None, tlds=TLDS, weights=WEIGHTS):
+        self.leads = leads
+        self.opened = False
+        self.tlds = tlds
+        self.weights = weights
+        self.stats = collections.Counter()
+
+
+    def known(self, domains):
+        """Return dict of domain: stored lead, empty if the store can't be
+        read, priorities then come from the URLs alone."""
+        try:
+            if self.leads is None:
+                from sally.leads import LeadStore
+                self.leads = LeadStore()
+                self.opened = True
+            return self.leads.known(domains)
+        except Exception as ex:
+            logger.error("Can't read past leads: %s" % ex)
+            return {}
+
+
+    def priorities(self, urls, rows=None):
+        """Return dict of url: priority of _urls_. _rows_ is a dict of url:
+        row in the upload, earlier rows go first, defaults to _urls_ order.
+        """
+        rows = rows or dict((url, i) for i, url in enumerate(urls))
+        last = max(len(rows) - 1, 1)
+        domains = dict((url, registrable_domain(url)) for url in urls)
+        leads = self.known(domains.values())
+        # Past scores are relative to the best one of the upload
+        best = max([lead.get('score') or 0 for lead in leads.values()] + [0])
+
+        priorities = {}
+        for url in urls:
+            lead = leads.get(domains[url], {})
+            values = {
+                    'score': (lead.get('score') or 0) / best if best > 0 else 0,
+                    'tld': self.tlds.get(public_suffix(url), 0),
+                    'ecommerce': 1 if lead.get('ecommerce') else 0,
+                    'row': 1 - min(rows.get(url, last), last) / last,
+                    }
+            priorities[url] = int(round(sum(self.weights[k] * v
+                for k, v in values.items())))
+            if lead:
+                self.stats['known'] += 1
+            if values['ecommerce']:
+                self.stats['ecommerce'] += 1
+        self.stats['urls'] = len(urls)
+        return priorities
+
+
+    def order(self, urls, rows=None):
+        """Return list of (priority, url) of _urls_, highest first and in
+        row order among equals."""
+        rows = rows or dict((url, i) for i, url in enumerate(urls))
+        priorities = self.priorities(urls, rows)
+        return sorted(((priorities[url], url) for url in urls),
+                key=lambda p: (-p[0], rows.get(p[1], len(rows))))
+
+
+    def close(self):
+        """Close the store opened by known(), a given one is left open."""
+        if self.opened:
+            self.leads.close()
+            self.leads = None
+            self.opened = False
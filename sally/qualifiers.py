@@ -1,4 +1,6 @@
 # _*_ coding: utf-8 _*_
+import unicodedata
+
 QUALIFIER = {
         'products': [
             'cosméticos',
@@ -49,3 +51,7 @@ QUALIFIER = {
         }
 
 
+def fold(text):
+    """Return lower case _text_ without accents, I.E. Electrónica -> electronica"""
+    return ''.join(c for c in unicodedata.normalize('NFKD', text.lower())
+            if not unicodedata.combining(c))
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Shard Drive uploads across worker processes, one reactor per worker."""
+import datetime
+import logging
+import multiprocessing
+import os
+import time
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+import sally.google.spreadsheet as gs
+from sally import domains
+from sally.jobs import JobStore
+from sally.spiders.lightfoot_spider import BasicCrab
+from sally import tasks
+
+logger = logging.getLogger(__name__)
+
+# Uploads with more URLs than this are split in several shards
+SHARD_SIZE = 250
+
+# Crawler stats reported back by each worker
+STATS = [
+        'finish_reason',
+        'item_scraped_count',
+        'response_received_count',
+        'downloader/request_count',
+        'downloader/exception_count',
+        ]
+
+
+def plan(uploads, workers, unfinished={}, shard_size=SHARD_SIZE):
+    """Return crawl jobs for given _uploads_.
+
+    One results spreadsheet is created for each upload, large uploads are
+    split in up to _workers_ URL shards which write to that spreadsheet.
+    Uploads with an _unfinished_ job record reuse its spreadsheet.
+
+    Returns list of (weight, spider kwargs) tuples"""
+    jobs = []
+    for f in uploads:
+        urls = gs.get_urls(f['id'])
+        count = max(1, min(workers, -(-len(urls) // shard_size)))
+        if f['id'] in unfinished:
+            spreadsheetId = unfinished[f['id']]['spreadsheetId']
+            collection = unfinished[f['id']]['collection']
+        else:
+            spreadsheetId = gs.create_spreadsheet(f['name'])['spreadsheetId']
+            collection = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        for index in range(count):
+            job = {
+                    'csvfile': f['id'],
+                    'spreadsheet': spreadsheetId,
+                    'collection': collection
+                    }
+            if count > 1:
+                job['shard'] = '%d/%d' % (index, count)
+            jobs.append((len(urls) / count, job))
+
+    return jobs
+
+
+def distribute(jobs, workers):
+    """Distribute weighted _jobs_ in _workers_ bins, heaviest job goes to
+    the least loaded bin.
+
+    Returns list of job lists, empty bins are left out"""
+    bins = [[0, []] for i in range(workers)]
+    for weight, job in sorted(jobs, key=lambda j: j[0], reverse=True):
+        lightest = min(bins, key=lambda b: b[0])
+        lightest[0] += weight
+        lightest[1].append(job)
+
+    return [b[1] for b in bins if b[1]]
+
+
+def crawl(jobs):
+    """Run given lightfoot _jobs_ in this process own reactor.
+
+    Returns dict of worker stats"""
+    # Results are sent by the parent in one summary email of the run
+    queue = tasks.get_queue()
+    queue.hold()
+    process = CrawlerProcess(get_project_settings())
+    crawlers = []
+    for job in jobs:
+        crawler = process.create_crawler(BasicCrab)
+        process.crawl(crawler, **job)
+        crawlers.append(crawler)
+
+    started = time.time()
+    process.start()
+    queue.join()
+    stats = []
+    for crawler in crawlers:
+        values = crawler.stats.get_stats()
+        stats.append(dict((k, values.get(k, 0)) for k in STATS))
+
+    return {
+            'pid': os.getpid(),
+            'elapsed': time.time() - started,
+            'jobs': jobs,
+            'stats': stats,
+            'notify': list(queue.held)
+            }
+
+
+def finalize(results):
+    """Move sharded uploads to done once all of their shards are finished,
+    unsharded spiders do it on their own. Results of every worker go in a
+    single summary email."""
+    uploads = {}
+    interrupted = set()
+    for result in results:
+        for job, stats in zip(result['jobs'], result['stats']):
+            if 'shard' in job:
+                uploads[job['csvfile']] = job['spreadsheet']
+                if stats['finish_reason'] != 'finished':
+                    interrupted.add(job['csvfile'])
+
+    store = JobStore()
+    queue = tasks.get_queue()
+    for csvfile, spreadsheetId in uploads.items():
+        if csvfile in interrupted:
+            # Resume the upload in the next run
+            continue
+        store.finish(csvfile)
+        queue.move(csvfile, os.environ.get('DRIVE_DONE'))
+        queue.notify(spreadsheetId)
+    store.close()
+    # Held by the workers for unsharded uploads
+    for result in results:
+        for spreadsheetId in result.get('notify', []):
+            queue.notify(spreadsheetId)
+    queue.flush()
+
+
+def report(results):
+    """Log per worker stats and return totals."""
+    totals = {}
+    for result in results:
+        items = sum(s['item_scraped_count'] for s in result['stats'])
+        responses = sum(s['response_received_count'] for s in result['stats'])
+        logger.info('[worker %s] %d jobs, %d items, %d responses in %.1fs'
+                % (result['pid'], len(result['jobs']), items, responses,
+                    result['elapsed']))
+        for s in result['stats']:
+            for k in STATS[1:]:
+                totals[k] = totals.get(k, 0) + s[k]
+
+    logger.info('[scheduler] %s' % totals)
+    return totals
+
+
+def get_pool(processes):
+    """Return pool of _processes_ forked one crawl each by a fork server, a
+    process forked from one running threads may deadlock on a lock another
+    thread held. The server imports scrapy and the spiders once for all."""
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['sally.scheduler'])
+    return context.Pool(processes=processes, maxtasksperchild=1)
+
+
+def run(uploads, workers, unfinished={}):
+    """Crawl _uploads_ in _workers_ processes, each one with its own
+    reactor. Returns list of worker stats."""
+    bins = distribute(plan(uploads, workers, unfinished), workers)
+    if not bins:
+        return []
+
+    # Workers map the suffix list compiled once by the parent
+    domains.get_table()
+    # A reactor can't be restarted, every bin gets a fresh process
+    pool = get_pool(len(bins))
+    try:
+        results = pool.map(crawl, bins, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    finalize(results)
+    report(results)
+    return results
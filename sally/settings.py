@@ -11,18 +11,13 @@
 
 BOT_NAME = 'sally'
 
-### BEGIN Eve settings
+### BEGIN API settings, see sally/api.py
 
 API_VERSION = 'v1'
-DOMAIN = { }
-MONGO_HOST = '127.0.0.1'
-MONGO_PORT = 27017
-MONGO_DBNAME = BOT_NAME + '_' + API_VERSION
-#MONGO_USERNAME =
-#MONGO_PASSWORD =
-ALLOWED_FILTERS = []
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
 
-### END Eve settings
+### END API settings
 
 SPIDER_MODULES = ['sally.spiders']
 NEWSPIDER_MODULE = 'sally.spiders'
@@ -32,6 +27,19 @@ USER_AGENT = 'sally (+http://www.shipkraken.com)'
 
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = True
+# robots.txt files and host addresses are cached on disk (SALLY_CACHE_DIR)
+# for every spider and run, seconds and entries at most
+ROBOTSTXT_CACHE_TTL = 86400
+ROBOTSTXT_CACHE_SIZE = 100000
+DNSCACHE_TTL = 21600
+DNSCACHE_PERSIST_SIZE = 100000
+
+# Hosts of start URLs are resolved before crawling, the ones which don't
+# exist are dropped and remembered for PREFILTER_TTL seconds
+PREFILTER_ENABLED = True
+PREFILTER_WORKERS = 64
+PREFILTER_DEADLINE = 10
+PREFILTER_TTL = 86400
 
 FEED_FORMAT = 'jsonlines'
 ## AttributeError: 'FeedExporter' object has no attribute 'slot'
@@ -41,10 +49,36 @@ FEED_FORMAT = 'jsonlines'
 
 DEPTH_LIMIT = 1
 
+# Follow-up links (contacto, nosotros, tienda...) crawled for each site and
+# in flight at most across every site
+FRONTIER_PER_SITE = 3
+FRONTIER_CAPACITY = 2000
+
+# Pages without emails, phones, shop or social signals in their bytes skip
+# the DOM extraction, see sally.prescan
+PRESCAN_ENABLED = True
+
+# Start URLs are ordered by expected lead value, see sally.priority
+PRIORITY_ENABLED = True
+
 OUTPUT_PATH = '/tmp/sally/test.json'
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
 CONCURRENT_REQUESTS = 32
 
+# Start URLs are tried over HTTPS first, seconds before falling back to HTTP.
+# Probing stops when more than HTTPS_PROBE_MAX_TIMEOUTS of the probes time
+# out, once HTTPS_PROBE_SAMPLE probes were sent
+HTTPS_PROBE_TIMEOUT = 10
+HTTPS_PROBE_SAMPLE = 100
+HTTPS_PROBE_MAX_TIMEOUTS = 0.2
+
+# Keep-alive HTTP/1.1 pool counting connections opened and requests sent,
+# Scrapy 1.4 has no HTTP/2 support
+DOWNLOAD_HANDLERS = {
+    'http': 'sally.handlers.CountingHTTPDownloadHandler',
+    'https': 'sally.handlers.CountingHTTPDownloadHandler',
+}
+
 REACTOR_THREADPOOL_MAXSIZE = 20
 
 RETRY_ENABLED = False
@@ -86,6 +120,8 @@ SPIDER_MIDDLEWARES = {
 #    'sally.middlewares.MyCustomDownloaderMiddleware': 543,
 #}
 DOWNLOADER_MIDDLEWARES = {
+    'scrapy.downloadermiddlewares.robotstxt.RobotsTxtMiddleware': None,
+    'sally.middlewares.CachedRobotsTxtMiddleware': 100,
     'scrapy.spidermiddlewares.offsite.OffsiteMiddleware': 540,
     'scrapy.downloadermiddlewares.ajaxcrawl.AjaxCrawlMiddleware': 543,
 }
@@ -95,6 +131,9 @@ DOWNLOADER_MIDDLEWARES = {
 #EXTENSIONS = {
 #    'scrapy.extensions.telnet.TelnetConsole': None,
 #}
+EXTENSIONS = {
+    'sally.extensions.DNSCache': 500,
+}
 
 # Configure item pipelines
 # See http://scrapy.readthedocs.org/en/latest/topics/item-pipeline.html
@@ -102,9 +141,22 @@ DOWNLOADER_MIDDLEWARES = {
 #    'sally.pipelines.SallyPipeline': 300,
 #}
 ITEM_PIPELINES = {
+    'sally.aggregate.AggregationPipeline': 100,
     'sally.pipelines.LightfootPipeline': 300,
+    'sally.archive.ArchivePipeline': 400,
 }
 
+# Pages of a site are merged into one item, sites buffered at most and
+# seconds a site waits for its pages
+AGGREGATE_MAX_SITES = 1000
+AGGREGATE_TIMEOUT = 120
+LOG_FORMATTER = 'sally.aggregate.LogFormatter'
+
+# Parquet results archive, disabled unless ARCHIVE_DIR or SALLY_ARCHIVE_DIR
+# environment variable is set
+#ARCHIVE_DIR = '/tmp/sally/archive'
+ARCHIVE_COMPRESSION = 'zstd'
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See http://doc.scrapy.org/en/latest/topics/autothrottle.html
 #AUTOTHROTTLE_ENABLED = True
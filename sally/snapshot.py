@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Crawler settings and score values loaded once per process.
+
+The settings spreadsheet is kept as a local snapshot on disk, versioned
+by the spreadsheet modified time in Drive. Spiders start from the snapshot,
+loads more than REFRESH seconds after the last check look for a new
+version in a short lived thread, so no process keeps a watcher running. If
+Google is slow or down the last good snapshot keeps being used."""
+import os
+import json
+import logging
+import threading
+import time
+import sally.google.spreadsheet as gs
+import sally.google.drive as gd
+from sally.cache import cache_path
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the spreadsheet modified time
+REFRESH = 300
+
+
+class SettingsSnapshot(object):
+
+    def __init__(self, spreadsheetId=None, path=None, refresh=None):
+        self.spreadsheetId = spreadsheetId or os.environ['SALLY_SETTINGS_ID']
+        self.path = path or cache_path('settings_%s.json' % self.spreadsheetId)
+        self.refresh = int(refresh or os.environ.get('SALLY_SETTINGS_REFRESH',
+            REFRESH))
+        self.lock = threading.Lock()
+        self.data = None
+        self.checked = 0
+
+
+    def read(self):
+        """Return snapshot saved on disk or None."""
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+
+    def write(self, data):
+        """Save snapshot, readers never see a partial file."""
+        tmp = '%s.%d' % (self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+
+    def fetch(self, version=None):
+        """Return a fresh snapshot from Google spreadsheets."""
+        data = {
+                'version': version or gd.get_modified_time(self.spreadsheetId),
+                'fetched': time.time(),
+                'settings': gs.get_settings(self.spreadsheetId),
+                'score': gs.get_score(self.spreadsheetId)
+                }
+        self.write(data)
+        return data
+
+
+    def update(self):
+        """Fetch the spreadsheet again only if it changed since the current
+        snapshot version."""
+        try:
+            version = gd.get_modified_time(self.spreadsheetId)
+            if version != self.data['version']:
+                data = self.fetch(version)
+                with self.lock:
+                    self.data = data
+                logger.info('Settings snapshot updated to %s' % version)
+        except Exception as ex:
+            logger.warning("Can't refresh settings, using snapshot %s: %s"
+                    % (self.data['version'], ex))
+
+
+    def load(self):
+        """Return current snapshot, it is fetched synchronously only if
+        there is none on disk. Callers go on with it while a newer version
+        is looked for in background."""
+        with self.lock:
+            if self.data is None:
+                self.data = self.read() or self.fetch()
+                self.checked = self.data['fetched']
+            if time.time() - self.checked > self.refresh:
+                self.checked = time.time()
+                threading.Thread(target=self.update, daemon=True,
+                        name='sally-settings').start()
+            return self.data
+
+
+    def get_settings(self):
+        return self.load()['settings']
+
+
+    def get_score(self):
+        return self.load()['score']
+
+
+_snapshot = None
+
+
+def get_snapshot():
+    """Return the settings snapshot of this process."""
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = SettingsSnapshot()
+    return _snapshot
+
+
+def get_settings():
+    """Return crawler settings from the local snapshot."""
+    return get_snapshot().get_settings()
+
+
+def get_score():
+    """Return score values from the local snapshot."""
+    return get_snapshot().get_score()
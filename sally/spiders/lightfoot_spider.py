@@ -4,16 +4,24 @@ from datetime import datetime
 import re
 from urllib.parse import urlparse
 from itertools import filterfalse
-import tldextract
-import sendgrid
-from sendgrid.helpers.mail import *
 import scrapy
-from scrapy.spiders import CrawlSpider, Rule
-from scrapy.linkextractors import LinkExtractor
+from scrapy import signals
+from scrapy.spiders import CrawlSpider
 from scrapy.loader import ItemLoader
+from twisted.internet import threads
+from twisted.internet.error import TimeoutError
 from sally.items import WebsiteItem
+from sally.classindex import ClassIndex
+from sally.frontier import Frontier, candidates, host
+from sally import offers
+from sally.jobs import JobStore
+from sally.prefilter import Prefilter
+from sally import priority
+from sally.prescan import Prescanner, title
+from sally.text import Page
+from sally import tasks
 import sally.google.spreadsheet as gs
-import sally.google.drive as gd
+import sally.snapshot as snapshot
 
 
 class BasicCrab(CrawlSpider):
@@ -22,17 +30,50 @@ class BasicCrab(CrawlSpider):
 
     name = "lightfoot"
 
-    # TODO I still don't knpw what to do with the rules
-    rules = (Rule(LinkExtractor(unique=True), callback='parse_link'))
+    # TEL_334 I.E. (555) 123 4567, TEL_244 I.E. (55) 1234 5678
+    TEL_334 = r'\(+(\d{3})\W*(\d{3})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]'
+    TEL_244 = r'\(+(\d{2})\W*(\d{4})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]'
 
-    def __init__(self, csvfile, spreadsheet,
-            *args, **kwargs):
+    EMAIL = r'\"?([-a-zA-Z0-9.`?{}]+@\w+\.[^png|jpg|gif]\w+\.\w*)"?'
+
+    NETWORKS = ['facebook\.com', 'instagram\.com', 'twitter\.com']
+
+    # Follow-up pages get ahead of start URLs so sites finish early
+    FOLLOWUP_PRIORITY = priority.MAX + 10
+
+    # Processed URLs are saved to the job record in batches of this size
+    CHECKPOINT_BATCH = 20
+
+    def __init__(self, csvfile, spreadsheet, collection=None, shard=None,
+            finalize=True, job_id=None, *args, **kwargs):
 
         self.source_urls = csvfile
-        self.spreadsheetId = spreadsheet
-        # Fetch settings from Google spreadsheet
-        self.config = gs.get_settings()
-        self.score = gs.get_score()
+        # On demand jobs have a record of their own, keyed by queue job ID,
+        # apart from the one of a cron run of the same upload
+        self.job_id = job_id or csvfile
+        # Unfinished jobs keep their spreadsheet and collection on resume
+        self.jobs = JobStore()
+        job = self.jobs.start(self.job_id, spreadsheet,
+                collection or datetime.now().strftime('%Y%m%d_%H%M%S'))
+        self.spreadsheetId = job['spreadsheetId']
+        # Shards of the same upload share collection, each has its own sheet
+        self.collection = job['collection']
+        self.shard = shard
+        # On demand jobs leave the upload where it is and send no email
+        self.finalize = finalize
+        self.pending = []
+        # Side effects of closing run off the reactor, see closed()
+        self.tasks = tasks.get_queue()
+        self.sheet = self.collection
+        if shard:
+            self.sheet = '%s_%s' % (self.collection, shard.split('/')[0])
+        # Settings from local snapshot of Google spreadsheet
+        self.config = snapshot.get_settings()
+        self.score = snapshot.get_score()
+        # Offer keywords are compiled once for the whole crawl
+        self.classifier = offers.OfferClassifier(
+                self.config['allowed_keywords'],
+                self.config['disallowed_keywords'])
 
         # Compile regexes
         # allowed_reg list of allowed TDLs to crawl
@@ -46,6 +87,10 @@ class BasicCrab(CrawlSpider):
         #lines = []
 
         lines = ["http://%s" % str(l).rstrip() for l in gs.get_urls(csvfile)]
+        # Row of every URL in the upload, earlier rows are crawled first
+        self.rows = {}
+        for row, line in enumerate(lines):
+            self.rows.setdefault(line, row)
 
         allowed_url = []
         for r in allowed_reg:
@@ -55,31 +100,70 @@ class BasicCrab(CrawlSpider):
         for r in disallowed_reg:
             disallowed_url += list(filter(r.search, list(set(allowed_url))))
 
-        self.start_urls = list(set(allowed_url).difference(set(disallowed_url)))
+        # Sorted so every shard process splits the same list
+        self.start_urls = sorted(set(allowed_url).difference(set(disallowed_url)))
+        if shard:
+            index, count = [int(n) for n in shard.split('/')]
+            self.start_urls = self.start_urls[index::count]
+
+        # Skip URLs processed before an interruption
+        self.urls = list(self.start_urls)
+        processed = set(job['processed'])
+        self.resumed = len(processed) > 0
+        self.start_urls = [u for u in self.urls if u not in processed]
+        if self.resumed:
+            self.logger.info('Resuming %s, %d of %d URLs left' % (csvfile,
+                len(self.start_urls), len(self.urls)))
+
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(BasicCrab, cls).from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.opened, signals.spider_opened)
+        if crawler.settings.getbool('PREFILTER_ENABLED'):
+            crawler.signals.connect(spider.prefilter, signals.spider_opened)
+        return spider
+
 
+    def opened(self, spider):
+        """Hold the completion queue until closed() releases it, a spider
+        failing to open never closes and never holds it"""
+        self.tasks.acquire()
 
-    def extract_title(self, response):
+
+    def prefilter(self, spider):
+        """Drop start URLs of dead hosts before the crawl starts, not when
+        they time out holding a download slot. Lookups run off the reactor,
+        the engine waits for the returned Deferred before pulling start
+        requests"""
+        prefilter = Prefilter.from_settings(self.settings)
+
+        def filtered(live):
+            self.start_urls = live
+            for key, value in prefilter.stats.items():
+                self.crawler.stats.set_value('prefilter/%s' % key, value)
+
+        return threads.deferToThread(prefilter.filter,
+                self.start_urls).addCallback(filtered)
+
+
+    def extract_title(self, page):
         """extract_title from <title> tag
 
         Returns {str} title"""
-        try:
-            return response.css('title::text').extract_first().strip()
-        except Exception:
-            self.logger.error('Extract title %s' % Exception)
-            return 'N/T'
+        return page.title or 'N/T'
 
 
-    def extract_email(self, response, elements, email_set=set({})):
-        """Extract email from elements listed in ELEMENTS
+    def extract_email(self, page, elements):
+        """Extract email from text and links inside elements listed in
+        ELEMENTS
 
         Returns a set() of emails
         """
-        if len(elements) > 0:
-            myset = set(response.xpath('//' + elements.pop()).re(
-                r'\"?([-a-zA-Z0-9.`?{}]+@\w+\.[^png|jpg|gif]\w+\.\w*)"?'))
-            return self.extract_email(response, elements, myset)
-        else:
-            return email_set
+        within = frozenset(elements)
+        values = page.texts(within) + page.values('a', 'href')
+        return set(email for value in values
+                for email in re.findall(BasicCrab.EMAIL, value))
 
 
     def to_tel(self, raw, code, tel_list=[]):
@@ -103,94 +187,49 @@ class BasicCrab(CrawlSpider):
             return tel_list
 
 
-    def extract_telephone(self, response, elements, tels=[]):
-        """Extract telephone from elements listed in ELEMENTS
-
-        Returns a set() of telephones
-        """
-        if len(elements) > 0:
-            e = elements.pop()
-            t334 = []
-            t334 = response.xpath('//' + e).re(
-                r'\(+(\d{3})\W*(\d{3})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-            t224 = []
-            t244 = response.xpath('//' + e).re(
-                r'\(+(\d{2})\W*(\d{4})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-            t_2_8 = response.xpath('//' + e).re(
-                r'\(+(\d{2})\W*(\d{8})\W*[^png|jpg|gif]')
-            t10 = []
-            t10 = response.xpath('//' + e).re(
-                r'\W*(\d{10})\W*[^png|jpg|gif]')
-            tels.append('-'.join(t334[:3]))
-            tels.append('-'.join(t334[3:3]))
-            tels.append('-'.join(t334[6:3]))
-            tels.append('-'.join(t244[:3]))
-            tels.append('-'.join(t244[3:3]))
-            tels.append('-'.join(t244[6:3]))
-            # TODO append 10 digit numbers
-            return self.extract_telephone(response, elements, list(filter(None,tels)))
-        else:
-            tset = set(tels)
-            self.logger.debug(tset)
-            if len(tset) > 0:
-                return list(tset)
-            else:
-                return []
-
-
-    def is_ecommerce(self, response):
+    def is_ecommerce(self, page):
         """Very simplistic e-commerce software detection
 
         Returns str of ecommerce software"""
-        ecommerce = None
-        full_text = response.xpath('//meta/@content').extract()
-        if len(response.xpath('//script/@src').re(r'cdn\.shopify\.com')) > 0:
+        def found(regex, values, flags=0):
+            return any(re.search(regex, v, flags) for v in values)
+
+        if found(r'cdn\.shopify\.com', page.values('script', 'src')):
             # Look for cdn.shopify.com
             return 'shopify'
-        if len(response.xpath('//meta[@name="generator"]/@content')
-                .re(r'WooCommerce')) > 0:
+        if found(r'WooCommerce', page.meta('generator')):
             return 'woocommerce'
-        elif len(response.xpath('//img/@src').re(r'cdn-shoperti\.global')) > 0:
+        elif found(r'cdn-shoperti\.global', page.values('img', 'src')):
             return 'shoperti'
-        elif (len(response.xpath('//footer').re(r'[Mm]agento', re.IGNORECASE)) > 0
-                or len(response.xpath('//head').re(r'[Mm]agento', re.IGNORECASE)) > 0):
+        elif found(r'[Mm]agento', page.contents(frozenset(['footer', 'head'])),
+                re.IGNORECASE):
             return 'magento'
         else:
             return 'N/E'
 
 
-    def shoppingcart_detection(self, divs):
-        result = []
-        p = re.compile(r'cart')
-        result += list(filter(p.search, divs))
-        self.logger.debug(result)
-        return list(set(result))
-
+    def shoppingcart_detection(self, page):
+        """Detect cart, checkout, basket and payment classes
 
-    def online_payment(self, links):
-        elements = list(BasicCrab.ELEMENTS)
-        result = []
-        r = re.compile(r'paypal.me/\w*')
-        result += list(filter(r.match, links))
-        self.logger.debug(result)
-        return result
+        Returns dict of signal: class tokens found"""
+        return ClassIndex.from_page(page).signals()
 
 
-    def extract_description(self, response):
+    def extract_description(self, page):
         """extract_description from <meta name="description"> tags
 
         Returns list of descriptions"""
-        return response.xpath('//meta[@name="description"]/@content').extract()
+        return page.meta('description')
 
 
-    def extract_keywords(self, response):
+    def extract_keywords(self, page):
         """extract_keywords from <meta name="keywords" tag.
 
         Returns list of keywords"""
-        return response.xpath('//meta[@name="keywords"]/@content').extract()
+        return page.meta('keywords')
 
 
-    def extract_social_networks(self, response, base_url,
+    def extract_social_networks(self, page, base_url,
             found=set({}), networks=[]):
         """extract_social_networks from <a href> tags, it matches agaist
         part of the base url.
@@ -207,30 +246,26 @@ class BasicCrab(CrawlSpider):
 
         if len(networks) > 0:
             n = networks.pop()
-            found.update(set(response.xpath('//a/@href').re(
-                    r'(\w*\.' + n + '\/\w*' + s + '\w*)')))
-            found.update(set(response.xpath('//a/@href').re(
-                r'(\w*\.' + n + '\/\w*' + s[:3] + '\w*)')))
-            return self.extract_social_networks(response, s, found,
+            for href in page.values('a', 'href'):
+                found.update(re.findall(
+                    r'(\w*\.' + n + '\/\w*' + s + '\w*)', href))
+                found.update(re.findall(
+                    r'(\w*\.' + n + '\/\w*' + s[:3] + '\w*)', href))
+            return self.extract_social_networks(page, s, found,
                     networks)
 
         return found
 
 
-    def extract_offer(self, website):
-        # TODO make it better to store array of useful products in self['keywords']
-        products = []
-        if (type(website['keywords']) is list
-            and len(website['keywords']) > 0 and website['keywords'][0] != ''):
-            [products.append(p) for p
-                    in website['keywords'][0].replace(' ','').split(',')
-                    if p in self.config['allowed_keywords']]
-        if (type(website['description']) is list
-                and len(website['description']) > 0 and website['description'] != ''):
-            [products.append(i) for i in website['description'][0].split(' ')
-                    if i in self.config['allowed_keywords']]
+    def extract_offer(self, website, page):
+        """Match offer keywords in title, <meta> keywords and description and
+        visible text of the page
 
-        return products
+        Returns dict of category: {keyword: count}"""
+        text = ' '.join(page.texts(frozenset(['body'])))
+        return self.classifier.classify(website['title'],
+                ' '.join(website['keywords'] or []),
+                ' '.join(website['description'] or []), text)
 
 
     def clearset(self):
@@ -239,124 +274,236 @@ class BasicCrab(CrawlSpider):
         return s
 
 
-    def start_requests(self):
-        """Returns iterable of Requests"""
-        for url in self.start_urls:
-            yield scrapy.Request(url=url, callback=self.parse_item)
+    def checkpoint(self, url, flush=False):
+        """Record _url_ as processed in the job, records are saved in
+        batches of CHECKPOINT_BATCH"""
+        if url:
+            self.pending.append(url)
+        if flush or len(self.pending) >= BasicCrab.CHECKPOINT_BATCH:
+            self.jobs.processed(self.job_id, self.pending)
+            self.pending = []
 
 
-    def parse_link(self, link):
-        self.logger.info(link)
+    def start_requests(self):
+        """Returns iterable of Requests"""
+        self.frontier = Frontier(
+                per_site=self.settings.getint('FRONTIER_PER_SITE', 3),
+                capacity=self.settings.getint('FRONTIER_CAPACITY', 2000))
+        # Pages without contact or shop signals skip the DOM extraction
+        self.prescanner = None
+        if self.settings.getbool('PRESCAN_ENABLED'):
+            self.prescanner = Prescanner()
+        if not self.settings.getbool('PRIORITY_ENABLED'):
+            for url in self.start_urls:
+                yield self.probe(url)
+            return
+        # Yielded best first, start requests are pulled lazily by the engine
+        # and the priority queue orders the ones already scheduled
+        prioritizer = priority.Prioritizer()
+        try:
+            ordered = prioritizer.order(self.start_urls, self.rows)
+        finally:
+            prioritizer.close()
+        for key, value in prioritizer.stats.items():
+            self.crawler.stats.set_value('priority/%s' % key, value)
+        for value, url in ordered:
+            yield self.probe(url, value)
+
+
+    def probing(self):
+        """Return False once too many HTTPS probes time out, each one costs
+        HTTPS_PROBE_TIMEOUT seconds on sites which drop HTTPS silently"""
+        stats = self.crawler.stats
+        probes = stats.get_value('probe/https', 0)
+        if probes < self.settings.getint('HTTPS_PROBE_SAMPLE', 100):
+            return True
+        return (stats.get_value('probe/timeout', 0) / probes
+                < self.settings.getfloat('HTTPS_PROBE_MAX_TIMEOUTS', 0.2))
+
+
+    def probe(self, url, priority=0):
+        """Request _url_ over HTTPS first with a short timeout, most sites
+        redirect there anyway and it saves a round trip and a connection"""
+        if not url.startswith('http://') or not self.probing():
+            return scrapy.Request(url=url, callback=self.parse_item,
+                    errback=self.parse_error, priority=priority,
+                    meta={'start_url': url})
+        self.crawler.stats.inc_value('probe/https')
+        return scrapy.Request(url='https://' + url[len('http://'):],
+                callback=self.parse_item, errback=self.probe_error,
+                priority=priority, meta={'start_url': url, 'download_timeout':
+                    self.settings.getfloat('HTTPS_PROBE_TIMEOUT', 10)})
+
+
+    def probe_error(self, failure):
+        """HTTPS failed, fall back to the given HTTP URL"""
+        self.logger.debug(repr(failure))
+        self.crawler.stats.inc_value('probe/http_fallback')
+        if failure.check(TimeoutError):
+            self.crawler.stats.inc_value('probe/timeout')
+        url = failure.request.meta['start_url']
+        return scrapy.Request(url=url, callback=self.parse_item,
+                errback=self.parse_error, priority=failure.request.priority,
+                meta={'start_url': url})
+
+
+    def parse_error(self, failure):
+        """Dead sites are processed too, don't crawl them again on resume"""
+        self.logger.debug(repr(failure))
+        self.checkpoint(failure.request.meta.get('start_url'))
+
+
+    def extract_telephones(self, page):
+        """Extract telephones from text inside elements listed in ELEMENTS
+
+        Returns list of telephones"""
+        tels = set()
+        for text in page.texts(frozenset(BasicCrab.ELEMENTS)):
+            for regex in (BasicCrab.TEL_334, BasicCrab.TEL_244):
+                for match in re.finditer(regex, text):
+                    tels.add('-'.join(match.groups()[:3]))
+        return list(tels)
+
+
+    def extract_links(self, page):
+        """Return (url, anchor text) of <a href> tags"""
+        return page.links()
+
+
+    def extract_page(self, page):
+        """Extract contact and e-commerce fields of any page of a site
+
+        Returns dict of fields"""
+        parsed_url = urlparse(page.url)
+        ## Social network detection
+        website_network = list(self.extract_social_networks(page,
+            parsed_url.netloc.split('.'), set({}),
+            list(BasicCrab.NETWORKS)))
+        return {
+                'email': list(self.extract_email(page,
+                    list(BasicCrab.ELEMENTS))),
+                'telephone': self.extract_telephones(page),
+                'network': website_network,
+                'cart': self.shoppingcart_detection(page),
+                'ecommerce': self.is_ecommerce(page)
+                }
+
+
+    def extract_followup(self, response):
+        """Extract fields of a follow-up page
+
+        Returns dict of fields"""
+        return self.extract_page(Page.from_response(response))
+
+
+    def page_item(self, request, fields={}):
+        """Return partial item of a follow-up page, merged into its site item
+        by sally.aggregate.AggregationPipeline"""
+        page = WebsiteItem(fields)
+        page['base_url'] = request.meta['base_url']
+        page['start_url'] = request.meta['start_url']
+        page['url'] = request.url
+        return page
+
+
+    def parse_followup(self, response):
+        self.frontier.done()
+        if self.prescanner is None:
+            return self.page_item(response.request,
+                    self.extract_followup(response))
+        if self.prescanner.skip(response):
+            return self.page_item(response.request)
+        return self.page_item(response.request,
+                self.prescanner.timed(self.extract_followup, response))
+
+
+    def followup_error(self, failure):
+        """Failed follow-ups are counted as pages too so the site item is
+        not held until the aggregation timeout"""
+        self.logger.debug(repr(failure))
+        self.frontier.done()
+        return self.page_item(failure.request)
+
+
+    def extract_website(self, website, response):
+        """Extract fields of the start page of a site into _website_
+
+        Returns list of (score, url) of follow-up pages"""
+        # Text nodes and attributes are read once, extractors query them
+        page = Page.from_response(response)
+        website['title'] = self.extract_title(page)
+        website.update(self.extract_page(page))
+        website['description'] = self.extract_description(page)
+        website['keywords'] = self.extract_keywords(page)
+        website['offer_counts'] = self.extract_offer(website, page)
+        website['offer'] = offers.offer(website['offer_counts'])
+
+        # Follow only the best contact, about and shop links of the site
+        site = host(response.url)
+        followups = self.frontier.push(candidates(self.extract_links(page),
+                site))
+        website['link'] = [url for score, url in followups]
+        website['pages'] = 1 + len(followups)
+        return followups
+
+
+    def skip_website(self, website, response):
+        """Fill _website_ with empty fields of a page without signals, the
+        title is read from the bytes
+
+        Returns empty list of follow-up pages"""
+        website['title'] = title(response.body, response.encoding) or 'N/T'
+        website.update({'email': [], 'telephone': [], 'network': [],
+            'cart': {}, 'ecommerce': 'N/E', 'description': [], 'keywords': [],
+            'offer_counts': {}, 'offer': [], 'link': [], 'pages': 1})
+        return []
 
 
     def parse_item(self, response):
-        # Collect all links found in crawled pages
-        website_email = list(self.extract_email(response,
-            list(BasicCrab.ELEMENTS)))
-        tels = list()
-        t334 = list()
-        t334 = response.xpath('//' + BasicCrab.ELEMENTS[0]).re(
-            r'\(+(\d{3})\W*(\d{3})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-        tels.append('-'.join(t334[:3]))
-        tels.append('-'.join(t334[3:3]))
-        tels.append('-'.join(t334[6:3]))
-        t224 = list()
-        t244 = response.xpath('//' + BasicCrab.ELEMENTS[0]).re(
-            r'\(+(\d{2})\W*(\d{4})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-        tels.append('-'.join(t244[:3]))
-        tels.append('-'.join(t244[3:3]))
-        tels.append('-'.join(t244[6:3]))
-        t_2_8 = list()
-        t_2_8 = response.xpath('//' + BasicCrab.ELEMENTS[0]).re(
-            r'\(+(\d{2})\W*(\d{8})\W*[^png|jpg|gif]')
-        self.logger.debug(t_2_8)
-        t334 = list()
-        t334 = response.xpath('//' + BasicCrab.ELEMENTS[1]).re(
-            r'\(+(\d{3})\W*(\d{3})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-        tels.append('-'.join(t334[:3]))
-        tels.append('-'.join(t334[3:3]))
-        tels.append('-'.join(t334[6:3]))
-        t224 = list()
-        t244 = response.xpath('//' + BasicCrab.ELEMENTS[1]).re(
-            r'\(+(\d{2})\W*(\d{4})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-        tels.append('-'.join(t244[:3]))
-        tels.append('-'.join(t244[3:3]))
-        tels.append('-'.join(t244[6:3]))
-        t334 = list()
-        t334 = response.xpath('//' + BasicCrab.ELEMENTS[2]).re(
-            r'\(+(\d{3})\W*(\d{3})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-        tels.append('-'.join(t334[:3]))
-        tels.append('-'.join(t334[3:3]))
-        tels.append('-'.join(t334[6:3]))
-        t224 = list()
-        t244 = response.xpath('//' + BasicCrab.ELEMENTS[2]).re(
-            r'\(+(\d{2})\W*(\d{4})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-        tels.append('-'.join(t244[:3]))
-        tels.append('-'.join(t244[3:3]))
-        tels.append('-'.join(t244[6:3]))
-        t334 = list()
-        t334 = response.xpath('//' + BasicCrab.ELEMENTS[3]).re(
-            r'\(+(\d{3})\W*(\d{3})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-        tels.append('-'.join(t334[:3]))
-        tels.append('-'.join(t334[3:3]))
-        tels.append('-'.join(t334[6:3]))
-        t224 = list()
-        t244 = response.xpath('//' + BasicCrab.ELEMENTS[3]).re(
-            r'\(+(\d{2})\W*(\d{4})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-        tels.append('-'.join(t244[:3]))
-        tels.append('-'.join(t244[3:3]))
-        tels.append('-'.join(t244[6:3]))
-        t334 = list()
-        t334 = response.xpath('//' + BasicCrab.ELEMENTS[4]).re(
-            r'\(+(\d{3})\W*(\d{3})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-        tels.append('-'.join(t334[:3]))
-        tels.append('-'.join(t334[3:3]))
-        tels.append('-'.join(t334[6:3]))
-        t224 = list()
-        t244 = response.xpath('//' + BasicCrab.ELEMENTS[4]).re(
-            r'\(+(\d{2})\W*(\d{4})\W*(\d{4})\W*(\d*)\W*[^png|jpg|gif]')
-        tels.append('-'.join(t244[:3]))
-        tels.append('-'.join(t244[3:3]))
-        tels.append('-'.join(t244[6:3]))
-        ## Social network detection TODO move it to function
         parsed_url = urlparse(response.url)
-        website_network = list(self.extract_social_networks(response,
-            parsed_url.netloc.split('.'), set({}),
-            ['facebook\.com','instagram\.com','twitter\.com']))
-
         website = WebsiteItem()
         website.set_score(self.score)
         website['spreadsheetId'] = self.spreadsheetId
         website['base_url'] = parsed_url.netloc
         website['secure_url'] = True if parsed_url.scheme == 'https' else False
         website['url'] = response.url
-        website['title'] = self.extract_title(response)
-        website['link'] = [link for link in response.xpath('//a/@href').extract()]
-        website['cart'] = self.shoppingcart_detection(
-            response.xpath('//div/@class').extract() + response.xpath('//a/@class').extract() + response.xpath('//i/@class').extract())
-        #self.online_payment(response.xpath('//div/@class').extract())
-        website['network'] = website_network
-        website['email'] = website_email
-        website['telephone'] = list(set(tels))
-        website['ecommerce'] = self.is_ecommerce(response)
-        website['description'] = self.extract_description(response)
-        website['keywords'] = self.extract_keywords(response)
-        website['offer'] = self.extract_offer(website)
+        website['start_url'] = response.meta.get('start_url', response.url)
         website['last_crawl'] = datetime.now()
+        if self.prescanner is None:
+            followups = self.extract_website(website, response)
+        elif self.prescanner.skip(response):
+            followups = self.skip_website(website, response)
+        else:
+            followups = self.prescanner.timed(self.extract_website, website,
+                    response)
+        yield website
 
-        return website
+        for score, url in followups:
+            yield scrapy.Request(url=url, callback=self.parse_followup,
+                    errback=self.followup_error,
+                    priority=BasicCrab.FOLLOWUP_PRIORITY + score,
+                    meta={'base_url': website['base_url'],
+                        'start_url': website['start_url']})
 
 
     def closed(self, reason):
-        response = gd.mv(self.source_urls, os.environ.get('DRIVE_DONE'))
-        # Send email with info about the results
-        sg = sendgrid.SendGridAPIClient(apikey=os.environ.get('SENDGRID_API_KEY'))
-        from_email = Email(os.environ.get('MAIL_FROM'))
-        to_email = Email(os.environ.get('MAIL_TO'))
-        subject = ("[lightfoot] terminó") #%s" % self.collection)
-        content = Content("text/plain", "https://docs.google.com/spreadsheets/d/%s"
-                % self.spreadsheetId)
-        mail = Mail(from_email, subject, to_email, content)
-        response = sg.client.mail.send.post(request_body=mail.get())
+        self.checkpoint(None, flush=True)
+        if getattr(self, 'prescanner', None) is not None:
+            for key, value in self.prescanner.summary().items():
+                self.crawler.stats.set_value('prescan/%s' % key, value)
+        if getattr(self, 'frontier', None) is not None:
+            self.crawler.stats.set_value('frontier/dropped',
+                    self.frontier.dropped)
+        # cron scheduler finalizes the upload after all shards are done,
+        # unfinished jobs are resumed in the next run
+        if not self.shard and reason == 'finished':
+            self.jobs.finish(self.job_id)
+            if self.finalize:
+                self.tasks.move(self.source_urls,
+                        os.environ.get('DRIVE_DONE'))
+                # Results are sent in one email when every spider is done
+                self.tasks.notify(self.spreadsheetId)
+        self.jobs.close()
+        self.tasks.release()
 
 
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Completion tasks run off the reactor when spiders close.
+
+Sheets writes run on a thread pool with retries, Drive moves are grouped in
+Drive batch requests and results are sent in a single summary email once
+every spider in the process is closed."""
+import os
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import sally.google.drive as gd
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 4
+RETRIES = 3
+BACKOFF = 2
+
+
+def retry(fn, *args, **kwargs):
+    """Call _fn_ with given arguments up to RETRIES times, waiting BACKOFF
+    to the power of attempts between failures.
+
+    Returns _fn_ result or None if every attempt failed"""
+    for attempt in range(RETRIES):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as ex:
+            logger.warning('%s failed (%d/%d): %s' % (fn.__name__,
+                attempt + 1, RETRIES, ex))
+            if attempt + 1 < RETRIES:
+                time.sleep(BACKOFF ** attempt)
+    logger.error('%s gave up after %d attempts' % (fn.__name__, RETRIES))
+    return None
+
+
+def send_summary(spreadsheet_ids):
+    """Send one email with the links to all results spreadsheets"""
+    import sendgrid
+    from sendgrid.helpers.mail import Email, Content, Mail
+    sg = sendgrid.SendGridAPIClient(apikey=os.environ.get('SENDGRID_API_KEY'))
+    from_email = Email(os.environ.get('MAIL_FROM'))
+    to_email = Email(os.environ.get('MAIL_TO'))
+    subject = "[lightfoot] terminó (%d)" % len(spreadsheet_ids)
+    content = Content("text/plain", '\n'.join(
+        "https://docs.google.com/spreadsheets/d/%s" % s
+        for s in spreadsheet_ids))
+    mail = Mail(from_email, subject, to_email, content)
+    return sg.client.mail.send.post(request_body=mail.get())
+
+
+class CompletionQueue(object):
+    """Side effects of closing spiders, shared by every spider in the
+    process. Spiders acquire() the queue when opened and release() it when
+    closed, the last release flushes grouped moves and the summary email."""
+
+    def __init__(self, workers=WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.moves = []
+        self.results = []
+        self.users = 0
+        self.flusher = None
+        # Pool workers hold results for the summary email of the parent
+        self.email = True
+        self.held = []
+
+
+    def submit(self, fn, *args, **kwargs):
+        """Run _fn_ on the thread pool with retries."""
+        future = self.executor.submit(retry, fn, *args, **kwargs)
+        with self.lock:
+            self.futures.append(future)
+        return future
+
+
+    def move(self, file_id, folder):
+        """Move Drive file to folder on next flush."""
+        with self.lock:
+            self.moves.append((file_id, folder))
+
+
+    def notify(self, spreadsheetId):
+        """Include results spreadsheet in the summary email."""
+        with self.lock:
+            if spreadsheetId not in self.results:
+                self.results.append(spreadsheetId)
+
+
+    def hold(self):
+        """Keep results spreadsheets in _held_ instead of emailing them."""
+        self.email = False
+
+
+    def acquire(self):
+        with self.lock:
+            self.users += 1
+
+
+    def release(self):
+        """Flush in background once the last spider is done."""
+        with self.lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+            self.flusher = threading.Thread(target=self.flush,
+                    name='sally-completion')
+        self.flusher.start()
+
+
+    def flush(self):
+        """Wait for pending tasks, then move files in Drive batches and send
+        the summary email."""
+        with self.lock:
+            futures, self.futures = self.futures, []
+        wait(futures)
+
+        with self.lock:
+            moves, self.moves = self.moves, []
+            results, self.results = self.results, []
+        while moves:
+            moved = retry(gd.mv_batch, moves)
+            if moved is None:
+                break
+            pending = [m for m in moves if m[0] not in moved]
+            if len(pending) == len(moves):
+                logger.error("Can't mv %d files" % len(pending))
+                break
+            moves = pending
+        if results and not self.email:
+            with self.lock:
+                self.held.extend(r for r in results if r not in self.held)
+        elif results:
+            retry(send_summary, results)
+
+
+    def join(self):
+        """Block until pending tasks and flushes are done."""
+        with self.lock:
+            flusher = self.flusher
+            futures = list(self.futures)
+        wait(futures)
+        if flusher is not None:
+            flusher.join()
+
+
+_queue = None
+
+
+def get_queue():
+    """Return the completion queue of this process."""
+    global _queue
+    if _queue is None:
+        _queue = CompletionQueue()
+    return _queue
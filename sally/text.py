@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Streaming text extraction of HTML pages.
+
+XPath queries like //div serialize whole subtrees, nested elements repeat
+the same text once per ancestor and deeply nested page builders multiply
+it. The body is decoded with the response charset and fed in chunks to an
+incremental lxml parser, every text node and relevant attribute comes out
+exactly once, in document order. Extractors of the spider query a Page
+built from that stream instead of the DOM."""
+import codecs
+import collections
+from urllib.parse import urljoin
+from lxml import etree
+
+# Bytes fed to the parser at once
+CHUNK = 64 * 1024
+
+# Attributes kept, others are dropped by the parser target
+ATTRIBUTES = frozenset(['href', 'src', 'content', 'name', 'class'])
+
+# Text of these elements is not page text
+SKIP = frozenset(['script', 'style', 'noscript', 'template'])
+
+# A text node or attribute. _tags_ are the names of the open elements, the
+# innermost last, _path_ their serial numbers. _attribute_ is None for text
+Node = collections.namedtuple('Node', 'tags path attribute value')
+
+
+class Target(object):
+    """lxml parser target collecting nodes, no tree is built."""
+
+    def __init__(self, attributes=ATTRIBUTES):
+        self.attributes = attributes
+        self.tags = ()
+        self.path = ()
+        self.serial = 0
+        self.buffer = []
+        self.nodes = []
+
+
+    def flush(self):
+        """Add text read since the last tag as a single node."""
+        if self.buffer:
+            text = ''.join(self.buffer)
+            self.buffer = []
+            if text.strip():
+                self.nodes.append(Node(self.tags, self.path, None, text))
+
+
+    def start(self, tag, attrib):
+        self.flush()
+        self.serial += 1
+        self.tags += (tag,)
+        self.path += (self.serial,)
+        for name, value in attrib.items():
+            if name in self.attributes and value:
+                self.nodes.append(Node(self.tags, self.path, name, value))
+
+
+    def end(self, tag):
+        self.flush()
+        # Elements closed implicitly end with their parent
+        if tag in self.tags:
+            depth = len(self.tags) - self.tags[::-1].index(tag) - 1
+            self.tags = self.tags[:depth]
+            self.path = self.path[:depth]
+
+
+    def data(self, data):
+        self.buffer.append(data)
+
+
+    def comment(self, text):
+        pass
+
+
+    def close(self):
+        self.flush()
+
+
+    def pop(self):
+        """Return and forget nodes collected so far."""
+        nodes, self.nodes = self.nodes, []
+        return nodes
+
+
+def decoder(encoding):
+    """Return incremental decoder of _encoding_, UTF-8 if it's unknown."""
+    try:
+        return codecs.getincrementaldecoder(encoding or 'utf-8')('replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')('replace')
+
+
+def stream(body, encoding='utf-8', chunk=CHUNK, attributes=ATTRIBUTES):
+    """Yield Node of every text node and attribute of HTML _body_ bytes."""
+    target = Target(attributes)
+    parser = etree.HTMLParser(target=target)
+    decode = decoder(encoding)
+    view = memoryview(body)
+    for start in range(0, len(view), chunk):
+        text = decode.decode(view[start:start + chunk])
+        if text:
+            parser.feed(text)
+        yield from target.pop()
+    text = decode.decode(b'', final=True)
+    if text:
+        parser.feed(text)
+    if view:
+        parser.close()
+    yield from target.pop()
+
+
+class Page(object):
+    """Text nodes and attributes of a page read in a single pass."""
+
+    def __init__(self, nodes, url=''):
+        self.nodes = list(nodes)
+        self.url = url
+        base = self.values('base', 'href')
+        self.base = urljoin(url, base[0]) if base else url
+
+
+    @classmethod
+    def from_response(cls, response, chunk=CHUNK):
+        return cls(stream(response.body, response.encoding, chunk),
+                response.url)
+
+
+    def texts(self, within=None, skip=SKIP):
+        """Return text nodes, only inside one of _within_ tags if given,
+        text of _skip_ tags is left out."""
+        return [n.value for n in self.nodes if n.attribute is None
+                and skip.isdisjoint(n.tags)
+                and (within is None or not within.isdisjoint(n.tags))]
+
+
+    def values(self, tag, attribute):
+        """Return values of _attribute_ of _tag_ elements, '*' is any."""
+        return [n.value for n in self.nodes if n.attribute == attribute
+                and (tag == '*' or n.tags[-1] == tag)]
+
+
+    def contents(self, within):
+        """Return text nodes and attributes inside _within_ tags."""
+        return [n.value for n in self.nodes if not within.isdisjoint(n.tags)]
+
+
+    def meta(self, name):
+        """Return content of <meta name="_name_"> tags."""
+        names = dict((n.path[-1], n.value.lower()) for n in self.nodes
+                if n.attribute == 'name' and n.tags[-1] == 'meta')
+        return [n.value for n in self.nodes if n.attribute == 'content'
+                and names.get(n.path[-1]) == name]
+
+
+    @property
+    def title(self):
+        """Return text of the <title> tag or None."""
+        for node in self.nodes:
+            if node.attribute is None and node.tags[-1] == 'title':
+                return ' '.join(node.value.split())
+        return None
+
+
+    def urljoin(self, url):
+        return urljoin(self.base, url)
+
+
+    def links(self):
+        """Return list of (absolute href, anchor text) of <a href> tags."""
+        links = []
+        anchors = {}
+        for node in self.nodes:
+            if node.attribute == 'href' and node.tags[-1] == 'a':
+                anchors[node.path[-1]] = len(links)
+                links.append((self.urljoin(node.value), []))
+            elif node.attribute is None and 'a' in node.tags:
+                # Text of the innermost enclosing anchor
+                for tag, serial in zip(node.tags[::-1], node.path[::-1]):
+                    if tag == 'a':
+                        if serial in anchors:
+                            links[anchors[serial]][1].append(node.value)
+                        break
+        return [(url, ' '.join(texts)) for url, texts in links]
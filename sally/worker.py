@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Long lived worker of the crawl job queue.
+
+Jobs are claimed from sally.jobqueue up to _slots_ at once. Scrapy, the
+spiders and the suffix list are loaded once by the worker: hermit jobs run
+in a thread of the worker and lightfoot jobs in a process of a pool forked
+by a fork server, a reactor can't be restarted, which has them imported.
+
+    python -m sally.worker [--slots N] [--interval SECONDS]
+"""
+import argparse
+import collections
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import sally.google.spreadsheet as gs
+import sally.scheduler as scheduler
+from sally import domains
+from sally.jobqueue import CRABS, JobQueue
+from sally.jobs import RUNNING, JobStore
+
+logger = logging.getLogger(__name__)
+
+# Jobs running at once
+SLOTS = 2
+
+# Seconds between claims and heartbeats of running jobs
+INTERVAL = 5
+
+# Seconds between looks for stale jobs of dead workers
+REQUEUE_EVERY = 60
+
+
+class Worker(object):
+
+    def __init__(self, queue=None, name=None, slots=SLOTS, interval=INTERVAL,
+            crabs=CRABS):
+        self.queue = queue if queue is not None else JobQueue()
+        self.name = name or '%s:%d' % (socket.gethostname(), os.getpid())
+        self.slots = slots
+        self.interval = interval
+        self.crabs = crabs
+        self.running = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.stats = collections.Counter()
+        self.started = time.time()
+        self.requeued = 0
+        self.pool = None
+
+
+    def lightfoot(self, job):
+        """Crawl _job_ source with lightfoot in a pool process, the
+        source spreadsheet isn't moved to DRIVE_DONE nor emailed, and the
+        results spreadsheet isn't moved to DRIVE_RESULTS.
+
+        Returns dict of results spreadsheet and crawler stats"""
+        options = job['options']
+        # Requeued jobs resume their own record, never one of a cron run
+        job_id = str(job['_id'])
+        store = JobStore()
+        record = store.get(job_id)
+        if options.get('spreadsheet'):
+            jobs = [{'csvfile': job['source'],
+                'spreadsheet': options['spreadsheet']}]
+        else:
+            unfinished = {}
+            if record and record['status'] == RUNNING:
+                unfinished[job['source']] = record
+            upload = {'id': job['source'],
+                    'name': options.get('name', job['source'])}
+            jobs = [kwargs for weight, kwargs
+                    in scheduler.plan([upload], 1, unfinished)]
+        for kwargs in jobs:
+            kwargs.update(finalize=False, job_id=job_id)
+        try:
+            result = self.pool.apply(scheduler.crawl, (jobs,))
+            # Where the spider wrote, a resumed record keeps its spreadsheet
+            record = store.get(job_id)
+            spreadsheetId = (record['spreadsheetId'] if record
+                    else jobs[0]['spreadsheet'])
+        finally:
+            store.close()
+        return {'spreadsheetId': spreadsheetId,
+                'elapsed': result['elapsed'], 'stats': result['stats']}
+
+
+    def hermit(self, job):
+        """Crawl _job_ source with hermit in this thread.
+
+        Returns dict of results spreadsheet and pipeline stats"""
+        from hermit.hermit_spider import HermitCrab
+        options = job['options']
+        spreadsheetId = options.get('spreadsheet') or gs.create_spreadsheet(
+                options.get('name', 'hermit %s' % job['source'])
+                )['spreadsheetId']
+        crab = HermitCrab(job['source'], spreadsheetId,
+                options.get('fb_user_id'))
+        return {'spreadsheetId': spreadsheetId, 'stats': crab.run()}
+
+
+    def execute(self, job):
+        logger.info('[%s] %s job %s of %s' % (self.name, job['crab'],
+            job['_id'], job['owner']))
+        try:
+            result = getattr(self, job['crab'])(job)
+            self.queue.done(job, result)
+            self.stats['finished'] += 1
+        except Exception as ex:
+            logger.error("Can't run job %s: %s" % (job['_id'], ex),
+                    exc_info=True)
+            self.queue.done(job, error=ex)
+            self.stats['failed'] += 1
+        finally:
+            with self.lock:
+                del self.running[job['_id']]
+
+
+    def claim(self):
+        """Start queued jobs while there are free slots.
+
+        Returns count of jobs started"""
+        started = 0
+        while len(self.running) < self.slots and not self.stopped.is_set():
+            job = self.queue.claim(self.name, self.crabs)
+            if job is None:
+                break
+            thread = threading.Thread(target=self.execute, args=(job,),
+                    name='job-%s' % job['_id'], daemon=True)
+            with self.lock:
+                self.running[job['_id']] = (job, thread)
+            thread.start()
+            self.stats['claimed'] += 1
+            started += 1
+        return started
+
+
+    def heartbeat(self):
+        """Keep running jobs from being requeued as stale."""
+        with self.lock:
+            running = [job for job, thread in self.running.values()]
+        for job in running:
+            self.queue.touch(job)
+
+
+    def requeue(self):
+        """Give jobs of dead workers back to the queue every
+        REQUEUE_EVERY seconds."""
+        if time.time() - self.requeued >= REQUEUE_EVERY:
+            self.requeued = time.time()
+            self.stats['requeued'] += self.queue.requeue_stale()
+
+
+    def run(self):
+        # Crawlers map the suffix list compiled once here
+        domains.get_table()
+        # A reactor can't be restarted, every lightfoot job gets a fresh
+        # process forked by a fork server, not from this threaded one
+        self.pool = scheduler.get_pool(self.slots)
+        try:
+            while not self.stopped.is_set():
+                try:
+                    self.heartbeat()
+                    self.requeue()
+                    self.claim()
+                except Exception as ex:
+                    logger.error("Can't claim jobs: %s" % ex, exc_info=True)
+                self.stopped.wait(self.interval)
+        finally:
+            self.join()
+
+
+    def join(self):
+        """Let running jobs finish."""
+        with self.lock:
+            threads = [thread for job, thread in self.running.values()]
+        for thread in threads:
+            thread.join()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        logger.info('[%s] %s in %.0fs' % (self.name, dict(self.stats),
+            time.time() - self.started))
+
+
+    def stop(self, *args):
+        self.stopped.set()
+
+
+def main(slots=SLOTS, interval=INTERVAL):
+    worker = Worker(slots=slots, interval=interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Run queued crawl jobs')
+    parser.add_argument('-s', '--slots', type=int,
+            default=int(os.environ.get('SALLY_WORKERS', SLOTS)),
+            help='jobs running at once, defaults to SALLY_WORKERS or 2')
+    parser.add_argument('-i', '--interval', type=float, default=INTERVAL,
+            help='seconds between claims of queued jobs')
+    args = parser.parse_args()
+    main(args.slots, args.interval)
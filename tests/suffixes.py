@@ -0,0 +1,30 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import sally.domains as domains
+
+# Offline public suffix list shared by the tests
+PSL = os.path.join(os.path.dirname(__file__), 'data',
+        'public_suffix_list.dat')
+
+
+class SuffixTestCase(unittest.TestCase):
+    """Reads the suffix list of tests/data, compiled in a scratch cache
+    directory at _directory_ and forgotten after every test."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patch = mock.patch.dict(os.environ, {'SALLY_CACHE_DIR':
+            self.directory, 'SALLY_SUFFIX_LIST': PSL})
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(self.reset)
+        self.reset()
+
+
+    def reset(self):
+        domains._table = None
+        domains.split.cache_clear()
@@ -0,0 +1,58 @@
+import unittest
+from sally.aggregate import SiteBuffer
+from sally.items import WebsiteItem
+
+
+def page(url, pages=None, **fields):
+    item = WebsiteItem(base_url='example.com', start_url='http://example.com',
+            url=url, **fields)
+    if pages is not None:
+        item['pages'] = pages
+    return item
+
+
+class SiteBufferTestCase(unittest.TestCase):
+
+    def test_merge_site(self):
+        buffer = SiteBuffer()
+        site = page('http://example.com', pages=3, email=['a@example.com'],
+                telephone=[], network=[], cart=[], ecommerce='N/E')
+        self.assertEqual(buffer.add(site), [])
+        self.assertEqual(buffer.add(page('http://example.com/contacto',
+            email=['a@example.com', 'b@example.com'],
+            telephone=['55-1234-5678'], ecommerce='shopify')), [])
+        released = buffer.add(page('http://example.com/tienda'))
+        self.assertEqual(len(released), 1)
+        self.assertIs(released[0], site)
+        self.assertEqual(site['email'], ['a@example.com', 'b@example.com'])
+        self.assertEqual(site['telephone'], ['55-1234-5678'])
+        self.assertEqual(site['ecommerce'], 'shopify')
+        self.assertEqual(len(buffer), 0)
+
+
+    def test_merge_cart(self):
+        site = page('http://example.com', pages=4, cart={'cart': 2})
+        site.merge(page('http://example.com/tienda', cart={'cart': 1,
+            'checkout': 1}))
+        # Failed or prescan skipped follow-up without fields
+        site.merge(page('http://example.com/contacto'))
+        site.merge(page('http://example.com/carrito', cart={'payment': 1}))
+        self.assertEqual(site['cart'], {'cart': 3, 'checkout': 1,
+            'payment': 1})
+
+
+    def test_evict_and_expire(self):
+        buffer = SiteBuffer(capacity=1, timeout=10)
+        first = page('http://example.com', pages=2, ecommerce='N/E')
+        self.assertEqual(buffer.add(first, now=100), [])
+        second = WebsiteItem(base_url='example.mx', url='http://example.mx',
+                pages=2, ecommerce='N/E')
+        self.assertEqual(buffer.add(second, now=105), [first])
+        self.assertEqual(buffer.expired(now=110), [])
+        self.assertEqual(buffer.expired(now=115), [second])
+        self.assertEqual(buffer.stats['evicted'], 1)
+        self.assertEqual(buffer.stats['expired'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
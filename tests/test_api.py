@@ -0,0 +1,47 @@
+import unittest
+from bson.objectid import ObjectId
+import sally.api as api
+
+
+class ApiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = {'_id': ObjectId('5a566b2f8c3b1a2d3c4e5f60'), 'score': 0.6}
+
+
+    def test_cursor(self):
+        cursor = api.encode_cursor(self.doc)
+        self.assertEqual(api.decode_cursor(cursor),
+                (self.doc['score'], self.doc['_id']))
+
+
+    def test_after(self):
+        query = api.after({'ecommerce': 'shopify'},
+                api.encode_cursor(self.doc))
+        self.assertEqual(query['$and'][0], {'ecommerce': 'shopify'})
+        self.assertEqual(query['$and'][1]['$or'][1],
+                {'score': 0.6, '_id': {'$gt': self.doc['_id']}})
+
+
+    def test_build_query(self):
+        query = api.build_query({'min_score': '0.5', 'base_url': 'a.mx'})
+        self.assertEqual(query, {'score': {'$gte': 0.5}, 'base_url': 'a.mx'})
+
+
+    def test_page_size(self):
+        self.assertEqual(api.page_size({}), api.settings.API_PAGE_SIZE)
+        self.assertEqual(api.page_size({'limit': '0'}), 1)
+        self.assertEqual(api.page_size({'limit': '-5'}), 1)
+        self.assertEqual(api.page_size({'limit': '999999'}),
+                api.settings.API_MAX_PAGE_SIZE)
+        with self.assertRaises(ValueError):
+            api.page_size({'limit': 'all'})
+
+
+    def test_bad_cursor(self):
+        with self.assertRaises((ValueError, TypeError)):
+            api.after({}, 'not a cursor')
+
+
+if __name__ == '__main__':
+    unittest.main()
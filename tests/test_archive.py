@@ -0,0 +1,70 @@
+import datetime
+import os
+import unittest
+import sally.archive as archive
+from suffixes import SuffixTestCase
+
+
+def item(base_url, day=1, score=0.5):
+    return {'base_url': base_url, 'url': 'https://%s/' % base_url,
+            'title': 'Tienda', 'score': score, 'ecommerce': 'shopify',
+            'cart': {'cart': 1}, 'secure_url': True,
+            'email': ['ventas@%s' % base_url], 'telephone': [],
+            'network': None, 'offer': ['ropa'],
+            'last_crawl': datetime.datetime(2018, 1, day, 12)}
+
+
+class Spider(object):
+
+    collection = '20180101_000000'
+    shard = '1/2'
+
+
+class ArchiveTestCase(SuffixTestCase):
+
+    def setUp(self):
+        super(ArchiveTestCase, self).setUp()
+        self.path = os.path.join(self.directory, 'archive')
+
+
+    def test_to_row(self):
+        row = archive.to_row(item('www.tienda.com.mx'), 'c')
+        self.assertEqual(row['tld'], 'mx')
+        self.assertIs(row['cart'], True)
+        self.assertEqual(row['network'], [])
+        self.assertEqual(row['collection'], 'c')
+        self.assertEqual(archive.tld('192.168.0.1'), 'none')
+        table = archive.to_table([row])
+        self.assertEqual(table.schema, archive.schema())
+        self.assertEqual(table.num_rows, 1)
+
+
+    def test_round_trip(self):
+        pipeline = archive.ArchivePipeline(self.path, batch=2)
+        pipeline.open_spider(Spider())
+        for i in (item('a.com.mx'), item('b.com'), item('c.mx', 2, 0.9)):
+            pipeline.process_item(i, Spider())
+        pipeline.close_spider(Spider())
+
+        files = archive.partitions(self.path)
+        self.assertEqual([f.split(os.sep)[-3:-1] for f in files],
+                [['date=2018-01-01', 'tld=com'], ['date=2018-01-01', 'tld=mx'],
+                    ['date=2018-01-02', 'tld=mx']])
+        self.assertTrue(os.path.basename(files[0]).startswith(
+            '20180101_000000_1_'))
+        self.assertEqual(len(archive.partitions(self.path, tlds=['mx'],
+            since=datetime.date(2018, 1, 2))), 1)
+        self.assertEqual(archive.partitions(self.path,
+            until=datetime.date(2017, 12, 31)), [])
+
+        table = archive.query(['base_url', 'score'], tlds=['mx'],
+                path=self.path)
+        self.assertEqual(table.column_names, ['base_url', 'score'])
+        self.assertEqual(sorted(table.to_pydict()['base_url']),
+                ['a.com.mx', 'c.mx'])
+        empty = archive.query(['email'], tlds=['ar'], path=self.path)
+        self.assertEqual(empty.num_rows, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
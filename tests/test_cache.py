@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from sally.cache import DiskCache, MemoryCache
+
+
+class DiskCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.env = os.environ.get('SALLY_CACHE_DIR')
+        os.environ['SALLY_CACHE_DIR'] = self.directory
+
+
+    def tearDown(self):
+        if self.env is None:
+            del os.environ['SALLY_CACHE_DIR']
+        else:
+            os.environ['SALLY_CACHE_DIR'] = self.env
+        shutil.rmtree(self.directory)
+
+
+    def test_get_set(self):
+        cache = DiskCache('test')
+        cache.set('example.com', ['93.184.216.34'])
+        self.assertEqual(cache.get('example.com'), ['93.184.216.34'])
+        self.assertIsNone(cache.get('example.mx'))
+        # Shared with other processes through the file
+        self.assertEqual(DiskCache('test').get('example.com'),
+                ['93.184.216.34'])
+        self.assertEqual(cache.stats['hit'], 1)
+        self.assertEqual(cache.stats['miss'], 1)
+
+
+    def test_expire_and_prune(self):
+        cache = DiskCache('test', ttl=60, size=2)
+        for i in range(3):
+            cache.set('host%d' % i, i)
+            time.sleep(0.01)
+        cache.ttl = 0
+        self.assertIsNone(cache.get('host2'))
+        cache.ttl = 60
+        cache.prune()
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('host0'))
+
+
+class MemoryCacheTestCase(unittest.TestCase):
+
+    def test_expire_and_evict(self):
+        cache = MemoryCache(ttl=60, size=2)
+        cache.set('host0', 0)
+        cache.set('host1', 1)
+        # Used last, host1 is the least recently used one now
+        self.assertEqual(cache.get('host0'), 0)
+        cache.set('host2', 2)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('host1'))
+        cache.ttl = 0
+        time.sleep(0.01)
+        self.assertIsNone(cache.get('host0'))
+        self.assertEqual(len(cache), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
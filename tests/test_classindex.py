@@ -0,0 +1,23 @@
+import unittest
+from sally.classindex import ClassIndex, tokens
+
+
+class ClassIndexTestCase(unittest.TestCase):
+
+    def test_tokens(self):
+        self.assertEqual(sorted(tokens('Woo-Mini_cart  btn')),
+                ['btn', 'cart', 'mini', 'woo', 'woo-mini_cart'])
+
+
+    def test_signals(self):
+        index = ClassIndex(['header-cart icon', 'cart-count',
+            'btn paypal-button', 'checkout', 'cartoon'])
+        self.assertEqual(index.count('cart'), 2)
+        self.assertIn('cartoon', index)
+        self.assertEqual(index.signals(), {'cart': 2, 'checkout': 1,
+            'payment': 1})
+        self.assertEqual(ClassIndex(['nav', 'footer']).signals(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
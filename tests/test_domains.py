@@ -0,0 +1,49 @@
+import os
+import unittest
+import sally.domains as domains
+from suffixes import PSL, SuffixTestCase
+
+
+class DomainsTestCase(SuffixTestCase):
+
+    def test_table(self):
+        table = domains.load(PSL)
+        self.assertEqual(len(table), 6)
+        self.assertIn('com.mx', table)
+        self.assertIn('!www.ck', table)
+        self.assertIn('blogspot.com', table)
+        self.assertNotIn('org', table)
+
+
+    def test_registrable_domain(self):
+        self.assertEqual(domains.registrable_domain(
+            'http://www.Example.com.mx:8080/contacto'), 'example.com.mx')
+        # Private section rules count, as in the tldextract snapshot
+        self.assertEqual(domains.registrable_domain('www.a.blogspot.com'),
+                'a.blogspot.com')
+        self.assertEqual(domains.registrable_domain('a.b.foo.ck'), 'b.foo.ck')
+        self.assertEqual(domains.registrable_domain('www.ck'), 'www.ck')
+        self.assertIsNone(domains.registrable_domain('com.mx'))
+        self.assertIsNone(domains.registrable_domain('example.org'))
+        self.assertIsNone(domains.registrable_domain(None))
+
+
+    def test_public_suffix(self):
+        self.assertEqual(domains.public_suffix('www.example.com.mx'), 'com.mx')
+        self.assertEqual(domains.public_suffix('x.foo.ck'), 'foo.ck')
+        self.assertIsNone(domains.public_suffix('192.168.0.1'))
+
+
+    def test_snapshot(self):
+        snapshot = os.path.join(self.directory, '.tld_set_snapshot')
+        with open(snapshot, 'w') as f:
+            f.write('["com", "mx", "com.mx", "*.ck", "!www.ck", '
+                    '"blogspot.com"]')
+        table = domains.load(snapshot)
+        expected = domains.load(PSL)
+        self.assertEqual([table.record(i) for i in range(len(table))],
+                [expected.record(i) for i in range(len(expected))])
+
+
+if __name__ == '__main__':
+    unittest.main()
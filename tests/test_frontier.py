@@ -0,0 +1,46 @@
+import unittest
+import sally.frontier as frontier
+
+
+class FrontierTestCase(unittest.TestCase):
+
+    def test_score_link(self):
+        self.assertEqual(frontier.score_link('http://a.mx/contacto'), 10)
+        self.assertEqual(frontier.score_link('http://a.mx/p?id=1', 'Tienda'),
+                4)
+        self.assertEqual(frontier.score_link('http://a.mx/blog'), 0)
+
+
+    def test_candidates(self):
+        links = [
+                ('http://www.a.mx/contacto#form', 'Contáctanos'),
+                ('http://www.a.mx/contacto', ''),
+                ('http://b.mx/contacto', 'Contacto'),
+                ('mailto:ventas@a.mx', 'Contacto'),
+                ('http://a.mx/blog', 'Blog'),
+                ]
+        self.assertEqual(frontier.candidates(links, 'a.mx'),
+                [(15, 'http://www.a.mx/contacto')])
+
+
+    def test_best(self):
+        self.assertEqual(frontier.best([(1, 'x'), (5, 'y'), (3, 'z')], 2),
+                [(5, 'y'), (3, 'z')])
+        self.assertEqual(frontier.best([], 2), [])
+
+
+    def test_frontier(self):
+        f = frontier.Frontier(per_site=2, capacity=3)
+        self.assertEqual(f.push([(1, 'x'), (5, 'y'), (3, 'z')]),
+                [(5, 'y'), (3, 'z')])
+        self.assertEqual(f.push([(2, 'u'), (4, 'v')]), [(4, 'v')])
+        self.assertEqual(f.dropped, 1)
+        self.assertEqual(f.push([(1, 'w')]), [])
+        # A fetched follow-up makes room for the next site
+        f.done()
+        self.assertEqual(f.push([(1, 'w')]), [(1, 'w')])
+        self.assertEqual(len(f), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
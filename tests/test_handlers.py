@@ -0,0 +1,111 @@
+import collections
+import unittest
+from unittest import mock
+import scrapy
+from scrapy.http import Request
+from scrapy.settings import Settings
+from twisted.internet import defer
+from twisted.internet.error import ConnectionRefusedError, TimeoutError
+from twisted.python.failure import Failure
+from sally.handlers import CountingHTTPDownloadHandler
+from sally.spiders.lightfoot_spider import BasicCrab
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.values = collections.Counter()
+
+    def get_value(self, key, default=None):
+        return self.values.get(key, default)
+
+    def inc_value(self, key, count=1):
+        self.values[key] += count
+
+
+class Endpoint(object):
+
+    def connect(self, factory):
+        return defer.Deferred()
+
+
+def failure(request, error):
+    try:
+        raise error
+    except Exception:
+        failed = Failure()
+    failed.request = request
+    return failed
+
+
+class ProbeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.spider = BasicCrab.__new__(BasicCrab)
+        self.spider.crawler = mock.Mock(stats=Stats())
+        self.spider.settings = Settings({'HTTPS_PROBE_TIMEOUT': 3,
+            'HTTPS_PROBE_SAMPLE': 4, 'HTTPS_PROBE_MAX_TIMEOUTS': 0.5})
+        self.stats = self.spider.crawler.stats.values
+
+
+    def test_probe(self):
+        request = self.spider.probe('http://tienda.mx', 5)
+        self.assertEqual(request.url, 'https://tienda.mx')
+        self.assertEqual(request.priority, 5)
+        self.assertEqual(request.meta['download_timeout'], 3)
+        self.assertEqual(request.errback, self.spider.probe_error)
+        request = self.spider.probe('https://tienda.mx')
+        self.assertEqual(request.errback, self.spider.parse_error)
+        self.assertEqual(self.stats['probe/https'], 1)
+
+
+    def test_probe_error(self):
+        probe = self.spider.probe('http://tienda.mx', 5)
+        request = self.spider.probe_error(failure(probe,
+            ConnectionRefusedError()))
+        self.assertEqual(request.url, 'http://tienda.mx')
+        self.assertEqual(request.priority, 5)
+        self.assertNotIn('download_timeout', request.meta)
+        self.spider.probe_error(failure(probe, TimeoutError()))
+        self.assertEqual(self.stats['probe/http_fallback'], 2)
+        self.assertEqual(self.stats['probe/timeout'], 1)
+
+
+    def test_give_up(self):
+        for i in range(4):
+            probe = self.spider.probe('http://%d.mx' % i)
+            if i % 2:
+                self.spider.probe_error(failure(probe, TimeoutError()))
+        # Half of the sample timed out
+        self.assertEqual(self.spider.probe('http://a.mx').url, 'http://a.mx')
+        self.assertEqual(self.stats['probe/https'], 4)
+
+
+@unittest.skipUnless(scrapy.version_info[:2] == (1, 4),
+        'download handlers are built from settings in the pinned scrapy 1.4')
+class HandlerTestCase(unittest.TestCase):
+
+    def test_connections(self):
+        crawler = mock.Mock(settings=Settings(), stats=Stats())
+        handler = CountingHTTPDownloadHandler.from_crawler(crawler)
+        handler._pool._newConnection(('https', b'a.mx', 443), Endpoint())
+        handler._pool._newConnection(('https', b'b.mx', 443), Endpoint())
+        self.assertEqual(crawler.stats.values['connections/opened'], 2)
+
+
+    def test_requests(self):
+        handler = CountingHTTPDownloadHandler(Settings())
+        spider = mock.Mock()
+        spider.crawler.stats = Stats()
+        with mock.patch('scrapy.core.downloader.handlers.http11.'
+                'HTTP11DownloadHandler.download_request') as download:
+            handler.download_request(Request('http://a.mx'), spider)
+            handler.download_request(Request('http://a.mx/b'), spider)
+        self.assertEqual(download.call_count, 2)
+        self.assertEqual(spider.crawler.stats.values['connections/requests'],
+                2)
+        self.assertIs(handler._pool.stats, spider.crawler.stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
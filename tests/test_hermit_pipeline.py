@@ -0,0 +1,28 @@
+import unittest
+from hermit.pipeline import Pipeline, Stage
+
+
+class PipelineTestCase(unittest.TestCase):
+
+    def test_run(self):
+        out = []
+        pipeline = Pipeline(
+                Stage('double', lambda i: i * 2, workers=4, size=2),
+                Stage('odd', lambda i: None if i % 4 else i),
+                Stage('collect', out.append))
+        stats = pipeline.run(range(100))
+        self.assertEqual(sorted(out), list(range(0, 200, 4)))
+        self.assertEqual(stats['source']['out'], 100)
+        self.assertEqual(stats['double']['out'], 100)
+        self.assertEqual(stats['odd']['out'], 50)
+
+
+    def test_errors(self):
+        pipeline = Pipeline(Stage('fail', lambda i: 1 / i, workers=2))
+        stats = pipeline.run([0, 1, 2])
+        self.assertEqual(stats['fail']['errors'], 1)
+        self.assertEqual(stats['fail']['out'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
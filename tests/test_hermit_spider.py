@@ -0,0 +1,83 @@
+import threading
+import unittest
+from unittest import mock
+from hermit.hermit_spider import HermitCrab
+
+GRAPH = 'https://graph.facebook.com'
+
+
+class StubTokens(object):
+    """Token pool answering Graph search pages by their paging cursor."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        category = url.split('q=')[1].split('&')[0]
+        cursor = url.split('after=')[1] if 'after=' in url else '0'
+        return self.pages[category][int(cursor)]
+
+
+def page(category, cursor, ids, last=False):
+    response = {'data': [{'id': i, 'category': category, 'phone': '55'}
+        for i in ids]}
+    if not last:
+        response['paging'] = {'next': '%s/search?q=%s&after=%d' % (GRAPH,
+            category, cursor + 1)}
+    return response
+
+
+class HermitCrabTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tokens = StubTokens({
+            'shoes': [page('shoes', 0, ['1', '2']),
+                page('shoes', 1, ['3', '4'], last=True)],
+            'bags': [page('bags', 0, ['2', '5']),
+                {'error': {'message': 'Rate limited'}}]
+            })
+        self.crab = HermitCrab.__new__(HermitCrab)
+        self.crab.graph = GRAPH
+        self.crab.tokens = self.tokens
+        self.crab.workers = 2
+        self.crab.score = {'email': 0.2, 'telephone': 0.2, 'likes': 0.1}
+        self.crab.seen = set(['4'])
+        self.crab.rows = []
+        self.crab.categories = []
+        self.crab.lock = threading.Lock()
+        self.crab.leads = mock.Mock()
+        self.crab.persist = mock.Mock()
+        patch = mock.patch('sally.leads.from_fbpage')
+        patch.start()
+        self.addCleanup(patch.stop)
+
+
+    def test_search_alike(self):
+        self.assertEqual([p['id'] for p in self.crab.search_alike('shoes')],
+                ['1', '2', '3', '4'])
+        self.assertEqual(len(self.tokens.urls), 2)
+        self.assertIn('limit=%d' % HermitCrab.PAGE_SIZE, self.tokens.urls[0])
+        # Errors end the search with the pages found so far
+        self.assertEqual([p['id'] for p in self.crab.search_alike('bags')],
+                ['2', '5'])
+
+
+    def test_expand(self):
+        ids = [p['id'] for p in self.crab.expand(['shoes', 'bags'])]
+        # Pages already crawled or found in other categories are skipped
+        self.assertEqual(ids, ['1', '2', '3', '5'])
+
+
+    def test_alike_pipeline(self):
+        pipeline = self.crab.stages(fetch=False)
+        stats = pipeline.run(self.crab.expand(['shoes', 'bags']))
+        self.assertEqual(stats['export']['out'], 4)
+        self.assertEqual(len(self.crab.rows), 4)
+        self.assertEqual(self.crab.persist.call_count, 4)
+        self.assertEqual(self.crab.leads.add.call_count, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from sally.intake import Intake
+
+FOLDER = 'uploads'
+
+
+class Call(object):
+
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class StubDrive(object):
+    """Drive v3 service with paged files and changes listings."""
+
+    def __init__(self, files, changes, token='1'):
+        self.files_ = files
+        self.changes_ = changes
+        self.token = token
+
+    def files(self):
+        return self
+
+    def changes(self):
+        return self
+
+    def getStartPageToken(self):
+        return Call({'startPageToken': self.token})
+
+    def list(self, pageToken=None, **kwargs):
+        if 'q' in kwargs:
+            # Files listing, one file per page
+            i = int(pageToken or 0)
+            result = {'files': self.files_[i:i + 1]}
+            if i + 1 < len(self.files_):
+                result['nextPageToken'] = str(i + 1)
+            return Call(result)
+        # Changes feed, one change per page from the token on
+        i = int(pageToken)
+        if i >= len(self.changes_):
+            return Call({'changes': [], 'newStartPageToken': str(i)})
+        result = {'changes': [self.changes_[i]]}
+        if i + 1 < len(self.changes_):
+            result['nextPageToken'] = str(i + 1)
+        else:
+            result['newStartPageToken'] = str(i + 1)
+        return Call(result)
+
+
+class StubJobs(object):
+
+    def __init__(self, finished=()):
+        self.finished = finished
+
+    def get(self, upload_id):
+        if upload_id in self.finished:
+            return {'_id': upload_id, 'status': 'finished'}
+        return None
+
+
+def upload(id_, parents=(FOLDER,), **kwargs):
+    return dict({'id': id_, 'name': '%s.csv' % id_, 'mimeType': 'text/csv',
+        'parents': list(parents)}, **kwargs)
+
+
+class IntakeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'intake.json')
+        self.dispatched = []
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def intake(self, service, finished=()):
+        patcher = mock.patch('sally.google.authorize.get_service',
+                return_value=service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return Intake(FOLDER, self.dispatched.append, path=self.path,
+                jobs=StubJobs(finished))
+
+
+    def test_start_lists_every_page(self):
+        service = StubDrive([upload('a'), upload('b'), upload('c')], [])
+        intake = self.intake(service)
+        intake.start()
+        self.assertEqual([u['id'] for u in self.dispatched[0]],
+                ['a', 'b', 'c'])
+        self.assertEqual(intake.load(), '1')
+
+
+    def test_poll_changes(self):
+        changes = [
+                {'fileId': 'a', 'file': upload('a')},
+                {'fileId': 'x', 'file': upload('x', parents=['done'])},
+                {'fileId': 'b', 'removed': True},
+                {'fileId': 'c', 'file': upload('c', trashed=True)},
+                {'fileId': 'a', 'file': upload('a')},
+                {'fileId': 'd', 'file': upload('d')},
+                ]
+        service = StubDrive([], changes, token='0')
+        intake = self.intake(service)
+        intake.start()
+        self.assertEqual([u['id'] for u in intake.poll()], ['a', 'd'])
+        self.assertEqual(intake.load(), '6')
+        # Nothing new, nothing sent, token saved for the next start
+        self.assertEqual(intake.poll(), [])
+        self.assertEqual(Intake(FOLDER, None, path=self.path).load(), '6')
+
+
+    def test_restart_lists_unfinished(self):
+        service = StubDrive([upload('a')], [{'fileId': 'b',
+            'file': upload('b')}], token='0')
+        intake = self.intake(service)
+        intake.start()
+        intake.poll()
+        self.assertEqual(intake.load(), '1')
+        # Stopped before crawling b, it is still in the folder
+        service.files_ = [upload('a'), upload('b')]
+        self.dispatched[:] = []
+        restarted = Intake(FOLDER, self.dispatched.append, path=self.path,
+                jobs=StubJobs(['a']))
+        restarted.start()
+        self.assertEqual([u['id'] for u in self.dispatched[0]], ['b'])
+        self.assertEqual(restarted.page_token, '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
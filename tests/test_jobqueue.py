@@ -0,0 +1,99 @@
+import datetime
+import unittest
+import mongomock
+import sally.jobqueue as jobqueue
+
+
+class JobQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = jobqueue.JobQueue(mongomock.MongoClient().db)
+
+
+    def test_new_job(self):
+        job = jobqueue.new_job('sheet', 'hermit', '5', None,
+                {'fb_user_id': '1'})
+        self.assertEqual(job['status'], jobqueue.QUEUED)
+        self.assertEqual(job['priority'], 5)
+        self.assertEqual(job['owner'], 'default')
+        self.assertEqual(job['options'], {'fb_user_id': '1'})
+        with self.assertRaises(ValueError):
+            jobqueue.new_job('sheet', 'quotes')
+        with self.assertRaises(ValueError):
+            jobqueue.new_job('', 'lightfoot')
+
+
+    def test_busy(self):
+        running = {'acme': 2, 'globex': 1, 'initech': 3}
+        self.assertEqual(jobqueue.busy(running, {'initech': 5}),
+                ['acme'])
+        self.assertEqual(jobqueue.busy(running, {}, default=1),
+                ['acme', 'globex', 'initech'])
+
+
+    def test_reserve(self):
+        self.assertTrue(self.queue.reserve('acme'))
+        self.assertTrue(self.queue.reserve('acme'))
+        self.assertFalse(self.queue.reserve('acme'))
+        self.queue.tenants.update_one({'_id': 'globex'},
+                {'$set': {'limit': 1, 'running': 0}}, upsert=True)
+        self.assertTrue(self.queue.reserve('globex'))
+        self.assertFalse(self.queue.reserve('globex'))
+        self.queue.free('globex')
+        self.assertEqual(self.queue.running(), {'acme': 2})
+
+
+    def test_claim(self):
+        self.queue.submit('old', 'lightfoot', owner='acme')
+        self.queue.submit('best', 'lightfoot', 5, owner='acme')
+        self.queue.submit('hermit', 'hermit', 9, owner='globex')
+        self.queue.submit('last', 'lightfoot', owner='acme')
+        first = self.queue.claim('w1', ['lightfoot'])
+        self.assertEqual(first['source'], 'best')
+        self.assertEqual(first['status'], jobqueue.RUNNING)
+        self.assertEqual(first['worker'], 'w1')
+        self.assertEqual(self.queue.claim('w1', ['lightfoot'])['source'],
+                'old')
+        # acme is at its limit
+        self.assertIsNone(self.queue.claim('w2', ['lightfoot']))
+        self.assertEqual(self.queue.claim('w2')['source'], 'hermit')
+        self.assertEqual(self.queue.running(), {'acme': 2, 'globex': 1})
+
+
+    def test_done(self):
+        self.queue.submit('sheet', 'lightfoot', owner='acme')
+        job = self.queue.claim('w1')
+        self.assertTrue(self.queue.touch(job, progress=1))
+        self.queue.done(job, {'spreadsheetId': 'out'})
+        job = self.queue.get(job['_id'])
+        self.assertEqual(job['status'], jobqueue.FINISHED)
+        self.assertEqual(job['result'], {'spreadsheetId': 'out'})
+        self.assertEqual(self.queue.running(), {})
+        # Done twice doesn't free the slot twice
+        self.queue.reserve('acme')
+        self.queue.done(job)
+        self.assertEqual(self.queue.running(), {'acme': 1})
+
+
+    def test_requeue_stale(self):
+        self.queue.submit('sheet', 'lightfoot', owner='acme')
+        slow = self.queue.claim('w1')
+        self.assertEqual(self.queue.requeue_stale(), 0)
+        self.queue.queue.update_one({'_id': slow['_id']}, {'$set': {
+            'updated': datetime.datetime.now() - datetime.timedelta(
+                seconds=jobqueue.STALE + 1)}})
+        self.assertEqual(self.queue.requeue_stale(), 1)
+        self.assertEqual(self.queue.running(), {})
+        job = self.queue.claim('w2')
+        self.assertEqual(job['attempts'], 2)
+        # The slow worker can't touch or finish the job claimed again
+        self.assertFalse(self.queue.touch(slow))
+        self.queue.done(slow, error=Exception('late'))
+        job = self.queue.get(job['_id'])
+        self.assertEqual(job['status'], jobqueue.RUNNING)
+        self.assertEqual(job['worker'], 'w2')
+        self.assertEqual(self.queue.running(), {'acme': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
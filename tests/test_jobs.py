@@ -0,0 +1,39 @@
+import unittest
+import mongomock
+from sally.jobs import JobStore, RUNNING, FINISHED
+
+
+class JobStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.store = JobStore(mongomock.MongoClient().db)
+
+
+    def test_resume(self):
+        job = self.store.start('upload', 'sheet', '20180101_000000')
+        self.assertEqual(job['status'], RUNNING)
+        self.store.processed('upload', ['http://a.mx', 'http://b.mx'])
+        self.store.processed('upload', ['http://a.mx'])
+        # Unfinished jobs keep their spreadsheet, collection and URLs
+        job = self.store.start('upload', 'other', '20180102_000000')
+        self.assertEqual(job['spreadsheetId'], 'sheet')
+        self.assertEqual(job['collection'], '20180101_000000')
+        self.assertEqual(job['processed'], ['http://a.mx', 'http://b.mx'])
+        self.assertEqual(list(self.store.unfinished()), ['upload'])
+
+
+    def test_finish(self):
+        self.store.start('upload', 'sheet', '20180101_000000')
+        self.store.processed('upload', ['http://a.mx'])
+        self.store.finish('upload')
+        self.assertEqual(self.store.get('upload')['status'], FINISHED)
+        self.assertEqual(self.store.unfinished(), {})
+        # A finished upload starts over
+        job = self.store.start('upload', 'other', '20180102_000000')
+        self.assertEqual(job['spreadsheetId'], 'other')
+        self.assertEqual(job['processed'], [])
+        self.assertIsNone(self.store.processed('upload', []))
+
+
+if __name__ == '__main__':
+    unittest.main()
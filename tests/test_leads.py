@@ -0,0 +1,58 @@
+import datetime
+import unittest
+import mongomock
+import sally.leads as leads
+from suffixes import SuffixTestCase
+
+
+class LeadsTestCase(SuffixTestCase):
+
+    def test_registrable_domain(self):
+        self.assertEqual(leads.registrable_domain('www.example.com.mx'),
+                'example.com.mx')
+        self.assertEqual(leads.registrable_domain(
+            'http://tienda.Example.com/contacto'), 'example.com')
+
+
+    def test_normalize(self):
+        self.assertEqual(leads.normalize_email(' MAILTO:Ventas@Example.com '),
+                'ventas@example.com')
+        self.assertEqual(leads.normalize_phone('+52 (55) 1234-5678'),
+                '5512345678')
+        self.assertIsNone(leads.normalize_phone('1234'))
+
+
+    def test_merge(self):
+        store = leads.LeadStore(mongomock.MongoClient().db, batch=2)
+        before = datetime.datetime(2018, 1, 1)
+        after = datetime.datetime(2018, 2, 1)
+        store.add(leads.from_website({'base_url': 'www.example.com',
+            'score': 0.4, 'last_crawl': after, 'email': ['A@example.com'],
+            'telephone': [], 'network': None, 'ecommerce': 'shopify'}))
+        store.add(leads.from_website({'base_url': 'tienda.example.com',
+            'score': 0.2, 'last_crawl': before, 'email': ['b@example.com'],
+            'telephone': ['(55) 1234-5678'], 'network': [],
+            'ecommerce': 'N/E'}))
+        store.add(leads.from_fbpage({'website': 'http://example.com',
+            'phone': '55 1234 5678'}, 0.1))
+        store.add({'domain': None})
+        store.flush()
+
+        lead, = store.find(domain='http://www.example.com/contacto')
+        self.assertEqual(lead['score'], 0.4)
+        # The Facebook page was crawled last, now
+        self.assertGreater(lead['last_crawl'], after)
+        self.assertEqual(lead['emails'], ['a@example.com', 'b@example.com'])
+        self.assertEqual(lead['phones'], ['5512345678'])
+        self.assertEqual(lead['ecommerce'], ['shopify'])
+        # One source for each kind of crawl, not for each collection
+        self.assertEqual(sorted(lead['sources']), ['facebook', 'website'])
+        self.assertEqual(store.find(phone='+52 55 1234 5678'), [lead])
+        self.assertEqual(store.find(email='B@example.com'), [lead])
+        self.assertEqual(store.known(['example.com', 'other.com']),
+                {'example.com': {'_id': 'example.com', 'score': 0.4,
+                    'ecommerce': ['shopify']}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import unittest
+from sally.offers import Automaton, OfferClassifier, offer
+
+
+class OffersTestCase(unittest.TestCase):
+
+    def test_automaton(self):
+        automaton = Automaton(['he', 'she', 'his', 'hers'])
+        self.assertEqual(sorted(automaton.search('ushers')),
+                [(1, 'she'), (2, 'he'), (2, 'hers')])
+
+
+    def test_classify(self):
+        classifier = OfferClassifier(allowed=['Ropa', 'zapatos'],
+                disallowed=['armas'], products=['instrumentos musicales',
+                    'electrónica'])
+        matches = classifier.classify('Ropa y ZAPATOS',
+                'Instrumentos  musicales, Electronica y ropa',
+                'Tienda de ropa, zapatosdeportivos, sin armas')
+        self.assertEqual(matches['allowed'], {'Ropa': 3, 'zapatos': 1})
+        self.assertEqual(matches['products'], {'instrumentos musicales': 1,
+            'electrónica': 1})
+        self.assertEqual(matches['disallowed'], {'armas': 1})
+        self.assertEqual(offer(matches)[0], 'Ropa')
+        self.assertEqual(len(offer(matches)), 4)
+
+
+    def test_multi_word(self):
+        classifier = OfferClassifier(products=['sex shop'])
+        self.assertEqual(classifier.classify('Sex Shop en CDMX'),
+                {'products': {'sex shop': 1}})
+        self.assertEqual(classifier.classify('unisex shopping'), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
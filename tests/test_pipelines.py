@@ -0,0 +1,71 @@
+import unittest
+from unittest import mock
+import mongomock
+from sally.pipelines import LightfootPipeline
+
+
+class Item(dict):
+
+    def qualify(self):
+        return self
+
+
+def item(url, score=1):
+    return Item(start_url=url, base_url=url, score=score, offer=[],
+            keywords=[], telephone=[], email=[], ecommerce='N/E', cart={},
+            network=[], spreadsheetId='sheet')
+
+
+class Spider(object):
+    """Resumed lightfoot spider, without job record unless checkpoint."""
+
+    collection = '20180101_000000'
+    sheet = collection
+    spreadsheetId = 'sheet'
+    resumed = True
+    urls = ['http://a.mx', 'http://b.mx']
+
+
+class PipelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mongomock.MongoClient()
+        patches = [
+                mock.patch('pymongo.MongoClient', return_value=self.client),
+                mock.patch('sally.leads.LeadStore'),
+                mock.patch('sally.leads.from_website'),
+                mock.patch('sally.tasks.get_queue')
+                ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.pipeline = LightfootPipeline('mongodb://localhost', 'sally')
+
+
+    def test_resume(self):
+        spider = Spider()
+        # Crawled before the interruption, after the last checkpoint
+        self.client.sally[spider.collection].insert_one(item('http://a.mx'))
+        self.pipeline.open_spider(spider)
+        self.pipeline.process_item(item('http://a.mx', 2), spider)
+        self.pipeline.process_item(item('http://b.mx'), spider)
+        self.pipeline.close_spider(spider)
+        rows = self.pipeline.sheet_rows[1:]
+        self.assertEqual(sorted((r[1], r[0]) for r in rows),
+                [('http://a.mx', 2), ('http://b.mx', 1)])
+
+
+    def test_checkpoint(self):
+        spider = Spider()
+        spider.checkpoint = mock.Mock()
+        self.pipeline.open_spider(spider)
+        self.pipeline.process_item(item('http://a.mx'), spider)
+        spider.checkpoint.assert_called_once_with('http://a.mx')
+        # Spiders without job record go through as well
+        self.pipeline.process_item(item('http://b.mx'), Spider())
+        self.assertEqual(self.client.sally[spider.collection]
+                .count_documents({}), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
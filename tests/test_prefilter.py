@@ -0,0 +1,73 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import sally.prefilter as prefilter
+
+
+def resolve(host):
+    if host == 'dead.mx':
+        raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+    return '10.0.0.1'
+
+
+class PrefilterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.env = os.environ.get('SALLY_CACHE_DIR')
+        os.environ['SALLY_CACHE_DIR'] = self.directory
+
+
+    def tearDown(self):
+        if self.env is None:
+            del os.environ['SALLY_CACHE_DIR']
+        else:
+            os.environ['SALLY_CACHE_DIR'] = self.env
+        shutil.rmtree(self.directory)
+
+
+    @mock.patch('sally.prefilter.resolve', side_effect=resolve)
+    def test_filter(self, lookup):
+        urls = ['http://live.mx', 'http://dead.mx', 'http://dead.mx/x']
+        first = prefilter.Prefilter()
+        self.assertEqual(first.filter(urls), ['http://live.mx'])
+        self.assertEqual(first.stats['dropped'], 2)
+        self.assertEqual(first.dns.get('live.mx'), '10.0.0.1')
+
+        # Dead hosts are skipped from the negative cache
+        lookup.reset_mock()
+        second = prefilter.Prefilter()
+        self.assertEqual(second.filter(urls), ['http://live.mx'])
+        self.assertEqual(second.stats['cached'], 1)
+        lookup.assert_called_once_with('live.mx')
+
+
+    def test_deadline(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(host):
+            started.set()
+            release.wait(5)
+            return '10.0.0.1'
+
+        self.addCleanup(release.set)
+        with mock.patch('sally.prefilter.resolve', side_effect=slow) as lookup:
+            f = prefilter.Prefilter(workers=1, deadline=0.1)
+            urls = ['http://a.mx', 'http://b.mx', 'http://c.mx']
+            self.assertEqual(f.filter(urls), urls)
+            self.assertTrue(started.is_set())
+            # Lookups queued at the deadline never run
+            release.set()
+            time.sleep(0.1)
+            self.assertEqual(lookup.call_count, 1)
+        self.assertEqual(f.stats['timeout'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import sally.prescan as prescan
+
+PARKED = b"""<html><head><title>
+ Sitio en construcci\xc3\xb3n </title></head>
+<body><h1>Pr\xc3\xb3ximamente</h1><p>Este dominio est\xc3\xa1 en venta</p></body>
+</html>"""
+
+
+class Response(object):
+
+    def __init__(self, body):
+        self.body = body
+
+
+class PrescanTestCase(unittest.TestCase):
+
+    def test_scan(self):
+        self.assertIsNone(prescan.scan(PARKED))
+        self.assertEqual(prescan.scan(b'<a>ventas@tienda.mx</a>'), 'email')
+        self.assertEqual(prescan.scan(b'Tel. (55) 1234-5678'), 'phone')
+        self.assertIsNone(prescan.scan(b'Desde 2018'))
+        self.assertIsNone(prescan.scan(b'<link href="/s.css?v=1528301234">'))
+        self.assertIsNone(prescan.scan(b'<script>t = 15283012345;</script>'))
+        self.assertEqual(prescan.scan(
+            b'<script src="//cdn.shopify.com/s.js">'), 'ecommerce')
+        self.assertEqual(prescan.scan(b'<a href="https://Facebook.com/x">'),
+                'social')
+        self.assertEqual(prescan.scan(b'<a href="/Contacto">Escr\xc3\xadbenos</a>'),
+                'link')
+
+
+    def test_title(self):
+        self.assertEqual(prescan.title(PARKED), 'Sitio en construcci\xf3n')
+        self.assertIsNone(prescan.title(b'<html></html>'))
+
+
+    def test_summary(self):
+        prescanner = prescan.Prescanner()
+        self.assertTrue(prescanner.skip(Response(PARKED)))
+        self.assertFalse(prescanner.skip(Response(b'ventas@tienda.mx')))
+        self.assertEqual(prescanner.timed(len, 'abc'), 3)
+        summary = prescanner.summary()
+        self.assertEqual(summary['pages'], 2)
+        self.assertEqual(summary['skipped'], 1)
+        self.assertEqual(summary['skipped_ratio'], 0.5)
+        self.assertEqual(summary['signal/email'], 1)
+        self.assertIn('saved_seconds', summary)
+
+
+if __name__ == '__main__':
+    unittest.main()
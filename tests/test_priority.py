@@ -0,0 +1,71 @@
+import unittest
+from unittest import mock
+import sally.priority as priority
+from suffixes import SuffixTestCase
+
+
+class Leads(object):
+
+    def __init__(self, leads):
+        self.leads = leads
+
+
+    def known(self, domains):
+        return dict((d, self.leads[d]) for d in domains if d in self.leads)
+
+
+class PriorityTestCase(SuffixTestCase):
+
+    def test_order(self):
+        prioritizer = priority.Prioritizer(Leads({
+            'tienda.com.mx': {'score': 0.8, 'ecommerce': ['shopify']},
+            'blog.com': {'score': 0.2, 'ecommerce': []}}))
+        urls = ['http://nuevo.org', 'http://blog.com', 'http://otro.com.mx',
+                'http://www.tienda.com.mx']
+        ordered = prioritizer.order(urls)
+        self.assertEqual([url for value, url in ordered],
+                ['http://www.tienda.com.mx', 'http://blog.com',
+                    'http://otro.com.mx', 'http://nuevo.org'])
+        self.assertEqual(ordered[0][0], 40 + 20 + 20)
+        self.assertTrue(all(0 <= value <= priority.MAX
+            for value, url in ordered))
+        self.assertEqual(prioritizer.stats['known'], 2)
+        self.assertEqual(prioritizer.stats['ecommerce'], 1)
+
+
+    def test_rows(self):
+        prioritizer = priority.Prioritizer(Leads({}))
+        urls = ['http://a.com', 'http://b.com']
+        ordered = prioritizer.order(urls, {'http://a.com': 9,
+            'http://b.com': 0})
+        self.assertEqual([url for value, url in ordered],
+                ['http://b.com', 'http://a.com'])
+
+
+    def test_unavailable(self):
+        class Broken(object):
+            def known(self, domains):
+                raise IOError('no mongo')
+        prioritizer = priority.Prioritizer(Broken())
+        self.assertEqual(prioritizer.priorities(['http://a.mx']),
+                {'http://a.mx': 18 + 10})
+
+
+    def test_close(self):
+        with mock.patch('sally.leads.LeadStore') as LeadStore:
+            LeadStore.return_value = Leads({})
+            LeadStore.return_value.close = mock.Mock()
+            prioritizer = priority.Prioritizer()
+            prioritizer.order(['http://a.com'])
+            prioritizer.close()
+        LeadStore.return_value.close.assert_called_once_with()
+        # Stores given by the caller stay open
+        leads = mock.Mock(known=lambda domains: {})
+        prioritizer = priority.Prioritizer(leads)
+        prioritizer.order(['http://a.com'])
+        prioritizer.close()
+        leads.close.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
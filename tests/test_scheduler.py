@@ -0,0 +1,78 @@
+import unittest
+from unittest import mock
+import sally.scheduler as scheduler
+
+
+def urls(count):
+    return ['http://%d.mx' % i for i in range(count)]
+
+
+class SchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sheets = {'small': urls(10), 'large': urls(600)}
+        patches = [
+                mock.patch('sally.google.spreadsheet.get_urls',
+                    side_effect=lambda upload: self.sheets[upload]),
+                mock.patch('sally.google.spreadsheet.create_spreadsheet',
+                    side_effect=lambda name: {'spreadsheetId': 'new ' + name})
+                ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+
+    def uploads(self, *ids):
+        return [{'id': upload, 'name': upload} for upload in ids]
+
+
+    def test_plan(self):
+        jobs = scheduler.plan(self.uploads('small', 'large'), 4)
+        self.assertEqual(len(jobs), 4)
+        weight, small = jobs[0]
+        self.assertEqual(weight, 10)
+        self.assertNotIn('shard', small)
+        self.assertEqual(small['spreadsheet'], 'new small')
+        # 600 URLs in shards of 250 at most
+        large = [job for weight, job in jobs[1:]]
+        self.assertEqual([job['shard'] for job in large],
+                ['0/3', '1/3', '2/3'])
+        self.assertEqual([weight for weight, job in jobs[1:]], [200] * 3)
+        self.assertEqual(set(job['spreadsheet'] for job in large),
+                {'new large'})
+        self.assertEqual(len(set(job['collection'] for job in large)), 1)
+
+
+    def test_plan_workers(self):
+        # Never more shards than workers
+        jobs = scheduler.plan(self.uploads('large'), 2)
+        self.assertEqual([job['shard'] for weight, job in jobs],
+                ['0/2', '1/2'])
+        weight, job = scheduler.plan(self.uploads('large'), 1)[0]
+        self.assertEqual(weight, 600)
+        self.assertNotIn('shard', job)
+
+
+    def test_plan_unfinished(self):
+        unfinished = {'large': {'spreadsheetId': 'old',
+            'collection': '20180101_000000'}}
+        jobs = scheduler.plan(self.uploads('large'), 4, unfinished)
+        self.assertEqual(set((job['spreadsheet'], job['collection'])
+            for weight, job in jobs), {('old', '20180101_000000')})
+        self.assertFalse(scheduler.gs.create_spreadsheet.called)
+
+
+    def test_distribute(self):
+        jobs = [(w, {'id': w}) for w in (1, 8, 3, 5, 2, 4)]
+        bins = scheduler.distribute(jobs, 3)
+        self.assertEqual([[job['id'] for job in b] for b in bins],
+                [[8], [5, 2, 1], [4, 3]])
+        # Bins are balanced, the heaviest one is the heaviest job
+        self.assertEqual([sum(job['id'] for job in b) for b in bins],
+                [8, 8, 7])
+        self.assertEqual(scheduler.distribute(jobs[:1], 3), [[{'id': 1}]])
+        self.assertEqual(scheduler.distribute([], 3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
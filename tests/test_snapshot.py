@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from sally.snapshot import SettingsSnapshot
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.version = '2018-01-01T00:00:00.000Z'
+        self.settings = {'allowed_domains': ['mx']}
+        patches = [
+                mock.patch('sally.google.drive.get_modified_time',
+                    side_effect=lambda spreadsheetId: self.version),
+                mock.patch('sally.google.spreadsheet.get_settings',
+                    side_effect=lambda spreadsheetId: dict(self.settings)),
+                mock.patch('sally.google.spreadsheet.get_score',
+                    return_value={'email': 0.2}),
+                # Background checks run when the test says so
+                mock.patch('threading.Thread', Deferred)
+                ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        Deferred.pending = []
+
+
+    def snapshot(self, refresh=300):
+        return SettingsSnapshot('settings', os.path.join(self.directory,
+            'settings.json'), refresh)
+
+
+    def test_read_write(self):
+        snapshot = self.snapshot()
+        self.assertIsNone(snapshot.read())
+        self.assertEqual(snapshot.get_settings(), self.settings)
+        # Later processes start from the file
+        self.settings = {}
+        data = self.snapshot().load()
+        self.assertEqual(data['version'], self.version)
+        self.assertEqual(data['settings'], {'allowed_domains': ['mx']})
+        self.assertEqual(data['score'], {'email': 0.2})
+        self.assertEqual(os.listdir(self.directory), ['settings.json'])
+
+
+    def test_refresh(self):
+        snapshot = self.snapshot()
+        snapshot.load()
+        self.settings = {'allowed_domains': ['com']}
+        # Not checked again before refresh seconds
+        self.version = '2018-02-01T00:00:00.000Z'
+        self.assertEqual(snapshot.get_settings(), {'allowed_domains': ['mx']})
+        self.assertEqual(Deferred.pending, [])
+        snapshot.checked = time.time() - 301
+        snapshot.load()
+        Deferred.run()
+        self.assertEqual(snapshot.get_settings(), self.settings)
+        self.assertEqual(snapshot.read()['version'], self.version)
+
+
+    def test_unreachable(self):
+        snapshot = self.snapshot()
+        snapshot.load()
+        snapshot.checked = 0
+        with mock.patch('sally.google.drive.get_modified_time',
+                side_effect=IOError('Drive is down')):
+            self.assertEqual(snapshot.get_settings(), self.settings)
+            Deferred.run()
+        self.assertEqual(snapshot.load()['version'], self.version)
+
+
+class Deferred(object):
+    """Thread started by run(), load() holds the lock meanwhile."""
+
+    pending = []
+
+    def __init__(self, target, **kwargs):
+        self.target = target
+
+    def start(self):
+        Deferred.pending.append(self.target)
+
+    @classmethod
+    def run(cls):
+        pending, cls.pending = cls.pending, []
+        for target in pending:
+            target()
+
+
+if __name__ == '__main__':
+    unittest.main()
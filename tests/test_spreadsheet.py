@@ -1,6 +1,7 @@
 import unittest
 import datetime
 import logging
+from unittest import mock
 from googleapiclient.errors import HttpError
 import sally.google.spreadsheet as gs
 
@@ -9,6 +10,130 @@ logger = logging.getLogger(__name__)
 csvs = ['./tests/fixtures/mx.csv',
             './tests/fixtures/sampleab.csv']
 
+class Request(object):
+
+    def __init__(self, service, name, kwargs):
+        self.service = service
+        self.name = name
+        self.kwargs = kwargs
+
+    def execute(self, num_retries=0):
+        self.service.calls.append((self.name, self.kwargs, num_retries))
+        if self.name in self.service.errors:
+            raise self.service.errors[self.name]
+        return self.service.responses.get(self.name, {})
+
+
+class StubSheets(object):
+    """Sheets v4 service recording its calls."""
+
+    def __init__(self, errors={}, responses={}):
+        self.errors = errors
+        self.responses = responses
+        self.calls = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return StubValues(self)
+
+    def get(self, **kwargs):
+        return Request(self, 'get', kwargs)
+
+    def batchUpdate(self, **kwargs):
+        return Request(self, 'batchUpdate', kwargs)
+
+
+class StubValues(object):
+
+    def __init__(self, service):
+        self.service = service
+
+    def batchUpdate(self, **kwargs):
+        return Request(self.service, 'values.batchUpdate', kwargs)
+
+
+def bad_request():
+    return HttpError(mock.Mock(status=400, reason='Bad Request'),
+            b'{"error": {"code": 400}}')
+
+
+class WriteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        patches = [mock.patch.object(gs, 'INLINE_ROWS', 2),
+                mock.patch.object(gs, 'CHUNK_ROWS', 2),
+                mock.patch.object(gs, 'CHUNKS', 2)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.rows = [['SCORE', 'WEB SITE']] + [[i, 'www.%d.mx' % i]
+                for i in range(5)]
+
+
+    def service(self, **kwargs):
+        service = StubSheets(**kwargs)
+        patch = mock.patch('sally.google.authorize.get_service',
+                return_value=service)
+        patch.start()
+        self.addCleanup(patch.stop)
+        return service
+
+
+    def ranges(self, service):
+        return [[(d['range'], d['values']) for d in kwargs['body']['data']]
+                for name, kwargs, retries in service.calls
+                if name == 'values.batchUpdate']
+
+
+    def test_write_values(self):
+        service = self.service()
+        self.assertEqual(gs.write_values('sheet', 't', self.rows[1:],
+            offset=3), 2)
+        self.assertEqual(self.ranges(service), [
+            [("'t'!A3", self.rows[1:3]), ("'t'!A5", self.rows[3:5])],
+            [("'t'!A7", self.rows[5:])]])
+        self.assertEqual(gs.write_values('sheet', 't', []), 0)
+
+
+    def test_write_sheet(self):
+        service = self.service()
+        self.assertEqual(gs.write_sheet('sheet', 't', self.rows), 2)
+        name, kwargs, retries = service.calls[0]
+        self.assertEqual(retries, gs.RETRIES)
+        update = kwargs['body']['requests'][1]['updateCells']
+        self.assertEqual(len(update['rows']), 2)
+        # Values follow the inline rows
+        self.assertEqual(self.ranges(service), [
+            [("'t'!A3", self.rows[2:4]), ("'t'!A5", self.rows[4:])]])
+
+
+    def test_write_sheet_exists(self):
+        service = self.service(errors={'batchUpdate': bad_request()},
+                responses={'get': {'sheets': [{'properties':
+                    {'title': 't'}}]}})
+        self.assertEqual(gs.write_sheet('sheet', 't', self.rows), 2)
+        self.assertEqual(self.ranges(service)[0][0], ("'t'!A1",
+            self.rows[:2]))
+
+
+    def test_write_sheet_error(self):
+        self.service(errors={'batchUpdate': bad_request()},
+                responses={'get': {'sheets': []}})
+        with self.assertRaises(HttpError):
+            gs.write_sheet('sheet', 't', self.rows)
+
+
+    def test_cell(self):
+        self.assertEqual(gs.cell(None), {})
+        self.assertEqual(gs.cell(0), {'userEnteredValue': {'numberValue': 0}})
+        self.assertEqual(gs.cell(False),
+                {'userEnteredValue': {'boolValue': False}})
+        self.assertEqual(gs.cell('a'),
+                {'userEnteredValue': {'stringValue': 'a'}})
+
+
 class SpreadsheetTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -78,6 +203,21 @@ class SpreadsheetTestCase(unittest.TestCase):
 
             return ex_response
 
+    def test_sheet(self):
+        """Sheet is sized for the rows, header is bold and frozen"""
+        rows = [['SCORE', 'WEB SITE']] + [[0.5, 'www.test.com']] * 3
+        body = gs.sheet('testing', rows)
+        grid = body['properties']['gridProperties']
+        self.assertEqual((grid['rowCount'], grid['columnCount'],
+            grid['frozenRowCount']), (4, 2, 1))
+        data = body['data'][0]['rowData']
+        self.assertTrue(data[0]['values'][0]['userEnteredFormat']
+                ['textFormat']['bold'])
+        self.assertEqual(data[1]['values'][0]['userEnteredValue'],
+                {'numberValue': 0.5})
+        self.assertEqual(body['properties']['sheetId'], gs.sheet_id('testing'))
+
+
     def test_create_spreadsheet(self):
         response = gs.create_spreadsheet('test')
         logger.info(response)
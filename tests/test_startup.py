@@ -0,0 +1,26 @@
+import unittest
+from bench.startup import heavy_imports
+
+
+def imported(module):
+    """Return heavy modules loaded by importing _module_ in a new
+    interpreter, without any credentials in the environment."""
+    return heavy_imports(module, env={'PATH': ''})[0]
+
+
+class StartupTestCase(unittest.TestCase):
+
+    def test_lightfoot_spider(self):
+        self.assertEqual(imported('sally.spiders.lightfoot_spider'), [])
+
+
+    def test_pipelines(self):
+        self.assertEqual(imported('sally.pipelines'), [])
+
+
+    def test_archive(self):
+        self.assertEqual(imported('sally.archive'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
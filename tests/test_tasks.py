@@ -0,0 +1,33 @@
+import unittest
+from unittest import mock
+import sally.tasks as tasks
+
+
+class CompletionQueueTestCase(unittest.TestCase):
+
+    def test_summary(self):
+        queue = tasks.CompletionQueue()
+        with mock.patch('sally.tasks.send_summary') as send:
+            for spreadsheetId in ('a', 'b', 'a'):
+                queue.acquire()
+                queue.notify(spreadsheetId)
+            for i in range(3):
+                queue.release()
+            queue.join()
+        send.assert_called_once_with(['a', 'b'])
+
+
+    def test_hold(self):
+        queue = tasks.CompletionQueue()
+        queue.hold()
+        with mock.patch('sally.tasks.send_summary') as send:
+            queue.acquire()
+            queue.notify('a')
+            queue.release()
+            queue.join()
+        send.assert_not_called()
+        self.assertEqual(queue.held, ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
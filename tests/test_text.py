@@ -0,0 +1,52 @@
+import unittest
+import sally.text as text
+
+HTML = u"""<html><head><title> Tienda  Ni\xf1a </title>
+<meta name="Description" content="Ropa y zapatos">
+<script src="//cdn.shopify.com/s.js">var html = "<div>oculto</div>";</script>
+</head><body>
+<div class="wrapper"><div class="inner"><div>uno <b>dos</b><!-- c --> tres</div>
+<p>sin cerrar<p>Escr\xedbenos <a href="/contacto">Con<span>tacto</span></a> hoy
+</div></div><footer>Magento</footer></body></html>"""
+
+
+class TextTestCase(unittest.TestCase):
+
+    def page(self, encoding='utf-8', chunk=text.CHUNK):
+        return text.Page(text.stream(HTML.encode(encoding), encoding, chunk),
+                'http://tienda.mx/')
+
+
+    def test_once(self):
+        page = self.page()
+        # Nested divs don't repeat their text
+        self.assertEqual(page.texts(frozenset(['div'])), ['uno ', 'dos',
+            ' tres', 'sin cerrar', u'Escr\xedbenos ', 'Con', 'tacto', ' hoy\n'])
+        self.assertNotIn('oculto', ' '.join(page.texts()))
+        self.assertEqual(page.values('*', 'class'), ['wrapper', 'inner'])
+
+
+    def test_chunks(self):
+        expected = self.page().nodes
+        for encoding in ('utf-8', 'cp1252'):
+            for chunk in (1, 5, 64):
+                self.assertEqual(self.page(encoding, chunk).nodes, expected)
+
+
+    def test_page(self):
+        page = self.page('cp1252', 7)
+        self.assertEqual(page.title, u'Tienda Ni\xf1a')
+        self.assertEqual(page.meta('description'), ['Ropa y zapatos'])
+        self.assertEqual(page.values('script', 'src'), ['//cdn.shopify.com/s.js'])
+        self.assertEqual(page.links(), [('http://tienda.mx/contacto',
+            'Con tacto')])
+        self.assertEqual(page.contents(frozenset(['footer'])), ['Magento'])
+
+
+    def test_empty(self):
+        self.assertEqual(list(text.stream(b'')), [])
+        self.assertEqual(text.Page([], 'http://a.mx').title, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
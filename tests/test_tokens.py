@@ -0,0 +1,53 @@
+import json
+import unittest
+from hermit.tokens import Token, TokenPool, NoTokens, usage, with_token
+
+
+class FakeResponse(object):
+
+    def __init__(self, body, headers={}):
+        self.body = body
+        self.headers = headers
+
+    def json(self):
+        return self.body
+
+
+class TokenPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = TokenPool([Token('a', 1), Token('b', 2)])
+
+
+    def test_usage(self):
+        headers = {'x-app-usage': json.dumps(
+            {'call_count': 28, 'total_time': 45, 'total_cputime': 3})}
+        self.assertEqual(usage(headers), 45)
+        self.assertEqual(usage({}), 0)
+
+
+    def test_with_token(self):
+        self.assertEqual(
+                with_token('https://graph.facebook.com/x?limit=1&access_token=old',
+                    'new'),
+                'https://graph.facebook.com/x?limit=1&access_token=new')
+
+
+    def test_least_used(self):
+        a = self.pool.acquire()
+        self.pool.report(a, FakeResponse({}, {'x-app-usage': json.dumps(
+            {'call_count': 50})}))
+        self.assertEqual(self.pool.acquire().value, 'b')
+
+
+    def test_retire(self):
+        a = self.pool.acquire()
+        retry = self.pool.report(a, FakeResponse({'error': {'code': 190}}))
+        self.assertTrue(retry)
+        b = self.pool.acquire()
+        self.pool.report(b, FakeResponse({'error': {'code': 4}}))
+        self.assertRaises(NoTokens, self.pool.acquire)
+
+
+if __name__ == '__main__':
+    unittest.main()